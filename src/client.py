@@ -8,15 +8,147 @@ import threading
 import time
 
 from src.map.factory.band_shape_map_factory import BandShapeMapFactory
+from src.map.distance_store import DistanceStore, DistanceStoreWriter
 from src.map.factory.uni_shape_map_factory import UniShapeMapFactory
+from src.map.shape_map_container import ShapeMapContainer, \
+    ShapeMapContainerWriter
 from src.obj.grid.base_grid import BaseFace
 from src.obj.grid.triangle_grid import TriangleGrid
+from src.obj.grid.grid_cache import GridCache
 from src.obj.grid.icosahedron_grid import IcosahedronGrid
+from src.obj.mesh_archive import MeshArchive
+from src.obj.mesh_cache import MeshCache
 from src.obj.obj3d import Obj3d
 from src.util.parse_util import parse_cla
 from src.view.qt_main import main, MainWindow
 
 
+def iter_models(model_root_path, mesh_cache):
+    """
+
+    3Dモデルのディレクトリ又はアーカイブから、3Dモデルを順に読み込む
+    アーカイブの場合、ファイルに展開せずにメモリ上で読み込む
+
+    :type model_root_path: str
+    :param model_root_path: 3Dモデルのディレクトリ又はアーカイブのパス
+
+    :type mesh_cache: MeshCache
+    :param mesh_cache: ディレクトリ内の3Dモデルの読み込みに使うキャッシュ
+
+    :rtype: iterator((str, Obj3d))
+    :return: (モデル名, Obj3dオブジェクト)のイテレータ
+
+    """
+    if MeshArchive.is_archive(model_root_path):
+        for name, obj3d in MeshArchive(model_root_path):
+            yield os.path.basename(name), obj3d
+    else:
+        for model_name in os.listdir(model_root_path):
+            yield model_name, Obj3d.load(
+                os.path.join(model_root_path, model_name),
+                mesh_cache=mesh_cache)
+
+
+def open_outputs(save_root_path, map_type, grid3d, n_div, grid_scale):
+    """
+
+    保存先に応じて、形状マップの書き込み先とキャッシュを開く
+    保存先が.shpcファイルの場合は一つのファイルに書き込み、
+    .distディレクトリの場合は形状マップの代わりに距離のみを書き込む
+    いずれもキャッシュは同じディレクトリに保存する
+
+    :type save_root_path: str
+    :param save_root_path: 保存先のディレクトリ、.shpcファイル又は.distディレクトリのパス
+
+    :type map_type: ShapeMapContainer.MAP_TYPE
+    :param map_type: 形状マップの種類
+
+    :type grid3d: IcosahedronGrid
+    :param grid3d: 分割前のグリッド
+
+    :type n_div: int or long
+    :param n_div: 分割数
+
+    :type grid_scale: float
+    :param grid_scale: グリッドのスケール率
+
+    :rtype: (ShapeMapContainerWriter, DistanceStoreWriter, GridCache,
+             MeshCache)
+    :return: .shpcファイルのコンテナ, .distディレクトリ
+             (保存先が該当しない場合はそれぞれNone),
+             グリッドのキャッシュ, 3Dモデルのキャッシュ
+
+    """
+    is_container = save_root_path.endswith(ShapeMapContainer.EXTENSION)
+    is_store = save_root_path.endswith(DistanceStore.EXTENSION)
+    cache_root_path = os.path.dirname(save_root_path) \
+        if is_container or is_store else save_root_path
+
+    # グリッドは全モデルで共通なので、中心化・拡大・面分割したものを
+    # キャッシュから再利用する
+    grid_cache = GridCache(os.path.join(cache_root_path, ".grid_cache"))
+    # 3Dモデルは二回目以降、解析せずにキャッシュから読み込む
+    mesh_cache = MeshCache(os.path.join(cache_root_path, ".mesh_cache"))
+
+    container = ShapeMapContainerWriter(save_root_path, map_type, n_div) \
+        if is_container else None
+    # 走査順は最初のモデルを待たずに保存し、書き込み途中でも読み込めるようにする
+    store = DistanceStoreWriter(
+        save_root_path, grid=grid_cache.prepare(grid3d, n_div, grid_scale)) \
+        if is_store else None
+
+    return container, store, grid_cache, mesh_cache
+
+
+def save_shape_maps(factory, container, store, shp_path_of):
+    """
+
+    3Dモデルの形状マップを保存先に応じて書き込む
+
+    :type factory: BaseShapeMapFactory
+    :param factory: 3Dモデルの形状マップを生成するファクトリ
+
+    :type container: ShapeMapContainerWriter
+    :param container: .shpcファイルのコンテナ Noneの場合は書き込まない
+
+    :type store: DistanceStoreWriter
+    :param store: .distディレクトリ Noneの場合は書き込まない
+
+    :type shp_path_of: function
+    :param shp_path_of: 形状マップから.shpファイルのパスを求める関数
+                        コンテナ・.distディレクトリのいずれもない場合に使う
+
+    """
+    if store is not None:
+        # 形状マップは読み込む時にDistanceStoreで生成する
+        factory.save_to(store)
+        return
+
+    for shape_map in factory.create():
+        print shape_map
+        if container is not None:
+            shape_map.save_to(container)
+        else:
+            shape_map.save(shp_path_of(shape_map))
+
+
+def close_outputs(container, store):
+    """
+
+    open_outputs()で開いた書き込み先を閉じる
+
+    :type container: ShapeMapContainerWriter
+    :param container: .shpcファイルのコンテナ
+
+    :type store: DistanceStoreWriter
+    :param store: .distディレクトリ
+
+    """
+    for output in (container, store):
+        if output is not None:
+            output.close()
+
+
 def handler(kwargs):
     """
 
@@ -34,33 +166,41 @@ def handler(kwargs):
 
         cla = parse_cla(cla_path)
 
-        for model_name in os.listdir(model_root_path):
+        # グリッドは全モデルで共通なので一度だけ読み込む
+        grid3d = IcosahedronGrid.load(grid_path)
+        container, store, grid_cache, mesh_cache = open_outputs(
+            save_root_path, ShapeMapContainer.MAP_TYPE.UNI, grid3d, n_div,
+            grid_scale)
 
+        # 途中で失敗した場合も、書き込み済みのモデルを読み込めるよう閉じる
+        try:
             start = time.clock()
-
-            print model_name, "..."
-            model_id = int(re.search('\d+', model_name).group())
-            model_label = [label for label, aff_ids in cla.items()
-                           if model_id in aff_ids][0]
-            cls = cla.keys().index(model_label)
-
-            off_path = os.path.join(model_root_path, model_name)
-
-            print "creator being generated..."
-            obj3d = Obj3d.load(off_path)
-            grid3d = IcosahedronGrid.load(grid_path)
-            factory = UniShapeMapFactory(model_id, obj3d, grid3d, n_div, cls,
-                                         grid_scale,
-                                         BaseFace.UNI_SCAN_DIRECTION)
-
-            for shape_map in factory.create():
-                print shape_map
-                shp_path = os.path.join(save_root_path, str(model_id),
-                                        shape_map.traverse_direction.name,
-                                        "{}.shp".format(shape_map.face_id))
-                shape_map.save(shp_path)
-
-            print (time.clock() - start), "s"
+            for model_name, obj3d in iter_models(model_root_path,
+                                                 mesh_cache):
+
+                print model_name, "..."
+                model_id = int(re.search('\d+', model_name).group())
+                model_label = [label for label, aff_ids in cla.items()
+                               if model_id in aff_ids][0]
+                cls = cla.keys().index(model_label)
+
+                print "creator being generated..."
+                factory = UniShapeMapFactory(model_id, obj3d, grid3d, n_div,
+                                             cls, grid_scale,
+                                             BaseFace.UNI_SCAN_DIRECTION,
+                                             grid_cache=grid_cache)
+
+                save_shape_maps(
+                    factory, container, store,
+                    lambda shape_map: os.path.join(
+                        save_root_path, str(model_id),
+                        shape_map.traverse_direction.name,
+                        "{}.shp".format(shape_map.face_id)))
+
+                print (time.clock() - start), "s"
+                start = time.clock()
+        finally:
+            close_outputs(container, store)
 
     threading.Thread(target=execute).start()
 
@@ -82,32 +222,40 @@ def band_map_handler(kwargs):
 
         cla = parse_cla(cla_path)
 
-        for model_name in os.listdir(model_root_path):
+        # グリッドは全モデルで共通なので一度だけ読み込む
+        grid3d = IcosahedronGrid.load(grid_path)
+        container, store, grid_cache, mesh_cache = open_outputs(
+            save_root_path, ShapeMapContainer.MAP_TYPE.BAND, grid3d, n_div,
+            grid_scale)
 
+        # 途中で失敗した場合も、書き込み済みのモデルを読み込めるよう閉じる
+        try:
             start = time.clock()
-
-            print model_name, "..."
-            model_id = int(re.search('\d+', model_name).group())
-            model_label = [label for label, aff_ids in cla.items()
-                           if model_id in aff_ids][0]
-            cls = cla.keys().index(model_label)
-
-            off_path = os.path.join(model_root_path, model_name)
-
-            print "creator being generated..."
-            obj3d = Obj3d.load(off_path)
-            grid3d = IcosahedronGrid.load(grid_path)
-            factory = BandShapeMapFactory(model_id, obj3d, grid3d, n_div, cls,
-                                          grid_scale, TriangleGrid.BAND_TYPE, 0)
-
-            for shape_map in factory.create():
-                print shape_map
-                shp_path = os.path.join(save_root_path, str(model_id),
-                                        "{}.shp".format(
-                                            shape_map.band_type.name))
-                shape_map.save(shp_path)
-
-            print (time.clock() - start), "s"
+            for model_name, obj3d in iter_models(model_root_path,
+                                                 mesh_cache):
+
+                print model_name, "..."
+                model_id = int(re.search('\d+', model_name).group())
+                model_label = [label for label, aff_ids in cla.items()
+                               if model_id in aff_ids][0]
+                cls = cla.keys().index(model_label)
+
+                print "creator being generated..."
+                factory = BandShapeMapFactory(model_id, obj3d, grid3d, n_div,
+                                              cls, grid_scale,
+                                              TriangleGrid.BAND_TYPE, 0,
+                                              grid_cache=grid_cache)
+
+                save_shape_maps(
+                    factory, container, store,
+                    lambda shape_map: os.path.join(
+                        save_root_path, str(model_id),
+                        "{}.shp".format(shape_map.band_type.name)))
+
+                print (time.clock() - start), "s"
+                start = time.clock()
+        finally:
+            close_outputs(container, store)
 
     threading.Thread(target=execute).start()
 
@@ -1,9 +1,8 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import os
-import struct
 from src.obj.grid.base_grid import BaseGrid
+from src.obj.grid.triangle_grid import TriangleGrid
 from base_shape_map import BaseShapeMap
 
 
@@ -32,37 +31,43 @@ class BandShapeMap(BaseShapeMap):
         super(BandShapeMap, self).__init__(model_id, distance_map, cls, n_div)
         self.band_type = band_type
 
-    def save(self, shp_path, type_name='float'):
+    @staticmethod
+    def from_header(header, data):
+        """
+
+        .shpファイルのヘッダとデータ部からBandShapeMapを生成する
+        距離マップはデータ部をコピーせずに(n_div + 1)行の二次元配列として参照する
+
+        :type header: OrderedDict
+        :param header: BaseShapeMap.parse_header()で解析したヘッダ
 
-        target_dir = os.path.dirname(shp_path)
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir)
+        :type data: np.ndarray
+        :param data: データ部の一次元配列
 
-        # データ値をバイナリ保存する時のフォーマット
-        data_format = BaseShapeMap.DATA_FORMAT[type_name]
+        :rtype: BandShapeMap
+        :return: BandShapeMapオブジェクト
 
-        lines = []
+        """
+        n_div = int(header["N_DIV"])
+        band_type = TriangleGrid.BAND_TYPE[header["BAND_TYPE"]]
 
-        with open(shp_path, mode='wb') as f:
+        if len(data) == 0 or len(data) % (n_div + 1) != 0:
+            raise IOError("Invalid .shp data size.")
 
-            # .shpファイルであることを示す接頭辞
-            lines.append("#SHP\n")
-            # ID
-            lines.append("#ID\n{}\n".format(self.model_id))
-            # クラス情報
-            lines.append("#CLASS\n{}\n".format(self.cls))
-            # 走査方向
-            lines.append("#BAND_TYPE\n{}\n".format(self.band_type.name))
-            # 分割数
-            lines.append("#N_DIV\n{}\n".format(self.n_div))
-            # マップ型
-            lines.append("#DATA_TYPE\n{}\n".format(type_name))
+        return BandShapeMap(int(header["ID"]), data.reshape(n_div + 1, -1),
+                            int(header["CLASS"]), n_div, band_type)
 
-            lines.append("#DATA\n")
+    def _header_items(self):
+        """
 
-            f.writelines(lines)
+        :rtype: list((str, object))
+        :return: (項目名, 値)のリスト
 
-            # データ部の書き込み
-            for row in self.distance_map:
-                for elem in row:
-                    f.write(struct.pack(data_format, elem))
+        """
+        return [("ID", self.model_id),
+                # クラス情報
+                ("CLASS", self.cls),
+                # 走査方向
+                ("BAND_TYPE", self.band_type.name),
+                # 分割数
+                ("N_DIV", self.n_div)]
@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import itertools
+import os
+from collections import OrderedDict
 import numpy as np
 from src.util.debug_util import assert_type_in_container
 
@@ -10,13 +13,17 @@ class BaseShapeMap(object):
                    'double': 'd',
                    'int': 'i'}
 
+    # .shpファイルの接頭辞と、データ部の直前の行
+    SHP_PREFIX = "#SHP\n"
+    DATA_LINE = "#DATA\n"
+
     def __init__(self, model_id, distance_map, cls, n_div):
         """
 
         :type model_id: int or long:
         :param model_id: 対象3DモデルID
 
-        :type distance_map: list(list or np.ndarray)
+        :type distance_map: list(list or np.ndarray) or np.ndarray
         :param distance_map: 3Dモデルの重心Gと、Gとグリッド頂点を結ぶ線分とモデルの交点Pの
                              距離情報を含むマップ
 
@@ -32,7 +39,7 @@ class BaseShapeMap(object):
         assert isinstance(n_div, (int, long))
         try:
             assert isinstance(distance_map, (list, tuple))
-            assert_type_in_container(distance_map, (list, tuple))
+            assert_type_in_container(distance_map, (list, tuple, np.ndarray))
         except AssertionError:
             assert isinstance(distance_map, np.ndarray)
             assert distance_map.ndim == 2
@@ -46,16 +53,219 @@ class BaseShapeMap(object):
         """
 
         形状マップを.shpファイル形式で保存する
+        ヘッダとデータ部は、それぞれ一度の書き込みで保存する
 
         :type shp_path: str
         :param shp_path: .shpファイルパス
 
-        :type data_id: str
-        :param data_id: 個々の形状データに付与されるID
+        :type type_name: str
+        :param type_name: データ部の型
+
+        """
+        target_dir = os.path.dirname(shp_path)
+        if target_dir and not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+
+        # .shpファイルであることを示す接頭辞
+        lines = [BaseShapeMap.SHP_PREFIX]
+        lines += ["#{}\n{}\n".format(key, value)
+                  for key, value in self._header_items()]
+        # マップ型
+        lines.append("#DATA_TYPE\n{}\n".format(type_name))
+        lines.append(BaseShapeMap.DATA_LINE)
+
+        data = self.data_array(type_name)
+
+        with open(shp_path, mode='wb') as f:
+            f.write("".join(lines))
+            # データ部の書き込み
+            f.write(data.tostring())
+
+    def save_to(self, writer):
+        """
+
+        形状マップを.shpcファイルの一つのレコードとして書き込む
+
+        :type writer: ShapeMapContainerWriter
+        :param writer: 書き込み先の.shpcファイル
+
+        """
+        writer.append(OrderedDict(self._header_items()),
+                      self.data_array(writer.type_name))
+
+    @staticmethod
+    def load(shp_path):
+        """
+
+        .shpファイルを読み込む
+        データ部はコピーせず、読み取り専用のnp.memmapとして参照する
+        ヘッダの項目に応じて、UniShapeMap又はBandShapeMapを返す
+
+        :type shp_path: str
+        :param shp_path: .shpファイルパス
+
+        :rtype: BaseShapeMap
+        :return: 読み込んだ形状マップ
+
+        """
+        with open(shp_path, 'rb') as f:
+            lines = []
+            while not lines or lines[-1] != BaseShapeMap.DATA_LINE:
+                line = f.readline()
+                if not line:
+                    raise IOError("{} has no data block.".format(shp_path))
+                lines.append(line)
+            offset = f.tell()
+
+        header = BaseShapeMap.parse_header("".join(lines))
+        dtype = BaseShapeMap.__data_type(header)
+        n_point = (os.path.getsize(shp_path) - offset) // dtype.itemsize
+
+        data = np.memmap(shp_path, dtype=dtype, mode='r', offset=offset,
+                         shape=(n_point,)) if n_point > 0 \
+            else np.zeros(shape=(0,), dtype=dtype)
+        return BaseShapeMap.from_header(header, data)
+
+    @staticmethod
+    def load_all(shp_paths):
+        """
+
+        複数の.shpファイルを読み込む
+        各ファイルは一度の読み込みで全体を読み、データ部はその内容をコピーせずに
+        参照する
+        ファイルを開いたままにしないため、ファイル記述子の上限を超えずに
+        数千個の形状マップを読み込める
+
+        :type shp_paths: list(str)
+        :param shp_paths: .shpファイルパスのリスト
+
+        :rtype: list(BaseShapeMap)
+        :return: 読み込んだ形状マップのリスト
+
+        """
+        shape_maps = []
+        for shp_path in shp_paths:
+            with open(shp_path, 'rb') as f:
+                content = f.read()
+
+            index = content.find("\n" + BaseShapeMap.DATA_LINE)
+            if index < 0:
+                raise IOError("{} has no data block.".format(shp_path))
+            offset = index + 1 + len(BaseShapeMap.DATA_LINE)
+
+            header = BaseShapeMap.parse_header(content[:offset])
+            dtype = BaseShapeMap.__data_type(header)
+            n_point = (len(content) - offset) // dtype.itemsize
+
+            data = np.frombuffer(content, dtype=dtype, count=n_point,
+                                 offset=offset)
+            shape_maps.append(BaseShapeMap.from_header(header, data))
+        return shape_maps
+
+    @staticmethod
+    def parse_header(text):
+        """
+
+        .shpファイルのヘッダを解析する
+
+        :type text: str
+        :param text: 接頭辞から"#DATA"の行までのヘッダ
+
+        :rtype: OrderedDict
+        :return: 項目名をキー、値の文字列を値とする辞書
+
+        """
+        lines = text.split("\n")
+        if not text.startswith(BaseShapeMap.SHP_PREFIX) or \
+                lines[-2:] != [BaseShapeMap.DATA_LINE.strip(), ""]:
+            raise IOError("Invalid .shp header.")
+
+        # "#項目名"の行と値の行が交互に並ぶ
+        items = lines[1:-2]
+        keys, values = items[0::2], items[1::2]
+        if len(keys) != len(values) or \
+                not all(key.startswith("#") for key in keys):
+            raise IOError("Invalid .shp header.")
+
+        return OrderedDict((key[1:], value)
+                           for key, value in zip(keys, values))
+
+    @staticmethod
+    def from_header(header, data):
+        """
+
+        ヘッダとデータ部から形状マップを生成する
+        ヘッダにFACE_IDがあればUniShapeMap、BAND_TYPEがあればBandShapeMapを生成する
+
+        :type header: OrderedDict
+        :param header: parse_header()で解析したヘッダ
+
+        :type data: np.ndarray
+        :param data: データ部の一次元配列
+
+        :rtype: BaseShapeMap
+        :return: 形状マップ
+
+        """
+        # 循環importを避けるため、ここでimportする
+        from uni_shape_map import UniShapeMap
+        from band_shape_map import BandShapeMap
+
+        try:
+            if "FACE_ID" in header:
+                return UniShapeMap.from_header(header, data)
+            elif "BAND_TYPE" in header:
+                return BandShapeMap.from_header(header, data)
+        except (KeyError, ValueError) as e:
+            raise IOError("Invalid .shp header: {}".format(e))
+        raise NotImplementedError
+
+    @staticmethod
+    def __data_type(header):
+        """
+
+        :type header: OrderedDict
+        :param header: 解析したヘッダ
+
+        :rtype: np.dtype
+        :return: データ部の型
+
+        """
+        try:
+            return np.dtype(BaseShapeMap.DATA_FORMAT[header["DATA_TYPE"]])
+        except KeyError:
+            raise IOError("Unknown .shp data type.")
+
+    def data_array(self, type_name='float'):
+        """
+
+        距離マップの全ての行を連結し、データ部の型の一次元配列として返す
+        要素のバイト列はDATA_FORMATをstruct.packした場合と同じになる
 
         :type type_name: str
         :param type_name: データ部の型
 
+        :rtype: np.ndarray
+        :return: 距離の一次元配列
+
+        """
+        # データ値をバイナリ保存する時のフォーマット
+        dtype = np.dtype(BaseShapeMap.DATA_FORMAT[type_name])
+
+        if isinstance(self.distance_map, np.ndarray):
+            return np.ravel(self.distance_map).astype(dtype)
+        # 行の長さが異なる場合もあるため、行を連結しながら変換する
+        return np.fromiter(itertools.chain.from_iterable(self.distance_map),
+                           dtype=dtype)
+
+    def _header_items(self):
+        """
+
+        .shpファイルのヘッダに書き込む、DATA_TYPEより前の項目を返す
+
+        :rtype: list((str, object))
+        :return: (項目名, 値)のリスト
+
         """
         raise NotImplementedError
 
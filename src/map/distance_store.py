@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import numpy as np
+from base_shape_map import BaseShapeMap
+from band_shape_map import BandShapeMap
+from uni_shape_map import UniShapeMap
+from src.map.factory.base_shape_map_factory import BaseShapeMapFactory
+from src.obj.grid.base_grid import BaseFace
+from src.obj.grid.triangle_grid import TriangleGrid, \
+    traversal_plan_arrays, traversal_plans_from_arrays
+
+
+class DistanceStore(object):
+    """
+
+    3Dモデルごとのグリッド頂点に対応した距離と、グリッドの走査順の頂点インデックスを
+    保存したディレクトリ(.dist)を読み込み、形状マップを必要な時に生成するクラス
+
+    各形状マップは同じ距離を走査順に並べ替えたものなので、距離はモデルごとに一度だけ
+    保存し、走査順はグリッドごとに一度だけ保存する
+    形状マップは走査順の頂点インデックスで距離を一度に引いて生成する
+
+    """
+
+    EXTENSION = ".dist"
+
+    # 保存形式を変更した場合は更新する
+    FORMAT_VERSION = 1
+
+    META_DTYPE = np.dtype([('version', '<i8'), ('n_div', '<i8'),
+                           ('n_vertex', '<i8'), ('data_type', 'S8')])
+
+    MODEL_DTYPE = np.dtype([('model_id', '<i8'), ('cls', '<i8')])
+
+    def __init__(self, store_path):
+        """
+
+        :type store_path: str
+        :param store_path: .distディレクトリのパス
+
+        """
+        assert isinstance(store_path, str)
+
+        meta_path = os.path.join(store_path, "store.npy")
+        if not os.path.isfile(meta_path):
+            raise IOError("{} is not a .dist directory.".format(store_path))
+        meta = np.load(meta_path)[0]
+        if meta['version'] != DistanceStore.FORMAT_VERSION:
+            raise IOError("{} is not a .dist directory.".format(store_path))
+
+        self.store_path = store_path
+        self.n_div = int(meta['n_div'])
+        self.n_vertex = int(meta['n_vertex'])
+        self.type_name = str(meta['data_type'])
+
+        arrays = {os.path.splitext(name)[0]:
+                  np.load(os.path.join(store_path, name), mmap_mode='r')
+                  for name in os.listdir(store_path)
+                  if name.startswith(("uni_", "band_")) and
+                  name.endswith(".npy")}
+
+        self.__traversal_plans = traversal_plans_from_arrays(arrays)
+
+        # 書き込み途中の場合も、モデルの情報まで書き込んだ距離のみを読み込む
+        models = np.fromfile(os.path.join(store_path, "models.dat"),
+                             dtype=DistanceStore.MODEL_DTYPE)
+        dtype = np.dtype('<' + BaseShapeMap.DATA_FORMAT[self.type_name])
+        distances_path = os.path.join(store_path, "distances.dat")
+        if os.path.getsize(distances_path) < \
+                len(models) * self.n_vertex * dtype.itemsize:
+            raise IOError("{} is truncated.".format(distances_path))
+
+        self.models = models
+        self.distance_array = np.memmap(
+            distances_path, dtype=dtype, mode='r',
+            shape=(len(models), self.n_vertex)) if len(models) > 0 \
+            else np.zeros(shape=(0, self.n_vertex), dtype=dtype)
+
+        self.__model_rows = dict((model_id, row) for row, model_id in
+                                 enumerate(models['model_id'].tolist()))
+
+    def __len__(self):
+        return len(self.models)
+
+    def __contains__(self, model_id):
+        return model_id in self.__model_rows
+
+    def model_ids(self):
+        """
+
+        :rtype: list(int)
+        :return: 保存順のモデルIDのリスト
+
+        """
+        return self.models['model_id'].tolist()
+
+    def distances(self, model_id):
+        """
+
+        :type model_id: int or long
+        :param model_id: 3DモデルID
+
+        :rtype: np.ndarray
+        :return: グリッド頂点に対応した距離 shape=(n_vertex,)
+
+        """
+        return self.distance_array[self.__model_rows[model_id]]
+
+    def uni_map(self, model_id, traverse_direction, face_id):
+        """
+
+        グリッドの単一面を走査したUniShapeMapを生成する
+
+        :type model_id: int or long
+        :param model_id: 3DモデルID
+
+        :type traverse_direction: BaseFace.UNI_SCAN_DIRECTION
+        :param traverse_direction: 面を走査する方向
+
+        :type face_id: int or long
+        :param face_id: 面ID
+
+        :rtype: UniShapeMap
+        :return: UniShapeMapオブジェクト
+
+        """
+        face_ids, indices, row_offsets = \
+            self.__traversal_plans[traverse_direction]
+        # 面IDは昇順に並ぶ
+        i = int(np.searchsorted(face_ids, face_id))
+        if i == len(face_ids) or face_ids[i] != face_id:
+            raise KeyError(face_id)
+
+        distance_map = BaseShapeMapFactory.split_rows(
+            BaseShapeMapFactory.gather_distances(
+                self.distances(model_id), indices[i]), row_offsets)
+        return UniShapeMap(model_id, distance_map, self.__cls(model_id),
+                           self.n_div, face_id, traverse_direction)
+
+    def uni_maps(self, model_id, traverse_directions=None):
+        """
+
+        UniShapeMapFactory.create()と同じ順に、全ての面のUniShapeMapを生成する
+
+        :type model_id: int or long
+        :param model_id: 3DモデルID
+
+        :type traverse_directions: list(BaseFace.UNI_SCAN_DIRECTION)
+        :param traverse_directions: 面を走査する方向 Noneの場合は全ての方向
+
+        :rtype: list(UniShapeMap)
+        :return: UniShapeMapオブジェクトのリスト
+
+        """
+        if traverse_directions is None:
+            traverse_directions = list(BaseFace.UNI_SCAN_DIRECTION)
+        return [self.uni_map(model_id, direction, face_id)
+                for direction in traverse_directions
+                for face_id in self.__traversal_plans[direction][0].tolist()]
+
+    def band_map(self, model_id, band_type, center_face_id=0):
+        """
+
+        グリッドを帯状に走査したBandShapeMapを生成する
+
+        :type model_id: int or long
+        :param model_id: 3DモデルID
+
+        :type band_type: TriangleGrid.BAND_TYPE
+        :param band_type: 帯の走査方向
+
+        :type center_face_id: int or long
+        :param center_face_id: 帯の中心となる面のID
+
+        :rtype: BandShapeMap
+        :return: BandShapeMapオブジェクト
+
+        """
+        indices, row_offsets = \
+            self.__traversal_plans[(band_type, center_face_id)]
+
+        distance_map = BaseShapeMapFactory.split_rows(
+            BaseShapeMapFactory.gather_distances(
+                self.distances(model_id), indices), row_offsets)
+        return BandShapeMap(model_id, distance_map, self.__cls(model_id),
+                            self.n_div, band_type)
+
+    def __cls(self, model_id):
+        """
+
+        :type model_id: int or long
+        :param model_id: 3DモデルID
+
+        :rtype: int
+        :return: クラスラベル
+
+        """
+        return int(self.models['cls'][self.__model_rows[model_id]])
+
+
+class DistanceStoreWriter(object):
+    """
+
+    3Dモデルごとのグリッド頂点に対応した距離を、.distディレクトリに順に書き込むクラス
+    走査順の頂点インデックスは、コンストラクタにグリッドを渡した場合はその時に、
+    それ以外の場合は最初のモデルを書き込む時にグリッドから一度だけ保存する
+    各モデルの距離はモデルの情報より先にファイルへ書き出すので、
+    書き込み途中でもDistanceStoreで書き込み済みのモデルを読み込める
+
+    """
+
+    def __init__(self, store_path, band_center_face_ids=(0,),
+                 type_name='float', grid=None):
+        """
+
+        :type store_path: str
+        :param store_path: .distディレクトリのパス
+
+        :type band_center_face_ids: tuple(int or long)
+        :param band_center_face_ids: 帯の走査順を保存する、帯の中心となる面のID
+
+        :type type_name: str
+        :param type_name: 距離を保存する型
+
+        :type grid: TriangleGrid
+        :param grid: 中心化・拡大・面分割済みのグリッド
+                     Noneの場合は最初のモデルを書き込む時に渡したグリッドを使う
+
+        """
+        assert isinstance(store_path, str)
+        assert isinstance(grid, TriangleGrid) or grid is None
+        assert all(isinstance(face_id, (int, long))
+                   for face_id in band_center_face_ids)
+        assert type_name in BaseShapeMap.DATA_FORMAT
+
+        if not os.path.exists(store_path):
+            os.makedirs(store_path)
+
+        self.store_path = store_path
+        self.band_center_face_ids = tuple(band_center_face_ids)
+        self.type_name = type_name
+        self.dtype = np.dtype('<' + BaseShapeMap.DATA_FORMAT[type_name])
+
+        # グリッド頂点数 最初のモデルで決まる
+        self.n_vertex = None
+        self.__model_ids = set()
+
+        self.__distances_file = open(
+            os.path.join(store_path, "distances.dat"), 'wb')
+        self.__models_file = open(os.path.join(store_path, "models.dat"),
+                                  'wb')
+
+        if grid is not None:
+            self.__save_grid(grid)
+
+    def append(self, model_id, cls, grid, distances):
+        """
+
+        3Dモデルのグリッド頂点に対応した距離を追記する
+
+        :type model_id: int or long
+        :param model_id: 3DモデルID
+
+        :type cls: int or long
+        :param cls: クラスラベル
+
+        :type grid: TriangleGrid
+        :param grid: 中心化・拡大・面分割済みのグリッド
+
+        :type distances: np.ndarray
+        :param distances: グリッド頂点に対応した距離 shape=(n_vertex,)
+
+        """
+        assert isinstance(model_id, (int, long))
+        assert isinstance(cls, (int, long))
+        assert model_id not in self.__model_ids
+
+        if self.n_vertex is None:
+            self.__save_grid(grid)
+        # 全てのモデルで同じグリッドを使う
+        assert len(grid.vertices) == self.n_vertex
+        assert len(distances) == self.n_vertex
+
+        self.__distances_file.write(
+            np.asarray(distances, dtype=self.dtype).tostring())
+        # モデルの情報は距離をファイルへ書き出した後に書き込み、
+        # 書き込み途中の距離を読み込まない
+        self.__distances_file.flush()
+        self.__models_file.write(np.array(
+            [(model_id, cls)], dtype=DistanceStore.MODEL_DTYPE).tostring())
+        self.__models_file.flush()
+        self.__model_ids.add(model_id)
+
+    def close(self):
+        """
+
+        ファイルを閉じる
+
+        """
+        self.__distances_file.close()
+        self.__models_file.close()
+
+    def __save_grid(self, grid):
+        """
+
+        グリッドの全ての走査順の頂点インデックスを保存する
+
+        :type grid: TriangleGrid
+        :param grid: 中心化・拡大・面分割済みのグリッド
+
+        """
+        arrays = traversal_plan_arrays(grid, self.band_center_face_ids)
+        for name, array in arrays.items():
+            np.save(os.path.join(self.store_path, name + ".npy"), array)
+
+        self.n_vertex = len(grid.vertices)
+        # 読み込み中に書きかけのファイルが見えないよう、名前を変更して置く
+        meta_path = os.path.join(self.store_path, "store.npy")
+        with open(meta_path + ".tmp", 'wb') as f:
+            np.save(f, np.array(
+                [(DistanceStore.FORMAT_VERSION, grid.n_div, self.n_vertex,
+                  self.type_name)], dtype=DistanceStore.META_DTYPE))
+        os.rename(meta_path + ".tmp", meta_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
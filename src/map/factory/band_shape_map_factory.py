@@ -1,16 +1,18 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import numpy as np
 from src.map.band_shape_map import BandShapeMap
 from src.map.factory.base_shape_map_factory import BaseShapeMapFactory
-from src.obj.grid.base_grid import BaseGrid
 from src.obj.grid.triangle_grid import TriangleGrid
 from src.util.debug_util import assert_type_in_container
 
 
 class BandShapeMapFactory(BaseShapeMapFactory):
     def __init__(self, model_id, obj3d, grid, n_div, cls, grid_scale,
-                 band_types, center_face_id):
+                 band_types, center_face_id,
+                 ray_engine_type=None, ray_engine_options=None,
+                 hit_mode=None, n_workers=None, grid_cache=None):
         """
 
         :type model_id: int or long:
@@ -38,9 +40,27 @@ class BandShapeMapFactory(BaseShapeMapFactory):
         :type center_face_id: int or long
         :param center_face_id: 帯の中心となる面のID
 
+        :type ray_engine_type: BaseShapeMapFactory.RAY_ENGINE_TYPE
+        :param ray_engine_type: 距離計算に使うレイ投射エンジンの種類
+
+        :type ray_engine_options: dict
+        :param ray_engine_options: レイ投射エンジンのコンストラクタに渡すキーワード引数
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各グリッド頂点の距離とする交点の選び方
+
+        :type n_workers: int or long
+        :param n_workers: レイ投射を分担するワーカープロセス数
+
+        :type grid_cache: GridCache
+        :param grid_cache: 中心化・拡大・面分割済みのグリッドのキャッシュ
+
         """
         super(BandShapeMapFactory, self).__init__(model_id, obj3d, grid, n_div,
-                                                  cls, grid_scale)
+                                                  cls, grid_scale,
+                                                  ray_engine_type,
+                                                  ray_engine_options, hit_mode,
+                                                  n_workers, grid_cache)
         assert_type_in_container(band_types, TriangleGrid.BAND_TYPE)
         assert isinstance(center_face_id, (int, long))
         self.band_types = band_types
@@ -55,18 +75,35 @@ class BandShapeMapFactory(BaseShapeMapFactory):
         :return: BandShapeMapオブジェクトのリスト
 
         """
+        return self._create_from_distances(self._distances())
+
+    def _create_from_distances(self, distances):
+        """
+
+        グリッド頂点に対応した距離から、BandShapeMapオブジェクトをband_types分生成する
+
+        :type distances: np.ndarray
+        :param distances: グリッド頂点に対応した距離 shape=(n_vertex,)
+
+        :rtype: list(BandShapeMap)
+        :return: BandShapeMapオブジェクトのリスト
+
+        """
+        if len(self.band_types) == 0:
+            return []
 
-        distances = self._distances()
+        plans = [self.grid.band_traversal_plan(band_type, self.center_face_id)
+                 for band_type in self.band_types]
+        # 全ての帯の頂点インデックスを連結し、一度に距離を引く
+        band_distances = BaseShapeMapFactory.gather_distances(
+            distances, np.concatenate([indices for indices, _ in plans]))
+        band_offsets = np.cumsum([0] + [len(indices) for indices, _ in plans])
 
         shape_maps = []
-        for band_type in self.band_types:
-            band_vertex_indices_map = self.grid.traverse_band(band_type,
-                                                              self.center_face_id)
-            distance_map = [[distances[idx]
-                             if idx != BaseGrid.VERTEX_IDX_UNDEFINED
-                             else BaseShapeMapFactory.DIST_UNDEFINED
-                             for idx in row]
-                            for row in band_vertex_indices_map]
+        for band_type, (_, row_offsets), start in zip(self.band_types, plans,
+                                                      band_offsets):
+            distance_map = BaseShapeMapFactory.split_rows(
+                band_distances[start:], row_offsets)
             shape_maps.append(
                 BandShapeMap(self.model_id, distance_map, self.cls,
                              self.grid.n_div, band_type))
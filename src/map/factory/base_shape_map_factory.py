@@ -1,15 +1,36 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import enum
 import numpy as np
 from src.obj.obj3d import Obj3d
 from src.obj.grid.base_grid import BaseGrid
+from src.obj.grid.grid_cache import GridCache
+from src.obj.grid.vertex_table import VertexTable
+from src.map.ray.base_ray_engine import BaseRayEngine
+from src.map.ray.scalar_ray_engine import ScalarRayEngine
+from src.map.ray.batch_ray_engine import BatchRayEngine
+from src.map.ray.bvh_ray_engine import BvhRayEngine
+from src.map.ray.angular_bin_ray_engine import AngularBinRayEngine
+from src.map.ray.spherical_rasterizer import SphericalRasterizer
+from src.map.ray.hierarchical_ray_engine import HierarchicalRayEngine
+from src.map.ray.parallel_ray_engine import ParallelRayEngine
 
 
 class BaseShapeMapFactory(object):
-    DIST_UNDEFINED = -1
+    DIST_UNDEFINED = BaseRayEngine.DIST_UNDEFINED
 
-    def __init__(self, model_id, obj3d, grid, n_div, cls, grid_scale):
+    RAY_ENGINE_TYPE = enum.Enum('RAY_ENGINE_TYPE',
+                                'SCALAR BATCH BVH ANGULAR_BIN '
+                                'SPHERICAL_RASTER HIERARCHICAL')
+
+    # グリッドの全頂点へのレイのみを投射できるエンジン
+    GRID_BOUND_RAY_ENGINE_TYPES = (RAY_ENGINE_TYPE.SPHERICAL_RASTER,
+                                   RAY_ENGINE_TYPE.HIERARCHICAL)
+
+    def __init__(self, model_id, obj3d, grid, n_div, cls, grid_scale,
+                 ray_engine_type=None, ray_engine_options=None,
+                 hit_mode=None, n_workers=None, grid_cache=None):
         """
 
         :type model_id: int or long:
@@ -30,6 +51,28 @@ class BaseShapeMapFactory(object):
         :type grid_scale: float
         :param grid_scale: グリッドのスケール率
 
+        :type ray_engine_type: BaseShapeMapFactory.RAY_ENGINE_TYPE
+        :param ray_engine_type: 距離計算に使うレイ投射エンジンの種類
+                                Noneの場合はBATCH
+
+        :type ray_engine_options: dict
+        :param ray_engine_options: レイ投射エンジンのコンストラクタに渡すキーワード引数
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各グリッド頂点の距離とする交点の選び方
+                         Noneの場合はFIRST
+                         マップは頂点ごとに距離を一つ持つので、ALLは指定できない
+
+        :type n_workers: int or long
+        :param n_workers: レイ投射を分担するワーカープロセス数
+                          Noneまたは1の場合は現在のプロセスのみで投射する
+                          ワーカーは距離を求めるたびに終了する
+                          withブロック内ではブロックを出るまで使い続ける
+
+        :type grid_cache: GridCache
+        :param grid_cache: 中心化・拡大・面分割済みのグリッドのキャッシュ
+                           Noneの場合は毎回グリッドを準備する
+
         """
 
         assert isinstance(model_id, (int, long))
@@ -37,13 +80,17 @@ class BaseShapeMapFactory(object):
         assert isinstance(grid, BaseGrid)
         assert isinstance(cls, (int, long))
         assert isinstance(grid_scale, float)
+        assert isinstance(grid_cache, GridCache) or grid_cache is None
 
         self.model_id = model_id
 
         # 3Dモデル:座標系の中心に置き、正規化する
         self.obj3d = obj3d.center().normal()
         # 正二十面体グリッド:３Dモデルを内部に完全に含むように拡張
-        self.grid = grid.center().scale(grid_scale).divide_face(n_div)
+        if grid_cache is None:
+            self.grid = grid.center().scale(grid_scale).divide_face(n_div)
+        else:
+            self.grid = grid_cache.prepare(grid, n_div, grid_scale)
 
         # 3Dモデルの中心から最も離れた点の中心からの距離が、
         # グリッドの中心から最も近い点のより中心からの距離より大きい場合はサポート外
@@ -55,6 +102,37 @@ class BaseShapeMapFactory(object):
         # クラスラベル
         self.cls = cls
 
+        # レイ投射エンジン
+        if ray_engine_type is None:
+            ray_engine_type = BaseShapeMapFactory.RAY_ENGINE_TYPE.BATCH
+        assert isinstance(ray_engine_type, BaseShapeMapFactory.RAY_ENGINE_TYPE)
+        assert isinstance(ray_engine_options, dict) or \
+               ray_engine_options is None
+        self.ray_engine_type = ray_engine_type
+        self.ray_engine_options = {} if ray_engine_options is None \
+            else ray_engine_options
+        # 正規化済みの3Dモデルに対して一度だけ生成する
+        self.ray_engine = None
+        # 回転したグリッド頂点へ投射するエンジン
+        # ray_engine_typeがグリッドの全頂点に限るエンジンの場合のみBATCHで生成する
+        self.rotated_ray_engine = None
+        # withブロック内では、エンジンの資源を距離を求めるたびに解放せず使い続ける
+        self.__is_entered = False
+
+        # 交点の選び方
+        if hit_mode is None:
+            hit_mode = BaseRayEngine.HIT_MODE.FIRST
+        assert isinstance(hit_mode, BaseRayEngine.HIT_MODE)
+        if hit_mode == BaseRayEngine.HIT_MODE.ALL:
+            raise NotImplementedError
+        self.hit_mode = hit_mode
+
+        # レイ投射のワーカープロセス数
+        if n_workers is None:
+            n_workers = 1
+        assert isinstance(n_workers, (int, long)) and n_workers > 0
+        self.n_workers = n_workers
+
     @staticmethod
     def tomas_moller(origin, end, v0, v1, v2):
         """
@@ -63,53 +141,204 @@ class BaseShapeMapFactory(object):
         線分と三角形の交点を返す
         交差しない場合、Noneを返す
 
-        行列式を、外積/内積に置き換えている
+        ScalarRayEngine.tomas_mollerを参照
+
+        :rtype: np.ndarray
+        :return: 交点ベクトル
+
+        """
+        return ScalarRayEngine.tomas_moller(origin, end, v0, v1, v2)
+
+    def create(self):
+        raise NotImplementedError
 
-        :type origin: np.ndarray
-        :param origin: 線分の始点
+    def create_rotated(self, rotations):
+        """
 
-        :type end: np.ndarray
-        :param end: 線分の終点
+        3Dモデルを各回転行列で回転した場合の形状マップを生成する
+        3Dモデルの正規化、グリッドの分割、レイ投射エンジンは共有する
 
-        :type v0 : np.ndarray
-        :param v0: 三角形の頂点その１
+        :type rotations: np.ndarray
+        :param rotations: 回転行列の配列 shape=(n_rotation, 3, 3)
+
+        :rtype: list
+        :return: 回転行列ごとのcreate()の戻り値のリスト
+
+        """
+        return [self._create_from_distances(distances)
+                for distances in self.rotated_distances(rotations)]
+
+    def create_symmetric(self):
+        """
 
-        :type v1: np.ndarray
-        :param v1: 三角形の頂点その２
+        グリッドの回転対称性(正二十面体グリッドでは60通り)で3Dモデルを回転した
+        場合の形状マップを、レイを投射し直さずに生成する
 
-        :type v2: np.ndarray
-        :param v2: 三角形の頂点その３
+        :rtype: list
+        :return: TriangleGrid.symmetries()の回転ごとのcreate()の戻り値のリスト
+
+        """
+        _, distances = self.symmetric_distances()
+        return [self._create_from_distances(symmetric_distances)
+                for symmetric_distances in distances]
+
+    def _create_from_distances(self, distances):
+        raise NotImplementedError
+
+    @staticmethod
+    def gather_distances(distances, indices):
+        """
+
+        走査順の頂点インデックス配列に対応する距離を一度の添字参照で求める
+        未定義の頂点にはDIST_UNDEFINED値を入れる
+
+        :type distances: np.ndarray
+        :param distances: グリッド頂点に対応した距離 shape=(n_vertex,)
+
+        :type indices: np.ndarray
+        :param indices: 走査順の頂点インデックス
 
         :rtype: np.ndarray
-        :return: 交点ベクトル
+        :return: indicesと同じ形の距離の配列
 
         """
-        edge1 = v1 - v0
-        edge2 = v2 - v0
-        ray = end - origin
+        return np.where(indices != VertexTable.UNDEFINED, distances[indices],
+                        BaseShapeMapFactory.DIST_UNDEFINED)
 
-        P = np.cross(ray, edge2)
+    @staticmethod
+    def split_rows(distance_map, row_offsets):
+        """
 
-        # 分母
-        denominator = np.dot(P, edge1)
+        走査順に並んだ距離を、形状マップの行ごとのリストに分割する
 
-        if denominator > np.finfo(float).eps:
-            T = origin - v0
-            u = np.dot(P, T)
+        :type distance_map: np.ndarray
+        :param distance_map: 走査順の距離 shape=(n_point,)
 
-            if 0 <= u <= denominator:
-                Q = np.cross(T, edge1)
-                v = np.dot(Q, ray)
+        :type row_offsets: np.ndarray
+        :param row_offsets: 各行の先頭位置 shape=(n_row + 1,)
 
-                if 0 <= v <= denominator and (u + v) <= denominator:
-                    t = np.dot(Q, edge2) / denominator
+        :rtype: list(list(float))
+        :return: 距離の入れ子リスト
 
-                    return origin + ray * t
+        """
+        return [distance_map[start:stop].tolist()
+                for start, stop in zip(row_offsets[:-1], row_offsets[1:])]
 
-        return None
+    def _create_ray_engine(self, ray_engine_type=None,
+                           ray_engine_options=None):
+        """
 
-    def create(self):
-        raise NotImplementedError
+        ray_engine_typeに対応するレイ投射エンジンを生成する
+
+        :type ray_engine_type: BaseShapeMapFactory.RAY_ENGINE_TYPE
+        :param ray_engine_type: レイ投射エンジンの種類
+                                Noneの場合はself.ray_engine_type
+
+        :type ray_engine_options: dict
+        :param ray_engine_options: レイ投射エンジンのコンストラクタに渡すキーワード引数
+                                   Noneの場合はself.ray_engine_options
+
+        :rtype: BaseRayEngine
+        :return: レイ投射エンジン
+
+        """
+        if ray_engine_type is None:
+            ray_engine_type = self.ray_engine_type
+        if ray_engine_options is None:
+            ray_engine_options = self.ray_engine_options
+
+        engine_args = ()
+        if ray_engine_type == BaseShapeMapFactory.RAY_ENGINE_TYPE.SCALAR:
+            engine_class = ScalarRayEngine
+        elif ray_engine_type == BaseShapeMapFactory.RAY_ENGINE_TYPE.BATCH:
+            engine_class = BatchRayEngine
+        elif ray_engine_type == BaseShapeMapFactory.RAY_ENGINE_TYPE.BVH:
+            engine_class = BvhRayEngine
+        elif ray_engine_type == \
+                BaseShapeMapFactory.RAY_ENGINE_TYPE.ANGULAR_BIN:
+            # グリッドの面で方向空間を分割する
+            engine_class = AngularBinRayEngine
+            engine_args = (self.grid,)
+        elif ray_engine_type == \
+                BaseShapeMapFactory.RAY_ENGINE_TYPE.SPHERICAL_RASTER:
+            # レイを投射せず、三角形をグリッドへ射影する
+            # グリッドの全頂点をまとめて処理するので、ワーカーへは分割できない
+            if self.n_workers > 1:
+                raise NotImplementedError
+            engine_class = SphericalRasterizer
+            engine_args = (self.grid,)
+        elif ray_engine_type == \
+                BaseShapeMapFactory.RAY_ENGINE_TYPE.HIERARCHICAL:
+            # 粗い格子点の結果から細かい格子点の候補を絞り込む
+            # グリッドの全頂点をまとめて処理するので、ワーカーへは分割できない
+            if self.n_workers > 1:
+                raise NotImplementedError
+            engine_class = HierarchicalRayEngine
+            engine_args = (self.grid,)
+        else:
+            raise NotImplementedError
+
+        if self.n_workers > 1:
+            # グリッド頂点を分割し、ワーカープロセスで投射する
+            # グリッド頂点は共有メモリへ一度だけ置く
+            return ParallelRayEngine(self.obj3d, engine_class, engine_args,
+                                     ray_engine_options, self.n_workers,
+                                     fixed_ends=self.grid.vertices)
+
+        return engine_class(self.obj3d, *engine_args, **ray_engine_options)
+
+    def _rotated_ray_engine(self):
+        """
+
+        回転したグリッド頂点へ投射するレイ投射エンジンを取得する
+        グリッドの全頂点に限るエンジンの代わりに、ブロックの大きさのみ引き継いだ
+        BATCHのエンジンを生成する
+
+        :rtype: BaseRayEngine
+        :return: レイ投射エンジン
+
+        """
+        if self.ray_engine_type not in \
+                BaseShapeMapFactory.GRID_BOUND_RAY_ENGINE_TYPES:
+            if self.ray_engine is None:
+                self.ray_engine = self._create_ray_engine()
+            return self.ray_engine
+
+        if self.rotated_ray_engine is None:
+            options = dict((key, value) for key, value
+                           in self.ray_engine_options.items()
+                           if key in ('ray_block_size', 'face_block_size'))
+            self.rotated_ray_engine = self._create_ray_engine(
+                BaseShapeMapFactory.RAY_ENGINE_TYPE.BATCH, options)
+        return self.rotated_ray_engine
+
+    def close(self):
+        """
+
+        レイ投射エンジンが保持する資源(ワーカープロセス等)を解放する
+        閉じた後に距離を求めた場合は、エンジンが資源を確保し直す
+
+        """
+        for ray_engine in (self.ray_engine, self.rotated_ray_engine):
+            if ray_engine is not None:
+                ray_engine.close()
+
+    def __release(self):
+        """
+
+        withブロック外で距離を求めた後に、レイ投射エンジンの資源を解放する
+
+        """
+        if not self.__is_entered:
+            self.close()
+
+    def __enter__(self):
+        self.__is_entered = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__is_entered = False
+        self.close()
 
     def _distances(self):
         """
@@ -122,15 +351,71 @@ class BaseShapeMapFactory(object):
 
         # 距離マップ インデックスはグリッドのverticesに対応する
         # 空洞など、距離が未定義のところにはDIST_UNDEFINED値を入れる
-        distance_map = np.full(shape=(len(self.grid.vertices)),
-                               fill_value=BaseShapeMapFactory.DIST_UNDEFINED,
-                               dtype=np.float64)
-
-        for i, g_vertex in enumerate(self.grid.vertices):
-            for f0, f1, f2 in self.obj3d.vertices[self.obj3d.face_vertices]:
-                p_cross = self.tomas_moller(grid_center, g_vertex, f0, f1, f2)
-                if p_cross is not None:
-                    distance_map[i] = np.linalg.norm(p_cross - grid_center)
-                    break
-
-        return distance_map
+        if self.ray_engine is None:
+            self.ray_engine = self._create_ray_engine()
+
+        try:
+            return self.ray_engine.distances(self.grid.vertices, grid_center,
+                                             self.hit_mode)
+        finally:
+            self.__release()
+
+    def save_to(self, writer):
+        """
+
+        形状マップの代わりに、グリッド頂点に対応した距離を.distディレクトリに書き込む
+        形状マップは読み込む時にDistanceStoreで生成する
+
+        :type writer: DistanceStoreWriter
+        :param writer: 書き込み先の.distディレクトリ
+
+        """
+        writer.append(self.model_id, self.cls, self.grid, self._distances())
+
+    def symmetric_distances(self):
+        """
+
+        グリッドの回転対称性で3Dモデルを回転した場合の、グリッド頂点に対応した距離を
+        回転前の距離から一度の添字参照で求める
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 回転行列 shape=(n_symmetry, 3, 3),
+                 距離の配列 shape=(n_symmetry, n_vertex)
+
+        """
+        rotations, permutations = self.grid.symmetries()
+        return rotations, self._distances()[permutations]
+
+    def rotated_distances(self, rotations):
+        """
+
+        3Dモデルを各回転行列で回転した場合の、グリッド頂点に対応した距離を求める
+        3Dモデルと加速構造は固定したまま、グリッド頂点を逆回転した方向へ
+        全ての回転のレイをまとめて投射する
+        ray_engine_typeがグリッドの全頂点に限るエンジンの場合はBATCHで投射する
+
+        :type rotations: np.ndarray
+        :param rotations: 原点を中心とする回転行列の配列 shape=(n_rotation, 3, 3)
+
+        :rtype: np.ndarray
+        :return: 距離の配列 shape=(n_rotation, n_vertex)
+
+        """
+        rotations = np.asarray(rotations, dtype=np.float64)
+        assert rotations.ndim == 3 and rotations.shape[1:] == (3, 3)
+        assert np.allclose(np.einsum('kij,klj->kil', rotations, rotations),
+                           np.eye(3))
+
+        grid_center = np.zeros(shape=(3,))
+
+        ray_engine = self._rotated_ray_engine()
+
+        # 回転行列の逆行列は転置行列
+        ends = np.einsum('vi,kij->kvj', self.grid.vertices, rotations)
+
+        try:
+            return ray_engine.distances(ends.reshape(-1, 3), grid_center,
+                                        self.hit_mode).reshape(
+                len(rotations), len(self.grid.vertices))
+        finally:
+            self.__release()
@@ -1,14 +1,16 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import numpy as np
 from src.map.factory.base_shape_map_factory import BaseShapeMapFactory
-from src.obj.grid.base_grid import BaseGrid
 from src.map.uni_shape_map import UniShapeMap
 
 
 class UniShapeMapFactory(BaseShapeMapFactory):
     def __init__(self, model_id, obj3d, grid, n_div, cls, grid_scale,
-                 uni_scan_directions):
+                 uni_scan_directions,
+                 ray_engine_type=None, ray_engine_options=None,
+                 hit_mode=None, n_workers=None, grid_cache=None):
         """
 
         :type model_id: int or long:
@@ -33,9 +35,27 @@ class UniShapeMapFactory(BaseShapeMapFactory):
         :param uni_scan_direction: 生成するマップの単一面の走査方向リスト
                                    引数にとったパターン分のマップをcreate()で生成する
 
+        :type ray_engine_type: BaseShapeMapFactory.RAY_ENGINE_TYPE
+        :param ray_engine_type: 距離計算に使うレイ投射エンジンの種類
+
+        :type ray_engine_options: dict
+        :param ray_engine_options: レイ投射エンジンのコンストラクタに渡すキーワード引数
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各グリッド頂点の距離とする交点の選び方
+
+        :type n_workers: int or long
+        :param n_workers: レイ投射を分担するワーカープロセス数
+
+        :type grid_cache: GridCache
+        :param grid_cache: 中心化・拡大・面分割済みのグリッドのキャッシュ
+
         """
         super(UniShapeMapFactory, self).__init__(model_id, obj3d, grid, n_div,
-                                                 cls, grid_scale)
+                                                 cls, grid_scale,
+                                                 ray_engine_type,
+                                                 ray_engine_options, hit_mode,
+                                                 n_workers, grid_cache)
         self.uni_scan_directions = uni_scan_directions
 
     def create(self):
@@ -47,19 +67,37 @@ class UniShapeMapFactory(BaseShapeMapFactory):
         :return: UniShapeMapオブジェクト
 
         """
+        return self._create_from_distances(self._distances())
+
+    def _create_from_distances(self, distances):
+        """
+
+        グリッド頂点に対応した距離から、Gridの単一面に対応するShapeMapオブジェクトを
+        生成する
+
+        :type distances: np.ndarray
+        :param distances: グリッド頂点に対応した距離 shape=(n_vertex,)
+
+        :rtype: list(UniShapeMap)
+        :return: UniShapeMapオブジェクト
+
+        """
+        if len(self.uni_scan_directions) == 0:
+            return []
 
-        distances = self._distances()
+        plans = [self.grid.traversal_plan(direction)
+                 for direction in self.uni_scan_directions]
+        # 全ての走査方向・面の頂点インデックスを連結し、一度に距離を引く
+        distance_maps = iter(BaseShapeMapFactory.gather_distances(
+            distances, np.concatenate([indices for _, indices, _ in plans])))
 
         shape_maps = []
-        for direction in self.uni_scan_directions:
-            traversed_indices_dict = self.grid.traverse(direction)
-            for face_id, vertex_indices_map in traversed_indices_dict.items():
-                distance_map = [[distances[idx]
-                                 if idx != BaseGrid.VERTEX_IDX_UNDEFINED
-                                 else BaseShapeMapFactory.DIST_UNDEFINED
-                                 for idx in row]
-                                for row in vertex_indices_map]
+        for direction, (face_ids, _, row_offsets) in zip(
+                self.uni_scan_directions, plans):
+            for face_id in face_ids.tolist():
+                distance_map = BaseShapeMapFactory.split_rows(
+                    next(distance_maps), row_offsets)
                 shape_maps.append(
-                    UniShapeMap(self.map_id, distance_map, self.cls,
+                    UniShapeMap(self.model_id, distance_map, self.cls,
                                 self.grid.n_div, face_id, direction))
         return shape_maps
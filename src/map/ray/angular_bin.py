@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import time
+import numpy as np
+from src.util.array_util import concatenate_ranges
+
+
+class AngularBinIndex(object):
+    """
+
+    原点から見た方向空間を、グリッドの各三角形面が張る錐体と
+    その面を(alpha, beta)座標でn_div分割した小区画(ビン)に分け、
+    各ビンの方向に見える三角形を保持する索引
+
+    ビン(face, i, j)は面上の i <= alpha < i + 1, j <= beta < j + 1
+    (alpha, betaはn_div倍したTriangleFaceの座標)の範囲を表す
+    ビンごとの三角形はbin_offsets, triangle_indicesのCSR形式で保持する
+
+    """
+
+    def __init__(self, corners, v0, v1, v2, n_div):
+        """
+
+        :type corners: np.ndarray
+        :param corners: グリッドの各面の頂点座標 shape=(n_face, 3, 3)
+                        頂点の順はTriangleFaceのtop, left, right
+
+        :type v0: np.ndarray
+        :param v0: 三角形の頂点その１ shape=(n_triangle, 3)
+
+        :type v1: np.ndarray
+        :param v1: 三角形の頂点その２ shape=(n_triangle, 3)
+
+        :type v2: np.ndarray
+        :param v2: 三角形の頂点その３ shape=(n_triangle, 3)
+
+        :type n_div: int or long
+        :param n_div: 各面の分割数
+
+        """
+        corners = np.asarray(corners, dtype=np.float64)
+        assert corners.ndim == 3 and corners.shape[1:] == (3, 3)
+        assert isinstance(n_div, (int, long)) and n_div > 0
+
+        self.n_div = n_div
+        self.n_face = len(corners)
+        self.n_bin = self.n_face * n_div * n_div
+
+        # 方向ベクトルを各面の頂点の線形結合 a*top + b*left + c*right
+        # で表したときの係数(a, b, c)を求める逆行列
+        self.inv_bases = np.linalg.inv(corners.transpose(0, 2, 1))
+
+        start = time.time()
+        self.__build(np.stack((v0, v1, v2), axis=1))
+        # 構築時間[s]
+        self.build_time = time.time() - start
+
+    def __build(self, triangles):
+        """
+
+        各三角形を、その中心射影が重なり得る全てのビンに登録する
+
+        :type triangles: np.ndarray
+        :param triangles: 三角形の頂点座標 shape=(n_triangle, 3, 3)
+
+        """
+        n = self.n_div
+        # 境界上の方向を取りこぼさないための余白
+        margin = 1e-9 * n
+
+        bin_ids = []
+        triangle_ids = []
+
+        points = triangles.reshape(-1, 3)
+
+        for face_id, inv_basis in enumerate(self.inv_bases):
+            coefficients = np.dot(points, inv_basis.T).reshape(-1, 3, 3)
+
+            # 錐体内の方向は全係数が非負なので、いずれかの係数が
+            # 全頂点で負となる三角形は錐体と重ならない
+            nearby = np.flatnonzero(
+                ~(coefficients < 0).all(axis=1).any(axis=1))
+            coefficients = coefficients[nearby]
+            sums = coefficients.sum(axis=2)
+
+            is_front = sums > 0
+            is_all_front = is_front.all(axis=1)
+            is_partial = is_front.any(axis=1) & ~is_all_front
+
+            # 全頂点が正側にある三角形は、中心射影した三角形の
+            # (alpha, beta)のバウンディングボックスと重なるビンに登録する
+            with np.errstate(divide='ignore', invalid='ignore'):
+                alpha = coefficients[:, :, 1] / sums * n
+                beta = coefficients[:, :, 2] / sums * n
+            alpha_min = alpha.min(axis=1) - margin
+            alpha_max = alpha.max(axis=1) + margin
+            beta_min = beta.min(axis=1) - margin
+            beta_max = beta.max(axis=1) + margin
+
+            is_overlapped = is_all_front & (alpha_max >= 0) & \
+                            (beta_max >= 0) & (alpha_min + beta_min <= n)
+
+            # 正負にまたがる三角形は、中心射影が非有界になるので面全体に登録する
+            i_min = np.where(is_partial, 0, np.floor(alpha_min))
+            i_max = np.where(is_partial, n - 1, np.floor(alpha_max))
+            j_min = np.where(is_partial, 0, np.floor(beta_min))
+            j_max = np.where(is_partial, n - 1, np.floor(beta_max))
+
+            selected = np.flatnonzero(is_overlapped | is_partial)
+            i_min = np.clip(i_min[selected], 0, n - 1).astype(np.int64)
+            i_max = np.clip(i_max[selected], 0, n - 1).astype(np.int64)
+            j_min = np.clip(j_min[selected], 0, n - 1).astype(np.int64)
+            j_max = np.clip(j_max[selected], 0, n - 1).astype(np.int64)
+
+            # バウンディングボックス内の(i, j)を列挙する
+            n_i = i_max - i_min + 1
+            n_j = j_max - j_min + 1
+            cells = concatenate_ranges(np.zeros_like(n_i), n_i * n_j)
+            owners = np.repeat(np.arange(len(selected)), n_i * n_j)
+            i = i_min[owners] + cells // n_j[owners]
+            j = j_min[owners] + cells % n_j[owners]
+
+            is_valid = i + j <= n - 1
+            bin_ids.append((face_id * n + i[is_valid]) * n + j[is_valid])
+            triangle_ids.append(nearby[selected[owners[is_valid]]])
+
+        bin_ids = np.concatenate(bin_ids)
+        triangle_ids = np.concatenate(triangle_ids)
+
+        order = np.lexsort((triangle_ids, bin_ids))
+        self.triangle_indices = triangle_ids[order].astype(np.int32)
+        self.bin_offsets = np.zeros(shape=(self.n_bin + 1,), dtype=np.int64)
+        self.bin_offsets[1:] = np.cumsum(
+            np.bincount(bin_ids, minlength=self.n_bin))
+
+    def bin_of(self, directions):
+        """
+
+        各方向ベクトルが属するビンのIDを返す
+
+        :type directions: np.ndarray
+        :param directions: 方向ベクトル配列 shape=(n_direction, 3)
+
+        :rtype: np.ndarray
+        :return: ビンIDの配列
+
+        """
+        n = self.n_div
+        coefficients = np.einsum('fij,rj->rfi', self.inv_bases, directions)
+
+        # 全係数が非負となる面を選ぶ 境界上では最も内側の面を選ぶ
+        face_ids = np.argmax(coefficients.min(axis=2), axis=1)
+        coefficients = coefficients[np.arange(len(directions)), face_ids]
+        sums = coefficients.sum(axis=1)
+
+        i = np.clip(np.floor(coefficients[:, 1] / sums * n), 0, n - 1)
+        j = np.clip(np.floor(coefficients[:, 2] / sums * n), 0, n - 1)
+        i = i.astype(np.int64)
+        j = j.astype(np.int64)
+        # 面の斜辺上の方向は内側のビンへ寄せる
+        j = np.minimum(j, n - 1 - i)
+
+        return (face_ids * n + i) * n + j
+
+    def candidates(self, directions, is_line=True):
+        """
+
+        各方向のレイが交差し得る(レイ, 三角形)の組を返す
+
+        :type directions: np.ndarray
+        :param directions: レイ方向配列 shape=(n_ray, 3)
+
+        :type is_line: bool
+        :param is_line: レイを原点の逆側にも延びる直線として扱うかどうか
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: レイのインデックス, 三角形のインデックス
+
+        """
+        ray_ids = np.arange(len(directions))
+        bins = self.bin_of(directions)
+        if is_line:
+            ray_ids = np.concatenate((ray_ids, ray_ids))
+            bins = np.concatenate((bins, self.bin_of(-directions)))
+
+        starts = self.bin_offsets[bins]
+        counts = self.bin_offsets[bins + 1] - starts
+
+        return np.repeat(ray_ids, counts), \
+               self.triangle_indices[concatenate_ranges(starts, counts)]
+
+    def __str__(self):
+        """
+
+        :rtype: str
+        :return: str化した時のAngularBinIndexの文字列
+
+        """
+        counts = np.diff(self.bin_offsets)
+        return "AngularBinIndex ( bins : {}, entries : {}, " \
+               "max entries per bin : {}, build : {:.4f} s )".format(
+                self.n_bin, len(self.triangle_indices), counts.max(),
+                self.build_time)
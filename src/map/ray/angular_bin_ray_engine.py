@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+from candidate_ray_engine import CandidateRayEngine
+from angular_bin import AngularBinIndex
+from src.obj.grid.triangle_grid import TriangleGrid
+
+
+class AngularBinRayEngine(CandidateRayEngine):
+    """
+
+    AngularBinIndexで、レイの方向と同じビンに属する三角形のみを交差判定するエンジン
+    レイの始点は座標原点(グリッドの中心)に限る
+
+    """
+
+    def __init__(self, obj3d, grid, n_bin_div=None,
+                 ray_block_size=CandidateRayEngine.DEFAULT_RAY_BLOCK_SIZE):
+        """
+
+        :type obj3d: Obj3d
+        :param obj3d: レイを投射する対象の3Dオブジェクト
+
+        :type grid: TriangleGrid
+        :param grid: 方向空間を分割する、原点を中心とするグリッド
+
+        :type n_bin_div: int or long
+        :param n_bin_div: グリッドの各面の分割数
+                          Noneの場合、ビンあたりの三角形数が数個程度になるよう決める
+
+        :type ray_block_size: int or long
+        :param ray_block_size: 一度に候補を列挙するレイの数
+
+        """
+        super(AngularBinRayEngine, self).__init__(
+            obj3d, ray_block_size=ray_block_size)
+        assert isinstance(grid, TriangleGrid)
+
+        if n_bin_div is None:
+            n_bin_div = int(np.clip(
+                np.ceil(np.sqrt(len(self.triangles) / (2. * grid.n_face))), 1,
+                256))
+
+        corner_indices = np.array([[face.top_vertex_idx(),
+                                    face.left_vertex_idx(),
+                                    face.right_vertex_idx()]
+                                   for face in grid.grid_faces])
+        corners = grid.vertices[corner_indices]
+
+        self.bin_index = AngularBinIndex(corners, self.triangles.v0,
+                                         self.triangles.v1,
+                                         self.triangles.v2, n_bin_div)
+
+    def _candidates(self, origin, rays, is_line):
+        """
+
+        レイの方向(と、直線の逆方向)のビンに属する(レイ, 三角形)の組を返す
+
+        :type origin: np.ndarray
+        :param origin: レイの始点
+
+        :type rays: np.ndarray
+        :param rays: レイ方向配列 shape=(n_ray, 3)
+
+        :type is_line: bool
+        :param is_line: レイを始点の逆側にも延びる直線として扱うかどうか
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: レイのインデックス, 三角形のインデックス
+
+        """
+        if np.any(origin != 0):
+            raise NotImplementedError
+        return self.bin_index.candidates(rays, is_line)
+
+    def __str__(self):
+        """
+
+        :rtype: str
+        :return: str化した時のAngularBinRayEngineの文字列
+
+        """
+        return "{}\n{}".format(self.bin_index,
+                               super(AngularBinRayEngine, self).__str__())
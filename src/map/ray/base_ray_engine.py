@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import enum
+import numpy as np
+from src.obj.obj3d import Obj3d
+from ray_hits import RayHits
+
+
+class BaseRayEngine(object):
+    """
+
+    3Dモデルに対してレイを投射し、交点までの距離を求めるエンジンの基底クラス
+
+    HIT_MODEで各レイの結果を選ぶ
+    FIRST    : ファイル順で最初に交差した面 (従来の判定と同じく、片面判定で
+               始点の逆側も含む直線として扱う)
+    NEAREST  : 始点から最も近い交点
+    FARTHEST : 始点から最も遠い交点
+    ALL      : 全交点 (RayHitsとして返す)
+    FIRST以外は両面判定で、始点から終点方向(t >= 0)の交点のみを扱う
+
+    """
+
+    DIST_UNDEFINED = -1
+
+    HIT_MODE = enum.Enum('HIT_MODE', 'FIRST NEAREST FARTHEST ALL')
+
+    def __init__(self, obj3d):
+        """
+
+        :type obj3d: Obj3d
+        :param obj3d: レイを投射する対象の3Dオブジェクト
+
+        """
+        assert isinstance(obj3d, Obj3d)
+        assert obj3d.face_vertices is not None
+        self.obj3d = obj3d
+
+    def distances(self, ends, origin=None, hit_mode=HIT_MODE.FIRST):
+        """
+
+        始点originから各終点endsへ向かうレイと3Dモデルの交点を求め、
+        始点から交点までの距離を返す
+        交差しないレイにはDIST_UNDEFINED値を入れる
+
+        :type ends: np.ndarray
+        :param ends: レイの終点座標配列 shape=(n_ray, 3)
+
+        :type origin: np.ndarray
+        :param origin: レイの始点 Noneの場合は座標原点
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: np.ndarray or RayHits
+        :return: 各レイに対応する距離の配列 shape=(n_ray,)
+                 hit_modeがALLの場合はRayHits
+
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+
+        エンジンが保持する資源(ワーカープロセス等)を解放する
+        資源を持たないエンジンでは何もしない
+
+        """
+        pass
+
+    @staticmethod
+    def _as_rays(ends, origin):
+        """
+
+        終点配列と始点から、float64のレイ方向配列と始点を生成する
+
+        :type ends: np.ndarray
+        :param ends: レイの終点座標配列
+
+        :type origin: np.ndarray or None
+        :param origin: レイの始点
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 始点, レイ方向配列
+
+        """
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 3)
+        if origin is None:
+            origin = np.zeros(shape=(3,))
+        origin = np.asarray(origin, dtype=np.float64)
+        assert origin.shape == (3,)
+        return origin, ends - origin
+
+    @staticmethod
+    def _reduce_hits(ray_ids, face_ids, t, hit_mode):
+        """
+
+        (レイ, 三角形)の交点の集合を、hit_modeに従ってレイごとに絞り込む
+        ALLの場合は全交点をレイのインデックス順、tの昇順に並べ替える
+
+        :type ray_ids: np.ndarray
+        :param ray_ids: 交点のレイのインデックス
+
+        :type face_ids: np.ndarray
+        :param face_ids: 交点の三角形のインデックス
+
+        :type t: np.ndarray
+        :param t: 交点のパラメータt
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: (np.ndarray, np.ndarray, np.ndarray)
+        :return: レイのインデックス, 三角形のインデックス, パラメータt
+
+        """
+        if hit_mode == BaseRayEngine.HIT_MODE.FIRST:
+            order = np.lexsort((face_ids, ray_ids))
+        elif hit_mode == BaseRayEngine.HIT_MODE.FARTHEST:
+            order = np.lexsort((-t, ray_ids))
+        elif hit_mode in (BaseRayEngine.HIT_MODE.NEAREST,
+                          BaseRayEngine.HIT_MODE.ALL):
+            order = np.lexsort((t, ray_ids))
+        else:
+            raise NotImplementedError
+
+        if hit_mode != BaseRayEngine.HIT_MODE.ALL:
+            # レイごとに先頭の交点のみ残す
+            is_head = np.ones(shape=(len(order),), dtype=bool)
+            is_head[1:] = ray_ids[order[1:]] != ray_ids[order[:-1]]
+            order = order[is_head]
+
+        return ray_ids[order], face_ids[order], t[order]
+
+    @staticmethod
+    def _as_result(n_ray, ray_ids, distances, hit_mode):
+        """
+
+        _reduce_hits()で絞り込んだ交点の距離を、hit_modeに応じた戻り値にする
+
+        :type n_ray: int or long
+        :param n_ray: レイの数
+
+        :type ray_ids: np.ndarray
+        :param ray_ids: 交点のレイのインデックス
+
+        :type distances: np.ndarray
+        :param distances: 交点の距離
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: np.ndarray or RayHits
+        :return: 各レイに対応する距離の配列 又は RayHits
+
+        """
+        if hit_mode == BaseRayEngine.HIT_MODE.ALL:
+            return RayHits.from_hits(n_ray, ray_ids, distances)
+
+        result = np.full(shape=(n_ray,),
+                         fill_value=BaseRayEngine.DIST_UNDEFINED,
+                         dtype=np.float64)
+        result[ray_ids] = distances
+        return result
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+from base_ray_engine import BaseRayEngine
+
+
+class BatchRayEngine(BaseRayEngine):
+    """
+
+    レイのブロックと三角形のブロックをブロードキャストでまとめて交差判定するエンジン
+    判定式はScalarRayEngine.tomas_mollerと同じで、
+    各項をスカラー三重積に変形して行列積として計算する
+
+    """
+
+    DEFAULT_RAY_BLOCK_SIZE = 256
+    DEFAULT_FACE_BLOCK_SIZE = 4096
+
+    def __init__(self, obj3d, ray_block_size=DEFAULT_RAY_BLOCK_SIZE,
+                 face_block_size=DEFAULT_FACE_BLOCK_SIZE):
+        """
+
+        :type obj3d: Obj3d
+        :param obj3d: レイを投射する対象の3Dオブジェクト
+
+        :type ray_block_size: int or long
+        :param ray_block_size: 一度に判定するレイの数
+
+        :type face_block_size: int or long
+        :param face_block_size: 一度に判定する三角形の数
+                                作業領域のメモリ量は概ね
+                                ray_block_size * face_block_size に比例する
+
+        """
+        super(BatchRayEngine, self).__init__(obj3d)
+        assert isinstance(ray_block_size, (int, long)) and ray_block_size > 0
+        assert isinstance(face_block_size, (int, long)) and face_block_size > 0
+
+        self.ray_block_size = ray_block_size
+        self.face_block_size = face_block_size
+
+        # 三角形の頂点と辺ベクトル(Obj3dごとに一度だけ計算される)
+        self.triangles = self.obj3d.triangle_arrays()
+        self.v0 = self.triangles.v0
+        self.edge1 = self.triangles.edge1
+        self.edge2 = self.triangles.edge2
+
+    def distances(self, ends, origin=None,
+                  hit_mode=BaseRayEngine.HIT_MODE.FIRST):
+        """
+
+        各レイについて、hit_modeに従って選んだ交点までの距離を返す
+
+        :type ends: np.ndarray
+        :param ends: レイの終点座標配列 shape=(n_ray, 3)
+
+        :type origin: np.ndarray
+        :param origin: レイの始点 Noneの場合は座標原点
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: np.ndarray or RayHits
+        :return: 各レイに対応する距離の配列 shape=(n_ray,)
+                 hit_modeがALLの場合はRayHits
+
+        """
+        origin, rays = self._as_rays(ends, origin)
+
+        ray_ids, t = self._cast(rays, self._triangle_terms(origin), hit_mode)
+        distances = np.abs(t) * np.linalg.norm(rays[ray_ids], axis=1)
+
+        return self._as_result(len(rays), ray_ids, distances, hit_mode)
+
+    def _cast(self, rays, terms, hit_mode):
+        """
+
+        全てのレイを全ての三角形とブロックごとに判定し、
+        hit_modeに従って選んだ交点のパラメータtを返す
+
+        :type rays: np.ndarray
+        :param rays: レイ方向配列 shape=(n_ray, 3)
+
+        :type terms: tuple
+        :param terms: _triangle_terms()の戻り値
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 交差したレイのインデックス, パラメータt
+                 ALLの場合はレイのインデックス順、tの昇順に並ぶ
+
+        """
+        hit_ray_ids = [np.zeros(shape=(0,), dtype=np.int64)]
+        hit_t = [np.zeros(shape=(0,))]
+
+        for r_start in xrange(0, len(rays), self.ray_block_size):
+            r_stop = min(r_start + self.ray_block_size, len(rays))
+
+            if hit_mode == BaseRayEngine.HIT_MODE.FIRST:
+                ray_ids, t = self._first_hits(rays, r_start, r_stop, terms)
+            else:
+                ray_ids, t = self._block_hits(rays, r_start, r_stop, terms,
+                                              hit_mode)
+            hit_ray_ids.append(ray_ids)
+            hit_t.append(t)
+
+        return np.concatenate(hit_ray_ids), np.concatenate(hit_t)
+
+    def _first_hits(self, rays, r_start, r_stop, terms):
+        """
+
+        レイr_start..r_stopについて、ファイル順で最初に交差する面までの
+        パラメータtを返す
+        交点が見つかったレイは以降の面ブロックで判定しない
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 交差したレイのインデックス, パラメータt
+
+        """
+        det_normals, u_normals, Q, t_numerators = terms
+
+        ray_indices = np.arange(r_start, r_stop)
+        hit_ray_ids = [np.zeros(shape=(0,), dtype=np.int64)]
+        hit_t = [np.zeros(shape=(0,))]
+
+        for f_start in xrange(0, len(self.v0), self.face_block_size):
+            if len(ray_indices) == 0:
+                break
+
+            f_stop = min(f_start + self.face_block_size, len(self.v0))
+            mask, denominator = self._hit_mask(
+                rays[ray_indices], det_normals[f_start:f_stop],
+                u_normals[f_start:f_stop], Q[f_start:f_stop],
+                t_numerators[f_start:f_stop], BaseRayEngine.HIT_MODE.FIRST)
+
+            first = np.argmax(mask, axis=1)
+            rows = np.arange(len(ray_indices))
+            is_hit = mask[rows, first]
+            rows = rows[is_hit]
+            first = first[is_hit]
+
+            hit_ray_ids.append(ray_indices[is_hit])
+            hit_t.append(t_numerators[f_start + first] /
+                         denominator[rows, first])
+
+            ray_indices = ray_indices[~is_hit]
+
+        return np.concatenate(hit_ray_ids), np.concatenate(hit_t)
+
+    def _block_hits(self, rays, r_start, r_stop, terms, hit_mode):
+        """
+
+        レイr_start..r_stopを全ての面と判定し、hit_modeに従って絞り込んだ
+        交点のパラメータtを返す
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 交差したレイのインデックス, パラメータt
+
+        """
+        det_normals, u_normals, Q, t_numerators = terms
+
+        hit_ray_ids = [np.zeros(shape=(0,), dtype=np.int64)]
+        hit_face_ids = [np.zeros(shape=(0,), dtype=np.int64)]
+        hit_t = [np.zeros(shape=(0,))]
+
+        for f_start in xrange(0, len(self.v0), self.face_block_size):
+            f_stop = min(f_start + self.face_block_size, len(self.v0))
+            mask, denominator = self._hit_mask(
+                rays[r_start:r_stop], det_normals[f_start:f_stop],
+                u_normals[f_start:f_stop], Q[f_start:f_stop],
+                t_numerators[f_start:f_stop], hit_mode)
+
+            rows, columns = np.nonzero(mask)
+            # 面ブロックごとに絞り込み、保持する交点を減らす
+            ray_ids, face_ids, t = self._reduce_hits(
+                r_start + rows, f_start + columns,
+                t_numerators[f_start + columns] / denominator[rows, columns],
+                hit_mode)
+            hit_ray_ids.append(ray_ids)
+            hit_face_ids.append(face_ids)
+            hit_t.append(t)
+
+        ray_ids, _, t = self._reduce_hits(np.concatenate(hit_ray_ids),
+                                          np.concatenate(hit_face_ids),
+                                          np.concatenate(hit_t), hit_mode)
+        return ray_ids, t
+
+    def _triangle_terms(self, origin):
+        """
+
+        判定式のうちレイに依存しない項を面ごとに計算する
+        det = (ray x e2).e1 = ray.(e2 x e1)
+        u   = (ray x e2).T  = ray.(e2 x T)
+        v   = (T x e1).ray
+        t   = (T x e1).e2 / det
+
+        :type origin: np.ndarray
+        :param origin: レイの始点
+
+        :rtype: (np.ndarray, np.ndarray, np.ndarray, np.ndarray)
+        :return: e2 x e1, e2 x T, T x e1, (T x e1).e2
+
+        """
+        T = origin - self.v0
+        Q = np.cross(T, self.edge1)
+        det_normals = -self.triangles.normals()
+        u_normals = np.cross(self.edge2, T)
+        t_numerators = np.einsum('ij,ij->i', Q, self.edge2)
+        return det_normals, u_normals, Q, t_numerators
+
+    @staticmethod
+    def _is_hit(denominator, u, v, t_numerator, hit_mode):
+        """
+
+        Tomas-Mollerの判定式を要素ごとに評価する
+        FIRSTは片面判定、それ以外は両面判定でt >= 0の交点に限る
+
+        :type denominator: np.ndarray
+        :param denominator: 分母
+
+        :type u: np.ndarray
+        :param u: 重心座標uの分子
+
+        :type v: np.ndarray
+        :param v: 重心座標vの分子
+
+        :type t_numerator: np.ndarray
+        :param t_numerator: パラメータtの分子
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: np.ndarray
+        :return: 交差判定マスク
+
+        """
+        is_two_sided = hit_mode != BaseRayEngine.HIT_MODE.FIRST
+        if is_two_sided:
+            # 裏面は符号を反転して、表面と同じ式で判定する
+            sign = np.where(denominator < 0, -1., 1.)
+            denominator = denominator * sign
+            u = u * sign
+            v = v * sign
+
+        mask = denominator > np.finfo(float).eps
+        mask &= 0 <= u
+        mask &= u <= denominator
+        mask &= 0 <= v
+        mask &= v <= denominator
+        mask &= (u + v) <= denominator
+
+        if is_two_sided:
+            mask &= t_numerator * sign >= 0
+
+        return mask
+
+    @staticmethod
+    def _hit_mask(rays, det_normals, u_normals, Q, t_numerators, hit_mode):
+        """
+
+        レイのブロックと三角形のブロックの交差判定を行う
+
+        :type rays: np.ndarray
+        :param rays: レイ方向配列 shape=(n_ray, 3)
+
+        :type det_normals: np.ndarray
+        :param det_normals: 各面の e2 x e1 shape=(n_face, 3)
+
+        :type u_normals: np.ndarray
+        :param u_normals: 各面の e2 x T shape=(n_face, 3)
+
+        :type Q: np.ndarray
+        :param Q: 各面の T x e1 shape=(n_face, 3)
+
+        :type t_numerators: np.ndarray
+        :param t_numerators: 各面の (T x e1).e2 shape=(n_face,)
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 交差判定マスク shape=(n_ray, n_face), 分母 shape=(n_ray, n_face)
+
+        """
+        denominator = np.dot(rays, det_normals.T)
+        u = np.dot(rays, u_normals.T)
+        v = np.dot(rays, Q.T)
+
+        return BatchRayEngine._is_hit(denominator, u, v, t_numerators,
+                                      hit_mode), denominator
+
+    @staticmethod
+    def _pair_mask(rays, ray_ids, face_ids, terms, hit_mode):
+        """
+
+        (レイ, 三角形)の組ごとに交差判定を行う
+
+        :type rays: np.ndarray
+        :param rays: レイ方向配列 shape=(n_ray, 3)
+
+        :type ray_ids: np.ndarray
+        :param ray_ids: 組のレイのインデックス
+
+        :type face_ids: np.ndarray
+        :param face_ids: 組の三角形のインデックス
+
+        :type terms: tuple
+        :param terms: _triangle_terms()の戻り値
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 交差判定マスク shape=(n_pair,), 分母 shape=(n_pair,)
+
+        """
+        det_normals, u_normals, Q, t_numerators = terms
+
+        pair_rays = rays[ray_ids]
+        denominator = np.einsum('ij,ij->i', pair_rays, det_normals[face_ids])
+        u = np.einsum('ij,ij->i', pair_rays, u_normals[face_ids])
+        v = np.einsum('ij,ij->i', pair_rays, Q[face_ids])
+
+        return BatchRayEngine._is_hit(denominator, u, v,
+                                      t_numerators[face_ids],
+                                      hit_mode), denominator
+
+    @staticmethod
+    def _hits_of_pairs(rays, ray_ids, face_ids, terms, hit_mode):
+        """
+
+        (レイ, 三角形)の組ごとに交差判定し、hit_modeに従って絞り込んだ
+        交点を返す
+
+        :type rays: np.ndarray
+        :param rays: レイ方向配列 shape=(n_ray, 3)
+
+        :type ray_ids: np.ndarray
+        :param ray_ids: 組のレイのインデックス
+
+        :type face_ids: np.ndarray
+        :param face_ids: 組の三角形のインデックス
+
+        :type terms: tuple
+        :param terms: _triangle_terms()の戻り値
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: (np.ndarray, np.ndarray, np.ndarray)
+        :return: レイのインデックス, 三角形のインデックス, パラメータt
+
+        """
+        t_numerators = terms[3]
+
+        is_hit, denominator = BatchRayEngine._pair_mask(rays, ray_ids,
+                                                        face_ids, terms,
+                                                        hit_mode)
+        face_ids = face_ids[is_hit]
+
+        return BaseRayEngine._reduce_hits(
+            ray_ids[is_hit], face_ids,
+            t_numerators[face_ids] / denominator[is_hit], hit_mode)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import time
+import numpy as np
+from src.util.array_util import concatenate_ranges
+
+
+class BoundingVolumeHierarchy(object):
+    """
+
+    三角形の集合に対する軸平行境界ボックス(AABB)の二分木
+    ノードは幅優先順に平坦な配列として保持する
+    内部ノードの子はnode_left[i], node_left[i] + 1
+    葉ノードはnode_left[i] == LEAF で、
+    triangle_indices[node_start[i]:node_start[i] + node_count[i]]を持つ
+
+    """
+
+    LEAF = -1
+    DEFAULT_LEAF_SIZE = 8
+
+    def __init__(self, face_min, face_max, leaf_size=DEFAULT_LEAF_SIZE):
+        """
+
+        :type face_min: np.ndarray
+        :param face_min: 各三角形のAABBの最小座標 shape=(n_face, 3)
+
+        :type face_max: np.ndarray
+        :param face_max: 各三角形のAABBの最大座標 shape=(n_face, 3)
+
+        :type leaf_size: int or long
+        :param leaf_size: 葉ノードが持つ三角形の最大数
+
+        """
+        assert isinstance(leaf_size, (int, long)) and leaf_size > 0
+        assert face_min.shape == face_max.shape and len(face_min) > 0
+
+        self.leaf_size = leaf_size
+
+        start = time.time()
+        self.__build(face_min, face_max)
+        # 構築時間[s]
+        self.build_time = time.time() - start
+
+    def __build(self, face_min, face_max):
+        """
+
+        重心の中央値で分割しながら、木を一階層ずつベクトル演算で構築する
+
+        :type face_min: np.ndarray
+        :param face_min: 各三角形のAABBの最小座標
+
+        :type face_max: np.ndarray
+        :param face_max: 各三角形のAABBの最大座標
+
+        """
+        n_face = len(face_min)
+        centroids = (face_min + face_max) * 0.5
+
+        # 葉のみ三角形を持つ二分木なので、ノード数は高々 2 * n_face - 1
+        max_nodes = 2 * n_face - 1
+        node_min = np.empty(shape=(max_nodes, 3))
+        node_max = np.empty(shape=(max_nodes, 3))
+        node_left = np.full(shape=(max_nodes,),
+                            fill_value=BoundingVolumeHierarchy.LEAF,
+                            dtype=np.int32)
+        node_start = np.zeros(shape=(max_nodes,), dtype=np.int32)
+        node_count = np.zeros(shape=(max_nodes,), dtype=np.int32)
+
+        triangle_indices = np.arange(n_face, dtype=np.int32)
+
+        node_count[0] = n_face
+        n_nodes = 1
+        level = np.array([0])
+        depth = 0
+
+        while len(level) > 0:
+            starts = node_start[level]
+            counts = node_count[level]
+
+            # この階層の全ノードに属する要素を連結したインデックス
+            offsets = np.cumsum(counts) - counts
+            positions = concatenate_ranges(starts, counts)
+            members = triangle_indices[positions]
+
+            node_min[level] = np.minimum.reduceat(face_min[members], offsets)
+            node_max[level] = np.maximum.reduceat(face_max[members], offsets)
+
+            is_split = counts > self.leaf_size
+            if not is_split.any():
+                break
+
+            # 分割するノードの要素のみ、重心の最も広がる軸でソートする
+            segment_ids = np.repeat(np.arange(len(level)), counts)
+            is_split_member = is_split[segment_ids]
+            positions = positions[is_split_member]
+            members = members[is_split_member]
+            segment_ids = segment_ids[is_split_member]
+
+            split_nodes = level[is_split]
+            split_offsets = np.cumsum(counts[is_split]) - counts[is_split]
+            c_min = np.minimum.reduceat(centroids[members], split_offsets)
+            c_max = np.maximum.reduceat(centroids[members], split_offsets)
+            axes = np.argmax(c_max - c_min, axis=1)
+
+            split_index = np.cumsum(is_split) - 1
+            keys = centroids[members, axes[split_index[segment_ids]]]
+            triangle_indices[positions] = members[
+                np.lexsort((keys, segment_ids))]
+
+            # 子ノードの生成
+            n_split = len(split_nodes)
+            lefts = n_nodes + 2 * np.arange(n_split)
+            half = node_count[split_nodes] // 2
+
+            node_left[split_nodes] = lefts
+            node_start[lefts] = node_start[split_nodes]
+            node_count[lefts] = half
+            node_start[lefts + 1] = node_start[split_nodes] + half
+            node_count[lefts + 1] = node_count[split_nodes] - half
+
+            n_nodes += 2 * n_split
+            level = np.stack((lefts, lefts + 1), axis=1).ravel()
+            depth += 1
+
+        self.node_min = node_min[:n_nodes]
+        self.node_max = node_max[:n_nodes]
+        self.node_left = node_left[:n_nodes]
+        self.node_start = node_start[:n_nodes]
+        self.node_count = node_count[:n_nodes]
+        self.triangle_indices = triangle_indices
+        self.depth = depth
+
+    def candidates(self, origin, rays, t_min=-np.inf):
+        """
+
+        各レイの直線が通過する葉ノードを辿り、交差し得る(レイ, 三角形)の組を返す
+        全レイを同時に幅優先で走査する
+
+        :type origin: np.ndarray
+        :param origin: レイの始点
+
+        :type rays: np.ndarray
+        :param rays: レイ方向配列 shape=(n_ray, 3)
+
+        :type t_min: float
+        :param t_min: レイのパラメータtの下限 -infの場合は直線として扱う
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: レイのインデックス, 三角形のインデックス
+
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv_rays = 1. / rays
+
+        ray_ids = np.arange(len(rays))
+        node_ids = np.zeros(shape=(len(rays),), dtype=np.int32)
+
+        leaf_ray_ids = []
+        leaf_node_ids = []
+
+        while len(ray_ids) > 0:
+            is_hit = self.__slab_test(origin, rays[ray_ids],
+                                      inv_rays[ray_ids], node_ids, t_min)
+            ray_ids = ray_ids[is_hit]
+            node_ids = node_ids[is_hit]
+
+            is_leaf = self.node_left[node_ids] == BoundingVolumeHierarchy.LEAF
+            leaf_ray_ids.append(ray_ids[is_leaf])
+            leaf_node_ids.append(node_ids[is_leaf])
+
+            # 内部ノードは２つの子ノードへ展開する
+            ray_ids = np.repeat(ray_ids[~is_leaf], 2)
+            node_ids = self.node_left[node_ids[~is_leaf]]
+            node_ids = np.stack((node_ids, node_ids + 1), axis=1).ravel()
+
+        leaf_ray_ids = np.concatenate(leaf_ray_ids)
+        leaf_node_ids = np.concatenate(leaf_node_ids)
+
+        # 葉ノードを三角形へ展開する
+        counts = self.node_count[leaf_node_ids]
+        positions = concatenate_ranges(self.node_start[leaf_node_ids], counts)
+
+        return np.repeat(leaf_ray_ids, counts), \
+               self.triangle_indices[positions]
+
+    def __slab_test(self, origin, rays, inv_rays, node_ids, t_min):
+        """
+
+        レイとノードのAABBの交差判定(スラブ法)
+
+        :rtype: np.ndarray
+        :return: 交差判定マスク
+
+        """
+        # 境界上の交差を取りこぼさないよう、ボックスをわずかに広げる
+        margin = 1e-9
+        lower = self.node_min[node_ids] - margin - origin
+        upper = self.node_max[node_ids] + margin - origin
+
+        with np.errstate(invalid='ignore'):
+            t1 = lower * inv_rays
+            t2 = upper * inv_rays
+
+        # 軸に平行なレイは、始点がスラブの内側にあるときのみ通過する
+        is_parallel = rays == 0
+        is_inside = (lower <= 0) & (0 <= upper)
+        t1 = np.where(is_parallel, np.where(is_inside, -np.inf, np.inf), t1)
+        t2 = np.where(is_parallel, np.where(is_inside, np.inf, -np.inf), t2)
+
+        t_near = np.maximum(np.minimum(t1, t2).max(axis=1), t_min)
+        t_far = np.maximum(t1, t2).min(axis=1)
+
+        return t_near <= t_far
+
+    def __str__(self):
+        """
+
+        :rtype: str
+        :return: str化した時のBoundingVolumeHierarchyの文字列
+
+        """
+        n_leaves = np.count_nonzero(
+            self.node_left == BoundingVolumeHierarchy.LEAF)
+        return "BVH ( faces : {}, nodes : {}, leaves : {}, depth : {}, " \
+               "build : {:.4f} s )".format(len(self.triangle_indices),
+                                           len(self.node_left), n_leaves,
+                                           self.depth, self.build_time)
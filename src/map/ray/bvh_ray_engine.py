@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+from candidate_ray_engine import CandidateRayEngine
+from bvh import BoundingVolumeHierarchy
+
+
+class BvhRayEngine(CandidateRayEngine):
+    """
+
+    BoundingVolumeHierarchyで候補を絞り込んだ(レイ, 三角形)の組のみを
+    交差判定するエンジン
+
+    """
+
+    def __init__(self, obj3d,
+                 leaf_size=BoundingVolumeHierarchy.DEFAULT_LEAF_SIZE,
+                 ray_block_size=CandidateRayEngine.DEFAULT_RAY_BLOCK_SIZE):
+        """
+
+        :type obj3d: Obj3d
+        :param obj3d: レイを投射する対象の3Dオブジェクト
+
+        :type leaf_size: int or long
+        :param leaf_size: BVHの葉ノードが持つ三角形の最大数
+
+        :type ray_block_size: int or long
+        :param ray_block_size: 一度に木を走査するレイの数
+
+        """
+        super(BvhRayEngine, self).__init__(obj3d,
+                                           ray_block_size=ray_block_size)
+
+        face_min, face_max = self.triangles.bounds()
+        self.bvh = BoundingVolumeHierarchy(face_min, face_max, leaf_size)
+
+    def _candidates(self, origin, rays, is_line):
+        """
+
+        BVHを走査し、交差し得る(レイ, 三角形)の組を返す
+
+        :type origin: np.ndarray
+        :param origin: レイの始点
+
+        :type rays: np.ndarray
+        :param rays: レイ方向配列 shape=(n_ray, 3)
+
+        :type is_line: bool
+        :param is_line: レイを始点の逆側にも延びる直線として扱うかどうか
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: レイのインデックス, 三角形のインデックス
+
+        """
+        t_min = -np.inf if is_line else 0.
+        return self.bvh.candidates(origin, rays, t_min)
+
+    def __str__(self):
+        """
+
+        :rtype: str
+        :return: str化した時のBvhRayEngineの文字列
+
+        """
+        return "{}\n{}".format(self.bvh,
+                               super(BvhRayEngine, self).__str__())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import time
+import numpy as np
+from base_ray_engine import BaseRayEngine
+from batch_ray_engine import BatchRayEngine
+
+
+class CandidateRayEngine(BatchRayEngine):
+    """
+
+    加速構造で絞り込んだ(レイ, 三角形)の候補の組のみを交差判定するエンジンの基底クラス
+    サブクラスは_candidates()で候補の組を返す
+
+    """
+
+    DEFAULT_RAY_BLOCK_SIZE = 4096
+
+    def __init__(self, obj3d, ray_block_size=DEFAULT_RAY_BLOCK_SIZE):
+        """
+
+        :type obj3d: Obj3d
+        :param obj3d: レイを投射する対象の3Dオブジェクト
+
+        :type ray_block_size: int or long
+        :param ray_block_size: 一度に候補を列挙するレイの数
+
+        """
+        super(CandidateRayEngine, self).__init__(obj3d,
+                                                 ray_block_size=ray_block_size)
+
+        # 直近のdistances()の所要時間[s]と判定した(レイ, 三角形)の組の数
+        self.query_time = 0.
+        self.n_tests = 0
+
+    def _candidates(self, origin, rays, is_line):
+        """
+
+        交差し得る(レイ, 三角形)の組を返す
+
+        :type origin: np.ndarray
+        :param origin: レイの始点
+
+        :type rays: np.ndarray
+        :param rays: レイ方向配列 shape=(n_ray, 3)
+
+        :type is_line: bool
+        :param is_line: レイを始点の逆側にも延びる直線として扱うかどうか
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: レイのインデックス, 三角形のインデックス
+
+        """
+        raise NotImplementedError
+
+    def distances(self, ends, origin=None,
+                  hit_mode=BaseRayEngine.HIT_MODE.FIRST):
+        """
+
+        各レイについて、hit_modeに従って選んだ交点までの距離を返す
+
+        :type ends: np.ndarray
+        :param ends: レイの終点座標配列 shape=(n_ray, 3)
+
+        :type origin: np.ndarray
+        :param origin: レイの始点 Noneの場合は座標原点
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: np.ndarray or RayHits
+        :return: 各レイに対応する距離の配列 shape=(n_ray,)
+                 hit_modeがALLの場合はRayHits
+
+        """
+        start = time.time()
+
+        origin, rays = self._as_rays(ends, origin)
+        terms = self._triangle_terms(origin)
+        # FIRSTは従来の判定と同じく始点の逆側の交点も含む
+        is_line = hit_mode == BaseRayEngine.HIT_MODE.FIRST
+
+        hit_ray_ids = [np.zeros(shape=(0,), dtype=np.int64)]
+        hit_t = [np.zeros(shape=(0,))]
+
+        self.n_tests = 0
+
+        for r_start in xrange(0, len(rays), self.ray_block_size):
+            r_stop = min(r_start + self.ray_block_size, len(rays))
+
+            ray_ids, face_ids = self._candidates(
+                origin, rays[r_start:r_stop], is_line)
+            ray_ids = ray_ids + r_start
+            self.n_tests += len(ray_ids)
+
+            ray_ids, _, t = self._hits_of_pairs(rays, ray_ids, face_ids,
+                                                terms, hit_mode)
+            hit_ray_ids.append(ray_ids)
+            hit_t.append(t)
+
+        ray_ids = np.concatenate(hit_ray_ids)
+        distances = np.abs(np.concatenate(hit_t)) * np.linalg.norm(
+            rays[ray_ids], axis=1)
+
+        self.query_time = time.time() - start
+
+        return self._as_result(len(rays), ray_ids, distances, hit_mode)
+
+    def __str__(self):
+        """
+
+        :rtype: str
+        :return: str化した時のCandidateRayEngineの文字列
+
+        """
+        return "query : {:.4f} s ( ray-triangle tests : {} )".format(
+            self.query_time, self.n_tests)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import time
+import numpy as np
+from base_ray_engine import BaseRayEngine
+from batch_ray_engine import BatchRayEngine
+from src.obj.grid.triangle_grid import TriangleGrid
+from src.util.array_util import concatenate_ranges
+
+
+class HierarchicalRayEngine(BatchRayEngine):
+    """
+
+    グリッドの粗い格子点(各面の(alpha, beta)がcoarse_stepの倍数の頂点)のレイのみを
+    全ての三角形と判定し、それ以外の頂点のレイは、その頂点を含む粗いセルの頂点の
+    レイがほぼ交差した三角形のみと判定する
+
+    ほぼ交差した三角形は、三角形の外接球がレイから
+    セルの角度幅の範囲内にあるものとする
+    セル内のレイが交差する三角形は全てセルの各頂点の候補に含まれるので、
+    結果は全ての三角形と判定した場合と同じになる
+    候補が多すぎるセルのレイは、全ての三角形とまとめて判定する
+
+    レイの始点は座標原点(グリッドの中心)、終点はグリッドの全頂点に限る
+
+    """
+
+    DEFAULT_FALLBACK_RATIO = 0.25
+
+    def __init__(self, obj3d, grid, n_coarse_div=None,
+                 fallback_ratio=DEFAULT_FALLBACK_RATIO,
+                 ray_block_size=BatchRayEngine.DEFAULT_RAY_BLOCK_SIZE,
+                 face_block_size=BatchRayEngine.DEFAULT_FACE_BLOCK_SIZE):
+        """
+
+        :type obj3d: Obj3d
+        :param obj3d: レイを投射する対象の3Dオブジェクト
+
+        :type grid: TriangleGrid
+        :param grid: 原点を中心とする、面分割済みのグリッド
+
+        :type n_coarse_div: int or long
+        :param n_coarse_div: 粗い格子の各面の分割数 grid.n_divの約数
+                             Noneの場合、粗いセルの一辺が細かいセル4つ分以下で
+                             最大となるよう決める
+
+        :type fallback_ratio: float
+        :param fallback_ratio: 候補の三角形数が全三角形数のこの割合を超えるレイは、
+                               全ての三角形と判定する
+
+        :type ray_block_size: int or long
+        :param ray_block_size: 一度に判定するレイの数
+
+        :type face_block_size: int or long
+        :param face_block_size: 一度に判定する三角形の数
+
+        """
+        super(HierarchicalRayEngine, self).__init__(
+            obj3d, ray_block_size=ray_block_size,
+            face_block_size=face_block_size)
+        assert isinstance(grid, TriangleGrid)
+        assert isinstance(fallback_ratio, float) and fallback_ratio >= 0
+
+        n = grid.n_div
+        if n_coarse_div is None:
+            coarse_step = max(s for s in xrange(1, min(n, 4) + 1)
+                              if n % s == 0)
+            n_coarse_div = n // coarse_step
+        assert isinstance(n_coarse_div, (int, long)) and \
+               0 < n_coarse_div <= n and n % n_coarse_div == 0
+
+        self.grid = grid
+        self.n_coarse_div = n_coarse_div
+        self.coarse_step = n // n_coarse_div
+        self.fallback_ratio = fallback_ratio
+
+        self.is_coarse, self.parents = self.__parent_vertices()
+
+        # セル内のレイとセルの頂点のレイがなす角の最大値の正弦
+        directions = grid.vertices / np.linalg.norm(grid.vertices,
+                                                    axis=1)[:, np.newaxis]
+        corners = directions[self.parents]
+        cosines = np.minimum(np.einsum('ijk,ijk->ij', corners,
+                                       np.roll(corners, 1, axis=1)).min(), 1.)
+        self.sin_cell_angle = np.sqrt(1. - cosines * cosines)
+
+        # 直近のdistances()の所要時間[s]、判定した(レイ, 三角形)の組の数、
+        # 全ての三角形と判定したレイの数
+        self.query_time = 0.
+        self.n_tests = 0
+        self.n_fallback = 0
+
+    def __parent_vertices(self):
+        """
+
+        各グリッド頂点について、粗い格子点かどうかと、
+        その頂点を含む粗いセルの3頂点のインデックスを求める
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 粗い格子点かどうか shape=(n_vertex,),
+                 セルの頂点インデックス shape=(n_vertex, 3)
+
+        """
+        s = self.coarse_step
+        n_vertex = len(self.grid.vertices)
+
+        # 各頂点を、その頂点を含むいずれかの面の(alpha, beta)座標で表す
+        tables = self.grid.vertex_table.tables
+        face_ids = np.zeros(shape=(n_vertex,), dtype=np.int64)
+        alpha = np.zeros(shape=(n_vertex,), dtype=np.int64)
+        beta = np.zeros(shape=(n_vertex,), dtype=np.int64)
+        face_indices, a, b = np.nonzero(tables >= 0)
+        vertex_ids = tables[face_indices, a, b]
+        face_ids[vertex_ids] = face_indices
+        alpha[vertex_ids] = a
+        beta[vertex_ids] = b
+
+        i, ra = np.divmod(alpha, s)
+        j, rb = np.divmod(beta, s)
+        is_coarse = (ra == 0) & (rb == 0)
+
+        # セル内の位置で、上向き (i, j), (i + 1, j), (i, j + 1) と
+        # 下向き (i + 1, j), (i, j + 1), (i + 1, j + 1) の三角形セルを区別する
+        is_upward = ra + rb <= s
+        corner_alpha = np.stack((np.where(is_upward, i, i + 1),
+                                 np.where(is_upward, i + 1, i),
+                                 np.where(is_upward, i, i + 1)), axis=1) * s
+        corner_beta = np.stack((j, np.where(is_upward, j, j + 1), j + 1),
+                               axis=1) * s
+        # 粗い格子点の親は自身
+        corner_alpha[is_coarse] = alpha[is_coarse, np.newaxis]
+        corner_beta[is_coarse] = beta[is_coarse, np.newaxis]
+
+        parents = tables[face_ids[:, np.newaxis], corner_alpha, corner_beta]
+        assert (parents >= 0).all()
+
+        return is_coarse, parents
+
+    def distances(self, ends, origin=None,
+                  hit_mode=BaseRayEngine.HIT_MODE.FIRST):
+        """
+
+        各グリッド頂点について、hit_modeに従って選んだ交点までの距離を返す
+
+        :type ends: np.ndarray
+        :param ends: グリッドの頂点座標配列 shape=(n_vertex, 3)
+
+        :type origin: np.ndarray
+        :param origin: レイの始点 Noneの場合は座標原点
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: np.ndarray or RayHits
+        :return: 各グリッド頂点に対応する距離の配列 shape=(n_vertex,)
+                 hit_modeがALLの場合はRayHits
+
+        """
+        start = time.time()
+
+        origin, rays = self._as_rays(ends, origin)
+        # 候補はグリッドの構造から求めるので、レイの終点はグリッドの全頂点に限る
+        if np.any(origin != 0) or not (
+                ends is self.grid.vertices or
+                np.array_equal(rays, self.grid.vertices)):
+            raise NotImplementedError
+
+        terms = self._triangle_terms(origin)
+        n_face = len(self.v0)
+
+        # 粗い格子点のレイは全ての三角形と判定する
+        coarse_ids = np.flatnonzero(self.is_coarse)
+        coarse_hit_ids, coarse_t = self._cast(rays[coarse_ids], terms,
+                                              hit_mode)
+        near_offsets, near_face_ids = self._near_triangles(rays[coarse_ids])
+
+        # それ以外のレイは、セルの頂点のうち候補が最も少ない頂点の候補と判定する
+        coarse_index = np.full(shape=(len(rays),), fill_value=-1,
+                               dtype=np.int64)
+        coarse_index[coarse_ids] = np.arange(len(coarse_ids))
+
+        fine_ids = np.flatnonzero(~self.is_coarse)
+        parents = coarse_index[self.parents[fine_ids]]
+        n_near = near_offsets[parents + 1] - near_offsets[parents]
+        nearest_parents = parents[np.arange(len(fine_ids)),
+                                  np.argmin(n_near, axis=1)]
+        n_near = n_near.min(axis=1)
+
+        is_fallback = n_near > self.fallback_ratio * n_face
+        fallback_ids = fine_ids[is_fallback]
+        fine_ids = fine_ids[~is_fallback]
+        starts = near_offsets[nearest_parents[~is_fallback]]
+        n_near = n_near[~is_fallback]
+
+        fine_hit_ids, _, fine_t = self._hits_of_pairs(
+            rays, np.repeat(fine_ids, n_near),
+            near_face_ids[concatenate_ranges(starts, n_near)], terms,
+            hit_mode)
+
+        # 候補が多すぎるレイは全ての三角形とまとめて判定する
+        fallback_hit_ids, fallback_t = self._cast(rays[fallback_ids], terms,
+                                                  hit_mode)
+
+        self.n_tests = (len(coarse_ids) + len(fallback_ids)) * n_face + \
+                       n_near.sum()
+        self.n_fallback = len(fallback_ids)
+
+        # 各レイの交点はいずれか一つの判定にのみ含まれる
+        ray_ids = np.concatenate((coarse_ids[coarse_hit_ids], fine_hit_ids,
+                                  fallback_ids[fallback_hit_ids]))
+        t = np.concatenate((coarse_t, fine_t, fallback_t))
+        order = np.argsort(ray_ids, kind='mergesort')
+        ray_ids = ray_ids[order]
+        distances = np.abs(t[order]) * np.linalg.norm(rays[ray_ids], axis=1)
+
+        self.query_time = time.time() - start
+
+        return self._as_result(len(rays), ray_ids, distances, hit_mode)
+
+    def _near_triangles(self, rays):
+        """
+
+        各レイについて、レイを軸とする角度幅のセルの範囲内に外接球がかかる
+        三角形を求める
+        三角形上の点pがレイからの角度θ以内にあるとき、外接球の中心cと半径rについて
+        |c x d| <= r + (|c| + r) sinθ (dはレイの単位方向ベクトル)が成り立つ
+
+        :type rays: np.ndarray
+        :param rays: レイ方向配列 shape=(n_ray, 3)
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 各レイの候補の先頭位置 shape=(n_ray + 1,),
+                 候補の三角形のインデックス
+
+        """
+        centers, radii = self.triangles.bounding_spheres()
+        center_norms = np.linalg.norm(centers, axis=1)
+        squared_norms = center_norms * center_norms
+        bounds = radii + (center_norms + radii) * self.sin_cell_angle
+        # 丸め誤差で候補を取りこぼさないための余白
+        bounds = bounds * (1. + 1e-9) + 1e-12
+        squared_bounds = bounds * bounds
+
+        directions = rays / np.linalg.norm(rays, axis=1)[:, np.newaxis]
+
+        near_ray_ids = [np.zeros(shape=(0,), dtype=np.int64)]
+        near_face_ids = [np.zeros(shape=(0,), dtype=np.int64)]
+
+        for r_start in xrange(0, len(rays), self.ray_block_size):
+            r_stop = min(r_start + self.ray_block_size, len(rays))
+
+            for f_start in xrange(0, len(self.v0), self.face_block_size):
+                f_stop = min(f_start + self.face_block_size, len(self.v0))
+
+                # |c x d|^2 = |c|^2 - (c.d)^2
+                projections = np.dot(directions[r_start:r_stop],
+                                     centers[f_start:f_stop].T)
+                is_near = squared_norms[f_start:f_stop] - \
+                    projections * projections <= \
+                    squared_bounds[f_start:f_stop]
+
+                rows, columns = np.nonzero(is_near)
+                near_ray_ids.append(r_start + rows)
+                near_face_ids.append(f_start + columns)
+
+        near_ray_ids = np.concatenate(near_ray_ids)
+        near_face_ids = np.concatenate(near_face_ids)
+        order = np.argsort(near_ray_ids, kind='mergesort')
+
+        near_offsets = np.zeros(shape=(len(rays) + 1,), dtype=np.int64)
+        near_offsets[1:] = np.cumsum(
+            np.bincount(near_ray_ids, minlength=len(rays)))
+
+        return near_offsets, near_face_ids[order]
+
+    def __str__(self):
+        """
+
+        :rtype: str
+        :return: str化した時のHierarchicalRayEngineの文字列
+
+        """
+        return "hierarchical : {:.4f} s ( coarse n_div : {}, " \
+               "ray-triangle tests : {}, fallback rays : {} )".format(
+                self.query_time, self.n_coarse_div, self.n_tests,
+                self.n_fallback)
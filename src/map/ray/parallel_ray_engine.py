@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import multiprocessing
+import numpy as np
+from multiprocessing.sharedctypes import RawArray
+from base_ray_engine import BaseRayEngine
+from ray_hits import RayHits
+from src.obj.obj3d import Obj3d
+
+# ワーカープロセスごとのレイ投射エンジンと、共有メモリ上の固定の終点
+_worker_engine = None
+_worker_ends = None
+
+
+def _as_shared(array):
+    """
+
+    配列をプロセス間で共有するメモリへ一度だけ複製する
+
+    :type array: np.ndarray
+    :param array: 共有する配列
+
+    :rtype: (RawArray, str, tuple)
+    :return: 共有メモリ, dtype, shape
+
+    """
+    array = np.ascontiguousarray(array)
+    shared = RawArray('b', max(array.nbytes, 1))
+    np.frombuffer(shared, dtype=array.dtype, count=array.size)[:] = \
+        array.ravel()
+    return shared, array.dtype.str, array.shape
+
+
+def _from_shared(shared, dtype, shape):
+    """
+
+    共有メモリを複製せずにnumpy配列として参照する
+
+    :rtype: np.ndarray
+    :return: 共有メモリ上の配列
+
+    """
+    count = int(np.prod(shape))
+    return np.frombuffer(shared, dtype=dtype, count=count).reshape(shape)
+
+
+def _init_worker(vertices, face_vertices, ends, engine_class, engine_args,
+                 engine_options):
+    """
+
+    ワーカープロセスの初期化
+    共有メモリ上のメッシュからレイ投射エンジンを生成し、
+    固定の終点を複製せずに参照する
+    エンジンはプールを閉じるまで全てのdistances()で使う
+
+    """
+    global _worker_engine, _worker_ends
+
+    obj3d = Obj3d(_from_shared(*vertices), None, _from_shared(*face_vertices),
+                  is_assertion_enabled=False)
+    _worker_engine = engine_class(obj3d, *engine_args, **engine_options)
+    _worker_ends = _from_shared(*ends)
+
+
+def _cast_chunk(task):
+    """
+
+    ワーカープロセスで、タスクのレイを投射する
+
+    :type task: (int, int, np.ndarray, np.ndarray, str)
+    :param task: 先頭の終点インデックス, 末尾の次の終点インデックス,
+                 レイの終点座標配列 Noneの場合は固定の終点のstart..stop,
+                 始点, hit_modeの名前
+
+    :rtype: np.ndarray or RayHits
+    :return: 各レイに対応する距離の配列 又は RayHits
+
+    """
+    start, stop, ends, origin, hit_mode_name = task
+    if ends is None:
+        ends = _worker_ends[start:stop]
+    return _worker_engine.distances(ends, origin,
+                                    BaseRayEngine.HIT_MODE[hit_mode_name])
+
+
+class ParallelRayEngine(BaseRayEngine):
+    """
+
+    レイを分割し、プロセスプールの各ワーカーで別のエンジンに投射させるエンジン
+    メッシュと固定の終点(グリッド頂点等)は共有メモリへ一度だけ置き、
+    ワーカーは複製せずに参照するので、タスクには終点の範囲のみを渡す
+    固定の終点以外の終点(回転したグリッド頂点等)は、タスクごとに分割して渡す
+    プールは最初のdistances()で生成してclose()まで使い続けるので、
+    各ワーカーはengine_classのエンジンを一度だけ生成する
+
+    """
+
+    def __init__(self, obj3d, engine_class, engine_args=(),
+                 engine_options=None, n_workers=None, chunk_size=None,
+                 fixed_ends=None):
+        """
+
+        :type obj3d: Obj3d
+        :param obj3d: レイを投射する対象の3Dオブジェクト
+
+        :type engine_class: type
+        :param engine_class: ワーカーで使うBaseRayEngineのサブクラス
+
+        :type engine_args: tuple
+        :param engine_args: engine_classのコンストラクタにobj3dに続けて渡す引数
+
+        :type engine_options: dict
+        :param engine_options: engine_classのコンストラクタに渡すキーワード引数
+
+        :type n_workers: int or long
+        :param n_workers: ワーカープロセス数 Noneの場合はCPU数
+
+        :type chunk_size: int or long
+        :param chunk_size: 一つのタスクで投射するレイの数
+                           Noneの場合、ワーカーあたり4タスク程度になるよう決める
+
+        :type fixed_ends: np.ndarray
+        :param fixed_ends: 繰り返し投射するレイの終点座標配列(グリッド頂点等)
+                           shape=(n_ray, 3) 共有メモリへ一度だけ置く
+
+        """
+        super(ParallelRayEngine, self).__init__(obj3d)
+        assert issubclass(engine_class, BaseRayEngine)
+        assert isinstance(engine_options, dict) or engine_options is None
+        if n_workers is None:
+            n_workers = multiprocessing.cpu_count()
+        assert isinstance(n_workers, (int, long)) and n_workers > 0
+        assert chunk_size is None or \
+               (isinstance(chunk_size, (int, long)) and chunk_size > 0)
+
+        self.engine_class = engine_class
+        self.engine_args = tuple(engine_args)
+        self.engine_options = {} if engine_options is None \
+            else engine_options
+        self.n_workers = n_workers
+        self.chunk_size = chunk_size
+
+        # メッシュは全てのdistances()で共有する
+        self.shared_vertices = _as_shared(
+            np.asarray(obj3d.vertices, dtype=np.float64))
+        self.shared_face_vertices = _as_shared(
+            np.asarray(obj3d.face_vertices, dtype=np.int64))
+        # 固定の終点もワーカーの生成前に置き、全てのdistances()で共有する
+        self.fixed_ends = np.zeros(shape=(0, 3)) if fixed_ends is None \
+            else np.array(fixed_ends, dtype=np.float64).reshape(-1, 3)
+        self.shared_ends = _as_shared(self.fixed_ends)
+
+        # プロセスプール 最初のdistances()で生成する
+        self.pool = None
+
+    def distances(self, ends, origin=None,
+                  hit_mode=BaseRayEngine.HIT_MODE.FIRST):
+        """
+
+        レイを分割してワーカーで投射し、結果を元の順に連結して返す
+
+        :type ends: np.ndarray
+        :param ends: レイの終点座標配列 shape=(n_ray, 3)
+
+        :type origin: np.ndarray
+        :param origin: レイの始点 Noneの場合は座標原点
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: np.ndarray or RayHits
+        :return: 各レイに対応する距離の配列 shape=(n_ray,)
+                 hit_modeがALLの場合はRayHits
+
+        """
+        origin, rays = self._as_rays(ends, origin)
+        ends = rays + origin
+        # 固定の終点の場合は、共有メモリ上の終点の範囲のみを渡す
+        is_fixed = np.array_equal(ends, self.fixed_ends)
+
+        chunk_size = self.chunk_size
+        if chunk_size is None:
+            chunk_size = max(1, -(-len(ends) // (4 * self.n_workers)))
+        tasks = [(start, min(start + chunk_size, len(ends)),
+                  None if is_fixed else ends[start:start + chunk_size],
+                  origin, hit_mode.name)
+                 for start in xrange(0, len(ends), chunk_size)]
+
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(
+                self.n_workers, _init_worker,
+                (self.shared_vertices, self.shared_face_vertices,
+                 self.shared_ends, self.engine_class, self.engine_args,
+                 self.engine_options))
+        try:
+            # mapはタスクの順に結果を返す
+            results = self.pool.map(_cast_chunk, tasks)
+        except BaseException:
+            # 残りのタスクを待たずにワーカーを止める
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            raise
+
+        if hit_mode == BaseRayEngine.HIT_MODE.ALL:
+            return RayHits.concatenate(results)
+
+        if len(results) == 0:
+            return np.zeros(shape=(0,), dtype=np.float64)
+        return np.concatenate(results)
+
+    def close(self):
+        """
+
+        プロセスプールを閉じ、ワーカーの終了を待つ
+        閉じた後にdistances()を呼んだ場合は、プールを生成し直す
+
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __str__(self):
+        """
+
+        :rtype: str
+        :return: str化した時のParallelRayEngineの文字列
+
+        """
+        return "parallel : {} ( workers : {}, chunk size : {} )".format(
+            self.engine_class.__name__, self.n_workers, self.chunk_size)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+
+
+class RayHits(object):
+    """
+
+    レイごとの全交点の距離をCSR形式(offsets + distances)で保持するクラス
+    レイiの交点の距離はdistances[offsets[i]:offsets[i + 1]]に昇順で並ぶ
+
+    """
+
+    def __init__(self, offsets, distances):
+        """
+
+        :type offsets: np.ndarray
+        :param offsets: 各レイの交点の先頭位置 shape=(n_ray + 1,)
+
+        :type distances: np.ndarray
+        :param distances: 全レイの交点の距離を連結した配列
+
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        distances = np.asarray(distances, dtype=np.float64)
+        assert offsets.ndim == 1 and len(offsets) > 0 and offsets[0] == 0
+        assert offsets[-1] == len(distances)
+
+        self.offsets = offsets
+        self.distances = distances
+
+    @staticmethod
+    def from_hits(n_ray, ray_ids, distances):
+        """
+
+        レイのインデックス順、距離の昇順に並んだ交点からRayHitsを生成する
+
+        :type n_ray: int or long
+        :param n_ray: レイの数
+
+        :type ray_ids: np.ndarray
+        :param ray_ids: 各交点のレイのインデックス
+
+        :type distances: np.ndarray
+        :param distances: 各交点の距離
+
+        :rtype: RayHits
+        :return: RayHitsオブジェクト
+
+        """
+        offsets = np.zeros(shape=(n_ray + 1,), dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(ray_ids, minlength=n_ray))
+        return RayHits(offsets, distances)
+
+    @staticmethod
+    def concatenate(hits_list):
+        """
+
+        レイを分割して求めたRayHitsを、元のレイの順に連結する
+
+        :type hits_list: list(RayHits)
+        :param hits_list: 連結するRayHitsのリスト
+
+        :rtype: RayHits
+        :return: RayHitsオブジェクト
+
+        """
+        offsets = [np.zeros(shape=(1,), dtype=np.int64)]
+        n_hits = 0
+        for hits in hits_list:
+            offsets.append(hits.offsets[1:] + n_hits)
+            n_hits += len(hits.distances)
+        return RayHits(np.concatenate(offsets), np.concatenate(
+            [np.zeros(shape=(0,))] + [hits.distances for hits in hits_list]))
+
+    def __len__(self):
+        """
+
+        :rtype: int
+        :return: レイの数
+
+        """
+        return len(self.offsets) - 1
+
+    def __getitem__(self, ray_idx):
+        """
+
+        :type ray_idx: int or long
+        :param ray_idx: レイのインデックス
+
+        :rtype: np.ndarray
+        :return: レイの全交点の距離(昇順)
+
+        """
+        return self.distances[self.offsets[ray_idx]:self.offsets[ray_idx + 1]]
+
+    def counts(self):
+        """
+
+        :rtype: np.ndarray
+        :return: 各レイの交点数
+
+        """
+        return np.diff(self.offsets)
+
+    def layer(self, k, fill_value=-1):
+        """
+
+        各レイの始点側からk番目(0始まり)の交点の距離を返す
+        k < 0 の場合は終点側から数える
+        交点がk個以下のレイにはfill_valueを入れる
+
+        :type k: int or long
+        :param k: 層のインデックス
+
+        :type fill_value: float
+        :param fill_value: 交点が存在しないレイの値
+
+        :rtype: np.ndarray
+        :return: 各レイの距離の配列 shape=(n_ray,)
+
+        """
+        counts = self.counts()
+        if k >= 0:
+            is_defined = counts > k
+            positions = self.offsets[:-1] + k
+        else:
+            is_defined = counts >= -k
+            positions = self.offsets[1:] + k
+
+        layer = np.full(shape=(len(self),), fill_value=fill_value,
+                        dtype=np.float64)
+        layer[is_defined] = self.distances[positions[is_defined]]
+        return layer
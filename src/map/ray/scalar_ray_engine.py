@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+from base_ray_engine import BaseRayEngine
+
+
+class ScalarRayEngine(BaseRayEngine):
+    """
+
+    レイと三角形を一組ずつ交差判定する参照実装
+    高速なエンジンの検証用
+
+    """
+
+    def __init__(self, obj3d):
+        """
+
+        :type obj3d: Obj3d
+        :param obj3d: レイを投射する対象の3Dオブジェクト
+
+        """
+        super(ScalarRayEngine, self).__init__(obj3d)
+
+    @staticmethod
+    def tomas_moller(origin, end, v0, v1, v2):
+        """
+
+        Tomas-Mollerのアルゴリズム
+        線分と三角形の交点を返す
+        交差しない場合、Noneを返す
+
+        行列式を、外積/内積に置き換えている
+
+        :type origin: np.ndarray
+        :param origin: 線分の始点
+
+        :type end: np.ndarray
+        :param end: 線分の終点
+
+        :type v0 : np.ndarray
+        :param v0: 三角形の頂点その１
+
+        :type v1: np.ndarray
+        :param v1: 三角形の頂点その２
+
+        :type v2: np.ndarray
+        :param v2: 三角形の頂点その３
+
+        :rtype: np.ndarray
+        :return: 交点ベクトル
+
+        """
+        edge1 = v1 - v0
+        edge2 = v2 - v0
+        ray = end - origin
+
+        P = np.cross(ray, edge2)
+
+        # 分母
+        denominator = np.dot(P, edge1)
+
+        if denominator > np.finfo(float).eps:
+            T = origin - v0
+            u = np.dot(P, T)
+
+            if 0 <= u <= denominator:
+                Q = np.cross(T, edge1)
+                v = np.dot(Q, ray)
+
+                if 0 <= v <= denominator and (u + v) <= denominator:
+                    t = np.dot(Q, edge2) / denominator
+
+                    return origin + ray * t
+
+        return None
+
+    def distances(self, ends, origin=None,
+                  hit_mode=BaseRayEngine.HIT_MODE.FIRST):
+        """
+
+        各終点に対してファイル順に面を走査し、最初に交差した面までの距離を返す
+        参照実装のため、hit_modeはFIRSTのみ対応する
+
+        :type ends: np.ndarray
+        :param ends: レイの終点座標配列 shape=(n_ray, 3)
+
+        :type origin: np.ndarray
+        :param origin: レイの始点 Noneの場合は座標原点
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: np.ndarray
+        :return: 各レイに対応する距離の配列 shape=(n_ray,)
+
+        """
+        if hit_mode != BaseRayEngine.HIT_MODE.FIRST:
+            raise NotImplementedError
+
+        origin, _ = self._as_rays(ends, origin)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 3)
+
+        distances = np.full(shape=(len(ends),),
+                            fill_value=BaseRayEngine.DIST_UNDEFINED,
+                            dtype=np.float64)
+
+        triangles = self.obj3d.triangle_arrays()
+        triangles = zip(triangles.v0, triangles.v1, triangles.v2)
+
+        for i, end in enumerate(ends):
+            for f0, f1, f2 in triangles:
+                p_cross = self.tomas_moller(origin, end, f0, f1, f2)
+                if p_cross is not None:
+                    distances[i] = np.linalg.norm(p_cross - origin)
+                    break
+
+        return distances
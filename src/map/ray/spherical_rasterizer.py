@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import time
+import numpy as np
+from base_ray_engine import BaseRayEngine
+from batch_ray_engine import BatchRayEngine
+from src.obj.grid.triangle_grid import TriangleGrid
+from src.util.array_util import concatenate_ranges
+
+
+class SphericalRasterizer(BatchRayEngine):
+    """
+
+    グリッド頂点ごとにレイを投射する代わりに、3Dモデルの各三角形を
+    グリッドの各面の(alpha, beta)座標へ中心射影し、射影が覆うグリッド頂点のみを
+    交差判定して距離バッファへ書き込む(球面上のZバッファ)
+    計算量は 三角形数 + 覆われる頂点数 に比例する
+
+    レイの始点は座標原点(グリッドの中心)、終点はグリッドの全頂点に限る
+
+    """
+
+    DEFAULT_FACE_BLOCK_SIZE = 65536
+
+    def __init__(self, obj3d, grid, face_block_size=DEFAULT_FACE_BLOCK_SIZE):
+        """
+
+        :type obj3d: Obj3d
+        :param obj3d: レイを投射する対象の3Dオブジェクト
+
+        :type grid: TriangleGrid
+        :param grid: 原点を中心とする、面分割済みのグリッド
+
+        :type face_block_size: int or long
+        :param face_block_size: 一度に射影する三角形の数
+
+        """
+        super(SphericalRasterizer, self).__init__(
+            obj3d, face_block_size=face_block_size)
+        assert isinstance(grid, TriangleGrid)
+
+        self.grid = grid
+
+        corner_indices = np.array([[face.top_vertex_idx(),
+                                    face.left_vertex_idx(),
+                                    face.right_vertex_idx()]
+                                   for face in grid.grid_faces])
+        corners = grid.vertices[corner_indices]
+        # 座標を各面の頂点の線形結合 a*top + b*left + c*right
+        # で表したときの係数(a, b, c)を求める逆行列
+        self.inv_bases = np.linalg.inv(corners.transpose(0, 2, 1))
+
+        # 各面の(alpha, beta)座標に対応するグリッド頂点インデックス
+        # (頂点, 三角形)の組の番号を求める際に桁あふれしないよう64bitにする
+        self.vertex_tables = grid.vertex_table.tables.astype(np.int64)
+
+        # 直近のdistances()の所要時間[s]と判定した(頂点, 三角形)の組の数
+        self.query_time = 0.
+        self.n_tests = 0
+
+    def distances(self, ends, origin=None,
+                  hit_mode=BaseRayEngine.HIT_MODE.FIRST):
+        """
+
+        各グリッド頂点について、hit_modeに従って選んだ交点までの距離を返す
+
+        :type ends: np.ndarray
+        :param ends: グリッドの頂点座標配列 shape=(n_vertex, 3)
+
+        :type origin: np.ndarray
+        :param origin: レイの始点 Noneの場合は座標原点
+
+        :type hit_mode: BaseRayEngine.HIT_MODE
+        :param hit_mode: 各レイの交点の選び方
+
+        :rtype: np.ndarray or RayHits
+        :return: 各グリッド頂点に対応する距離の配列 shape=(n_vertex,)
+                 hit_modeがALLの場合はRayHits
+
+        """
+        start = time.time()
+
+        origin, rays = self._as_rays(ends, origin)
+        # 候補はグリッドの構造から求めるので、レイの終点はグリッドの全頂点に限る
+        if np.any(origin != 0) or not (
+                ends is self.grid.vertices or
+                np.array_equal(rays, self.grid.vertices)):
+            raise NotImplementedError
+
+        terms = self._triangle_terms(origin)
+        is_line = hit_mode == BaseRayEngine.HIT_MODE.FIRST
+        is_resolved = np.zeros(shape=(len(rays),), dtype=bool)
+
+        hit_ray_ids = [np.zeros(shape=(0,), dtype=np.int64)]
+        hit_face_ids = [np.zeros(shape=(0,), dtype=np.int64)]
+        hit_t = [np.zeros(shape=(0,))]
+
+        self.n_tests = 0
+
+        for f_start in xrange(0, len(self.v0), self.face_block_size):
+            f_stop = min(f_start + self.face_block_size, len(self.v0))
+
+            vertex_ids, face_ids = self._covered_vertices(f_start, f_stop,
+                                                          is_line)
+            if is_line:
+                # 三角形のブロックはファイル順に処理するので、
+                # 先のブロックで交点が決まった頂点は判定しない
+                is_open = ~is_resolved[vertex_ids]
+                vertex_ids = vertex_ids[is_open]
+                face_ids = face_ids[is_open]
+            if hit_mode == BaseRayEngine.HIT_MODE.ALL:
+                # 面の境界上の頂点は複数の面から列挙されるので重複を除く
+                pairs = np.unique(vertex_ids * len(self.v0) + face_ids)
+                vertex_ids = pairs // len(self.v0)
+                face_ids = pairs % len(self.v0)
+            self.n_tests += len(vertex_ids)
+
+            ray_ids, face_ids, t = self._hits_of_pairs(
+                rays, vertex_ids, face_ids, terms, hit_mode)
+            is_resolved[ray_ids] = True
+            hit_ray_ids.append(ray_ids)
+            hit_face_ids.append(face_ids)
+            hit_t.append(t)
+
+        ray_ids, _, t = self._reduce_hits(np.concatenate(hit_ray_ids),
+                                          np.concatenate(hit_face_ids),
+                                          np.concatenate(hit_t), hit_mode)
+        distances = np.abs(t) * np.linalg.norm(rays[ray_ids], axis=1)
+
+        self.query_time = time.time() - start
+
+        return self._as_result(len(rays), ray_ids, distances, hit_mode)
+
+    def _covered_vertices(self, f_start, f_stop, is_line):
+        """
+
+        三角形f_start..f_stopを各面へ中心射影し、射影のバウンディングボックスに
+        含まれる(グリッド頂点, 三角形)の組を返す
+        is_lineの場合、原点の逆側にある三角形も同様に射影する
+
+        :type f_start: int or long
+        :param f_start: 先頭の三角形インデックス
+
+        :type f_stop: int or long
+        :param f_stop: 末尾の次の三角形インデックス
+
+        :type is_line: bool
+        :param is_line: レイを原点の逆側にも延びる直線として扱うかどうか
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: グリッド頂点のインデックス, 三角形のインデックス
+
+        """
+        n = self.grid.n_div
+        # 境界上の頂点を取りこぼさないための余白
+        margin = 1e-9 * n
+
+        points = np.stack((self.triangles.v0[f_start:f_stop],
+                           self.triangles.v1[f_start:f_stop],
+                           self.triangles.v2[f_start:f_stop]),
+                          axis=1).reshape(-1, 3)
+
+        vertex_ids = []
+        face_ids = []
+
+        for face_id, inv_basis in enumerate(self.inv_bases):
+            coefficients = np.dot(points, inv_basis.T).reshape(-1, 3, 3)
+
+            # 面の錐体を通る直線上の点は、全係数が同符号になる
+            # いずれかの係数が全頂点で負の三角形は錐体内の点を持たず、
+            # さらに別のいずれかの係数が全頂点で正なら逆側の錐体内の点も持たない
+            is_outside = (coefficients < 0).all(axis=1).any(axis=1)
+            if is_line:
+                is_outside &= (coefficients > 0).all(axis=1).any(axis=1)
+            nearby = np.flatnonzero(~is_outside)
+            coefficients = coefficients[nearby]
+            sums = coefficients.sum(axis=2)
+
+            # 全頂点が原点の同じ側にある三角形は、射影した三角形の
+            # バウンディングボックス内の格子点を列挙する
+            # 直線として扱わない場合、全頂点が原点の逆側にある三角形は除く
+            is_front = (sums > 0).all(axis=1)
+            is_back = (sums < 0).all(axis=1)
+            is_bounded = is_front | is_back if is_line else is_front
+            is_skipped = np.zeros_like(is_back) if is_line else \
+                (sums <= 0).all(axis=1)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                alpha = coefficients[:, :, 1] / sums * n
+                beta = coefficients[:, :, 2] / sums * n
+
+            # 両側にまたがる三角形は、射影が非有界になるので面全体を列挙する
+            i_min = np.where(is_bounded, np.ceil(alpha.min(axis=1) - margin),
+                             0)
+            i_max = np.where(is_bounded, np.floor(alpha.max(axis=1) + margin),
+                             n)
+            j_min = np.where(is_bounded, np.ceil(beta.min(axis=1) - margin), 0)
+            j_max = np.where(is_bounded, np.floor(beta.max(axis=1) + margin),
+                             n)
+
+            i_min = np.maximum(i_min, 0)
+            j_min = np.maximum(j_min, 0)
+            i_max = np.minimum(i_max, n)
+            j_max = np.minimum(j_max, n)
+
+            selected = np.flatnonzero((i_min <= i_max) & (j_min <= j_max) &
+                                      (i_min + j_min <= n) & ~is_skipped)
+            i_min = i_min[selected].astype(np.int64)
+            j_min = j_min[selected].astype(np.int64)
+            n_i = i_max[selected].astype(np.int64) - i_min + 1
+            n_j = j_max[selected].astype(np.int64) - j_min + 1
+
+            lattice = concatenate_ranges(np.zeros_like(n_i), n_i * n_j)
+            owners = np.repeat(np.arange(len(selected)), n_i * n_j)
+            i = i_min[owners] + lattice // n_j[owners]
+            j = j_min[owners] + lattice % n_j[owners]
+
+            is_valid = i + j <= n
+            vertex_ids.append(self.vertex_tables[face_id, i[is_valid],
+                                                 j[is_valid]])
+            face_ids.append(
+                f_start + nearby[selected[owners[is_valid]]])
+
+        return np.concatenate(vertex_ids), np.concatenate(face_ids)
+
+    def __str__(self):
+        """
+
+        :rtype: str
+        :return: str化した時のSphericalRasterizerの文字列
+
+        """
+        return "raster : {:.4f} s ( vertex-triangle tests : {} )".format(
+            self.query_time, self.n_tests)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+from collections import OrderedDict
+import enum
+import numpy as np
+from base_shape_map import BaseShapeMap
+
+
+class ShapeMapContainer(object):
+    """
+
+    多数の3Dモデルの形状マップを一つのファイルにまとめた.shpcファイルを、
+    メモリマップして読み込むクラス
+
+    ファイルは固定長のヘッダ、固定長のレコード(一つの形状マップのデータ部)の列、
+    各レコードの索引の順に並ぶ
+    ヘッダには索引の位置を記録し、レコードは
+    (モデルID, 走査方向又は帯のタイプの名前, 面ID)のキーでO(1)で参照できる
+    一つのファイルには同じ種類・分割数の形状マップのみを格納する
+
+    """
+
+    EXTENSION = ".shpc"
+
+    MAGIC = "#SHPC\n"
+
+    # 保存形式を変更した場合は更新する
+    FORMAT_VERSION = 1
+
+    MAP_TYPE = enum.Enum('MAP_TYPE', 'UNI BAND')
+
+    # 面IDを持たない帯形状マップのキーに使う面ID
+    NO_FACE_ID = -1
+
+    HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<i8'),
+                             ('map_type', 'S8'), ('data_type', 'S8'),
+                             ('n_div', '<i8'), ('n_point', '<i8'),
+                             ('n_record', '<i8'), ('index_offset', '<i8')])
+
+    INDEX_DTYPE = np.dtype([('model_id', '<i8'), ('cls', '<i8'),
+                            ('face_id', '<i8'), ('name', 'S24')])
+
+    def __init__(self, container_path):
+        """
+
+        :type container_path: str
+        :param container_path: .shpcファイルパス
+
+        """
+        assert isinstance(container_path, str)
+
+        if os.path.getsize(container_path) < \
+                ShapeMapContainer.HEADER_DTYPE.itemsize:
+            raise IOError("{} is not a .shpc file.".format(container_path))
+        buf = np.memmap(container_path, dtype=np.uint8, mode='r')
+        header = buf[:ShapeMapContainer.HEADER_DTYPE.itemsize].view(
+            ShapeMapContainer.HEADER_DTYPE)[0]
+        if header['magic'] != ShapeMapContainer.MAGIC or \
+                header['version'] != ShapeMapContainer.FORMAT_VERSION:
+            raise IOError("{} is not a .shpc file.".format(container_path))
+        if header['index_offset'] == 0:
+            raise IOError("{} was not closed.".format(container_path))
+
+        self.container_path = container_path
+        self.map_type = ShapeMapContainer.MAP_TYPE[header['map_type']]
+        self.type_name = str(header['data_type'])
+        self.n_div = int(header['n_div'])
+        self.n_point = int(header['n_point'])
+
+        n_record = int(header['n_record'])
+        dtype = np.dtype('<' + BaseShapeMap.DATA_FORMAT[self.type_name])
+        records_start = ShapeMapContainer.HEADER_DTYPE.itemsize
+        records_stop = records_start + n_record * self.n_point * \
+            dtype.itemsize
+        index_stop = int(header['index_offset']) + \
+            n_record * ShapeMapContainer.INDEX_DTYPE.itemsize
+        if len(buf) < index_stop or header['index_offset'] < records_stop:
+            raise IOError("{} is truncated.".format(container_path))
+
+        # 各レコードはコピーせずにメモリマップした配列を参照する
+        self.records = buf[records_start:records_stop].view(dtype).reshape(
+            n_record, self.n_point)
+        self.index = buf[int(header['index_offset']):index_stop].view(
+            ShapeMapContainer.INDEX_DTYPE)
+
+        self.__record_ids = dict(
+            (key, record_id) for record_id, key in enumerate(zip(
+                self.index['model_id'].tolist(), self.index['name'].tolist(),
+                self.index['face_id'].tolist())))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.__record_ids
+
+    def keys(self):
+        """
+
+        :rtype: list((int, str, int))
+        :return: 格納順の(モデルID, 走査方向又は帯のタイプの名前, 面ID)のリスト
+
+        """
+        return sorted(self.__record_ids, key=self.__record_ids.get)
+
+    def data(self, key):
+        """
+
+        :type key: (int, str, int)
+        :param key: (モデルID, 走査方向又は帯のタイプの名前, 面ID)
+
+        :rtype: np.ndarray
+        :return: 形状マップのデータ部 shape=(n_point,)
+
+        """
+        return self.records[self.__record_ids[key]]
+
+    def __getitem__(self, key):
+        """
+
+        キーに対応する形状マップを、データ部をコピーせずに生成する
+
+        :type key: (int, str, int)
+        :param key: (モデルID, 走査方向又は帯のタイプの名前, 面ID)
+                    帯形状マップの面IDはNO_FACE_ID
+
+        :rtype: BaseShapeMap
+        :return: UniShapeMap又はBandShapeMap
+
+        """
+        record_id = self.__record_ids[key]
+        entry = self.index[record_id]
+
+        header = OrderedDict([("ID", int(entry['model_id'])),
+                              ("CLASS", int(entry['cls']))])
+        if self.map_type == ShapeMapContainer.MAP_TYPE.UNI:
+            header["FACE_ID"] = int(entry['face_id'])
+            header["DIRECTION"] = entry['name']
+        else:
+            header["BAND_TYPE"] = entry['name']
+        header["N_DIV"] = self.n_div
+        header["DATA_TYPE"] = self.type_name
+
+        return BaseShapeMap.from_header(header, self.records[record_id])
+
+
+class ShapeMapContainerWriter(object):
+    """
+
+    形状マップを.shpcファイルに順に書き込むクラス
+
+    レコードはファイルの末尾に追記し、close()で索引を書き込んでヘッダを更新する
+    close()していないファイルはShapeMapContainerで読み込めない
+
+    """
+
+    def __init__(self, container_path, map_type, n_div, type_name='float'):
+        """
+
+        :type container_path: str
+        :param container_path: .shpcファイルパス
+
+        :type map_type: ShapeMapContainer.MAP_TYPE
+        :param map_type: 格納する形状マップの種類
+
+        :type n_div: int or long
+        :param n_div: 分割数
+
+        :type type_name: str
+        :param type_name: データ部の型
+
+        """
+        assert isinstance(container_path, str)
+        assert isinstance(map_type, ShapeMapContainer.MAP_TYPE)
+        assert isinstance(n_div, (int, long))
+        assert type_name in BaseShapeMap.DATA_FORMAT
+
+        target_dir = os.path.dirname(container_path)
+        if target_dir and not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+
+        self.container_path = container_path
+        self.map_type = map_type
+        self.n_div = n_div
+        self.type_name = type_name
+        self.dtype = np.dtype('<' + BaseShapeMap.DATA_FORMAT[type_name])
+
+        # 形状マップの点数 最初のレコードで決まる
+        self.n_point = None
+        self.index = []
+        self.__keys = set()
+
+        self.__file = open(container_path, 'wb')
+        # ヘッダはclose()で書き直す
+        self.__file.write(self.__header(0).tostring())
+
+    def append(self, header, data):
+        """
+
+        形状マップを一つのレコードとして追記する
+
+        :type header: OrderedDict
+        :param header: 形状マップの.shpファイルのヘッダの項目
+                       (BaseShapeMap.parse_header()の戻り値と同じ形式)
+
+        :type data: np.ndarray
+        :param data: データ部の一次元配列
+
+        """
+        assert int(header["N_DIV"]) == self.n_div
+        assert ("FACE_ID" in header) == \
+            (self.map_type == ShapeMapContainer.MAP_TYPE.UNI)
+        if self.map_type == ShapeMapContainer.MAP_TYPE.UNI:
+            key = (int(header["ID"]), header["DIRECTION"],
+                   int(header["FACE_ID"]))
+        else:
+            key = (int(header["ID"]), header["BAND_TYPE"],
+                   ShapeMapContainer.NO_FACE_ID)
+        assert key not in self.__keys
+
+        if self.n_point is None:
+            self.n_point = len(data)
+        # レコードは固定長
+        assert len(data) == self.n_point
+
+        self.__file.write(np.asarray(data, dtype=self.dtype).tostring())
+        self.index.append((key[0], int(header["CLASS"]), key[2], key[1]))
+        self.__keys.add(key)
+
+    def close(self):
+        """
+
+        索引を書き込み、ヘッダを更新してファイルを閉じる
+
+        """
+        if self.__file.closed:
+            return
+
+        index_offset = self.__file.tell()
+        self.__file.write(np.array(
+            self.index, dtype=ShapeMapContainer.INDEX_DTYPE).tostring())
+
+        self.__file.seek(0)
+        self.__file.write(self.__header(index_offset).tostring())
+        self.__file.close()
+
+    def __header(self, index_offset):
+        """
+
+        :type index_offset: int or long
+        :param index_offset: 索引の位置 書き込み途中は0
+
+        :rtype: np.ndarray
+        :return: ヘッダ
+
+        """
+        return np.array([(ShapeMapContainer.MAGIC,
+                          ShapeMapContainer.FORMAT_VERSION,
+                          self.map_type.name, self.type_name, self.n_div,
+                          self.n_point or 0, len(self.index), index_offset)],
+                        dtype=ShapeMapContainer.HEADER_DTYPE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
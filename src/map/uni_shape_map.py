@@ -1,8 +1,7 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import os
-import struct
+import numpy as np
 from base_shape_map import BaseShapeMap
 from src.obj.grid.triangle_grid import BaseFace
 
@@ -36,53 +35,56 @@ class UniShapeMap(BaseShapeMap):
         self.face_id = face_id
         self.traverse_direction = traverse_direction
 
-    def save(self, shp_path, type_name='float'):
+    @staticmethod
+    def from_header(header, data):
         """
 
-        形状マップを.shpファイル形式で保存する
+        .shpファイルのヘッダとデータ部からUniShapeMapを生成する
+        各行はデータ部をコピーせずに参照する
 
-        :type shp_path: str
-        :param shp_path: .shpファイルパス
+        :type header: OrderedDict
+        :param header: BaseShapeMap.parse_header()で解析したヘッダ
 
-        :type type_name: str
-        :param type_name: データ部の型
+        :type data: np.ndarray
+        :param data: データ部の一次元配列
 
-        """
-
-        if not os.path.exists(shp_path):
-            os.makedirs(shp_path)
+        :rtype: UniShapeMap
+        :return: UniShapeMapオブジェクト
 
-        # データ値をバイナリ保存する時のフォーマット
-        data_format = BaseShapeMap.DATA_FORMAT[type_name]
+        """
+        n_div = int(header["N_DIV"])
+        traverse_direction = BaseFace.UNI_SCAN_DIRECTION[header["DIRECTION"]]
 
-        lines = []
+        # 面を走査した各行の点数は1, 2, ..., n_div + 1で、逆方向の場合は逆順になる
+        row_lengths = np.arange(1, n_div + 2)
+        if traverse_direction.name.endswith("_REVERSED"):
+            row_lengths = row_lengths[::-1]
+        if len(data) != row_lengths.sum():
+            raise IOError("Invalid .shp data size.")
 
-        with open(shp_path, mode='wb') as f:
+        row_offsets = np.cumsum(np.append(0, row_lengths)).tolist()
+        distance_map = [data[start:stop] for start, stop in
+                        zip(row_offsets[:-1], row_offsets[1:])]
 
-            # .shpファイルであることを示す接頭辞
-            lines.append("#SHP\n")
-            # ID
-            lines.append("#ID\n{}\n".format(self.model_id))
-            # クラス情報
-            lines.append("#CLASS\n{}\n".format(self.cls))
-            # FaceID
-            lines.append("#FACE_ID\n{}\n".format(self.face_id))
-            # 走査方向
-            lines.append(
-                "#DIRECTION\n{}\n".format(self.traverse_direction.name))
-            # 分割数
-            lines.append("#N_DIV\n{}\n".format(self.n_div))
-            # マップ型
-            lines.append("#DATA_TYPE\n{}\n".format(type_name))
+        return UniShapeMap(int(header["ID"]), distance_map,
+                           int(header["CLASS"]), n_div,
+                           int(header["FACE_ID"]), traverse_direction)
 
-            lines.append("#DATA\n")
+    def _header_items(self):
+        """
 
-            f.writelines(lines)
+        :rtype: list((str, object))
+        :return: (項目名, 値)のリスト
 
-            # データ部の書き込み
-            for row in self.distance_map:
-                for elem in row:
-                    f.write(struct.pack(data_format, elem))
+        """
+        return [("ID", self.model_id),
+                # クラス情報
+                ("CLASS", self.cls),
+                ("FACE_ID", self.face_id),
+                # 走査方向
+                ("DIRECTION", self.traverse_direction.name),
+                # 分割数
+                ("N_DIV", self.n_div)]
 
     def __str__(self):
         s = super(UniShapeMap, self).__str__()
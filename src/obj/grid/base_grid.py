@@ -6,6 +6,7 @@ from collections import OrderedDict
 
 from src.obj.obj3d import Obj3d
 from src.util.debug_util import assert_type_in_container
+from grid_topology import GridTopology
 
 
 class BaseGrid(Obj3d):
@@ -24,8 +25,9 @@ class BaseGrid(Obj3d):
         :type vertices: np.ndarray
         :param vertices: 頂点座標配列
 
-        :type base_faces: list(BaseFace) or tuple(BaseFace)
+        :type base_faces: list(BaseFace) or tuple(BaseFace) or GridTopology
         :param base_faces: BaseFaceの集合
+                           GridTopologyの場合、コピーせずに共有する
 
         :type n_face: int or long
         :param n_face: 面の数
@@ -50,7 +52,10 @@ class BaseGrid(Obj3d):
         assert isinstance(n_div, (int, long)) and n_div > 0
         assert len(base_faces) == n_face
 
-        self.grid_faces = base_faces
+        # 面の集合 頂点座標のみが異なるグリッド間で共有する
+        self.topology = base_faces if isinstance(base_faces, GridTopology) \
+            else GridTopology(base_faces)
+        self.grid_faces = self.topology.faces
         self.n_face = n_face
         self.n_div = n_div
         self.upper_direction = upper_direction
@@ -89,11 +94,7 @@ class BaseGrid(Obj3d):
         :return: 指定したface_idを持つBaseFace
 
         """
-        for grid_face in self.grid_faces:
-            if grid_face.face_id == face_id:
-                return grid_face
-        else:
-            raise IndexError
+        return self.topology.find_face(face_id)
 
     def divide_face(self, n_div):
         raise NotImplementedError
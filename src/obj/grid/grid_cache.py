@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import hashlib
+import os
+import shutil
+import tempfile
+import numpy as np
+from triangle_grid import TriangleGrid, TriangleFace, traversal_plan_arrays, \
+    traversal_plans_from_arrays
+from icosahedron_grid import IcosahedronGrid
+from vertex_table import VertexTable
+
+
+class GridCache(object):
+    """
+
+    形状マップの生成に使う、中心化・拡大・面分割済みのグリッドのキャッシュ
+
+    元のグリッドの内容、分割数、拡大率から求めたハッシュ値ごとにディレクトリを作り、
+    頂点座標・頂点インデックス表・走査順の頂点インデックス配列を.npy形式で保存する
+    読み込む際はメモリマップするので、二回目以降はプロセスをまたいで
+    グリッドの準備がほぼ不要になる
+
+    """
+
+    # 保存形式を変更した場合は更新し、古いキャッシュを使わないようにする
+    FORMAT_VERSION = 2
+
+    # 保存したグリッドのクラス名から、読み込む際に生成するクラスを引く
+    GRID_CLASSES = {grid_class.__name__: grid_class
+                    for grid_class in (TriangleGrid, IcosahedronGrid)}
+
+    def __init__(self, cache_dir, band_center_face_ids=(0,)):
+        """
+
+        :type cache_dir: str or unicode
+        :param cache_dir: キャッシュを保存するディレクトリ
+
+        :type band_center_face_ids: tuple(int or long)
+        :param band_center_face_ids: 帯の走査順を保存する、帯の中心となる面のID
+
+        """
+        assert isinstance(cache_dir, basestring)
+        assert all(isinstance(face_id, (int, long))
+                   for face_id in band_center_face_ids)
+
+        self.cache_dir = cache_dir
+        self.band_center_face_ids = tuple(band_center_face_ids)
+
+        # 同じプロセス内では、準備したグリッドをそのまま再利用する
+        self.__grids = {}
+
+    def prepare(self, grid, n_div, grid_scale):
+        """
+
+        grid.center().scale(grid_scale).divide_face(n_div)と同じクラス・内容の
+        グリッドを返す
+        キャッシュがあれば読み込み、なければ生成して保存する
+
+        :type grid: TriangleGrid
+        :param grid: 分割前のグリッド
+
+        :type n_div: int or long
+        :param n_div: グリッド分割数
+
+        :type grid_scale: float
+        :param grid_scale: グリッドのスケール率
+
+        :rtype: TriangleGrid
+        :return: 中心化・拡大・面分割済みのグリッド
+
+        """
+        assert isinstance(grid, TriangleGrid)
+
+        key = GridCache.key(grid, n_div, grid_scale)
+        if key in self.__grids:
+            return self.__grids[key]
+
+        path = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(path):
+            self.__save(path, grid.center().scale(grid_scale).divide_face(
+                n_div))
+
+        self.__grids[key] = GridCache.__load(path)
+        return self.__grids[key]
+
+    @staticmethod
+    def key(grid, n_div, grid_scale):
+        """
+
+        グリッドの内容、分割数、拡大率からキャッシュのキーを求める
+
+        :type grid: TriangleGrid
+        :param grid: 分割前のグリッド
+
+        :type n_div: int or long
+        :param n_div: グリッド分割数
+
+        :type grid_scale: float
+        :param grid_scale: グリッドのスケール率
+
+        :rtype: str
+        :return: キャッシュのキー(SHA-1の16進表記)
+
+        """
+        sha1 = hashlib.sha1()
+        sha1.update("{} {} {!r} {!r}\n".format(
+            GridCache.FORMAT_VERSION, n_div, float(grid_scale),
+            grid.upper_direction))
+        sha1.update(np.ascontiguousarray(grid.vertices,
+                                         dtype=np.float64).tobytes())
+        sha1.update(GridCache.__face_array(grid).tobytes())
+        sha1.update(np.ascontiguousarray(grid.vertex_table.tables).tobytes())
+        return sha1.hexdigest()
+
+    @staticmethod
+    def __face_array(grid):
+        """
+
+        各面のIDと隣接する面のIDを配列にまとめる
+
+        :type grid: TriangleGrid
+        :param grid: グリッド
+
+        :rtype: np.ndarray
+        :return: (face_id, left_face_id, right_face_id, bottom_face_id)の配列
+                 shape=(n_face, 4)
+
+        """
+        return np.array([[face.face_id, face.left_face_id,
+                          face.right_face_id, face.bottom_face_id]
+                         for face in grid.grid_faces],
+                        dtype=np.int64).reshape(-1, 4)
+
+    def __save(self, path, grid):
+        """
+
+        グリッドと走査順をpathのディレクトリに保存する
+        他のプロセスと同時に保存しても壊れないよう、一時ディレクトリに書き込んでから
+        名前を変更する
+
+        :type path: str
+        :param path: 保存先ディレクトリ
+
+        :type grid: TriangleGrid
+        :param grid: 中心化・拡大・面分割済みのグリッド
+
+        """
+        if not os.path.isdir(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                if not os.path.isdir(self.cache_dir):
+                    raise
+
+        arrays = {'grid_class': np.array(type(grid).__name__),
+                  'vertices': grid.vertices,
+                  'faces': GridCache.__face_array(grid),
+                  'vertex_tables': grid.vertex_table.tables,
+                  'upper_direction': np.asarray(
+                      () if grid.upper_direction is None
+                      else grid.upper_direction, dtype=np.float64)}
+        arrays.update(traversal_plan_arrays(grid, self.band_center_face_ids))
+
+        tmp_path = tempfile.mkdtemp(dir=self.cache_dir)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_path, name + ".npy"), array)
+            os.rename(tmp_path, path)
+        except OSError:
+            # 他のプロセスが先に保存した場合はそちらを使う
+            if not os.path.isdir(path):
+                raise
+        finally:
+            if os.path.isdir(tmp_path):
+                shutil.rmtree(tmp_path)
+
+    @staticmethod
+    def __load(path):
+        """
+
+        pathのディレクトリに保存したグリッドを、メモリマップして読み込む
+        グリッドは保存した時と同じクラスで生成する
+
+        :type path: str
+        :param path: 保存先ディレクトリ
+
+        :rtype: TriangleGrid
+        :return: 中心化・拡大・面分割済みのグリッド
+
+        """
+        arrays = {os.path.splitext(name)[0]:
+                  np.load(os.path.join(path, name), mmap_mode='r')
+                  for name in os.listdir(path) if name.endswith(".npy")}
+
+        vertex_table = VertexTable(arrays['vertex_tables'])
+        grid_faces = [TriangleFace(face_id, left_face_id=left_face_id,
+                                   right_face_id=right_face_id,
+                                   bottom_face_id=bottom_face_id,
+                                   n_div=vertex_table.n_div,
+                                   vidx_table=vertex_table, table_index=i)
+                      for i, (face_id, left_face_id, right_face_id,
+                              bottom_face_id)
+                      in enumerate(arrays['faces'].tolist())]
+
+        traversal_plans = traversal_plans_from_arrays(arrays)
+
+        upper_direction = tuple(arrays['upper_direction'].tolist()) \
+            if len(arrays['upper_direction']) > 0 else None
+
+        grid_class = GridCache.GRID_CLASSES[str(arrays['grid_class'])]
+        if grid_class is IcosahedronGrid:
+            return IcosahedronGrid(arrays['vertices'], grid_faces,
+                                   vertex_table.n_div, upper_direction,
+                                   traversal_plans=traversal_plans)
+        return TriangleGrid(arrays['vertices'], grid_faces, len(grid_faces),
+                            vertex_table.n_div, upper_direction,
+                            traversal_plans=traversal_plans)
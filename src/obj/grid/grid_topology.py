@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+class GridTopology(object):
+    """
+
+    グリッドの面の集合と、面IDから面を引く索引を保持するクラス
+    頂点座標は持たないので、中心化・拡大・回転したグリッド間でそのまま共有する
+    面の集合は変更不可とし、面の構成のみから決まる値(走査順等)もここに保持する
+
+    """
+
+    def __init__(self, faces):
+        """
+
+        :type faces: list(BaseFace) or tuple(BaseFace)
+        :param faces: グリッドの面の集合
+
+        """
+        self.faces = tuple(faces)
+
+        # 面IDから面の番号(facesの添字)を引く索引
+        self.face_indices = {face.face_id: i
+                             for i, face in enumerate(self.faces)}
+        assert len(self.face_indices) == len(self.faces)
+
+        # 面の構成のみから決まる値 TriangleGrid.traversal_plan()等で一度だけ求める
+        self.traversal_plans = {}
+
+    def __len__(self):
+        """
+
+        :rtype: int
+        :return: 面の数
+
+        """
+        return len(self.faces)
+
+    def __iter__(self):
+        """
+
+        :rtype: iterator
+        :return: 面のイテレータ
+
+        """
+        return iter(self.faces)
+
+    def __getitem__(self, index):
+        """
+
+        :type index: int or long
+        :param index: 面の番号
+
+        :rtype: BaseFace
+        :return: 面
+
+        """
+        return self.faces[index]
+
+    def find_face(self, face_id):
+        """
+
+        指定したface_idを持つ面を返す
+        指定したface_idを持つ面が見つからない場合、IndexErrorを投げる
+
+        :type face_id: int or long
+        :param face_id: 要求する面のID
+
+        :rtype: BaseFace
+        :return: 指定したface_idを持つ面
+
+        """
+        try:
+            return self.faces[self.face_indices[face_id]]
+        except KeyError:
+            raise IndexError(face_id)
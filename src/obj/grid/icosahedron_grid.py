@@ -15,14 +15,16 @@ class IcosahedronGrid(TriangleGrid):
 
     N_FACE = 20
 
-    def __init__(self, vertices, grid_faces, n_div, upper_direction):
+    def __init__(self, vertices, grid_faces, n_div, upper_direction,
+                 traversal_plans=None):
         """
 
         :type vertices: list or tuple or np.ndarray
         :param vertices: 全頂点情報
 
-        :type grid_faces: list or tuple
+        :type grid_faces: list or tuple or GridTopology
         :param grid_faces: 多角形グリッドの各面の情報
+                           GridTopologyの場合、コピーせずに共有する
 
         :type n_div: int
         :param n_div: Grid3dオブジェクトの各面の分割数
@@ -30,10 +32,15 @@ class IcosahedronGrid(TriangleGrid):
         :type upper_direction: (float, float, float)
         :param upper_direction: グリッドの上方向を表す単位ベクトル
 
+        :type traversal_plans: dict
+        :param traversal_plans: 求め済みの走査順の頂点インデックス配列
+                                (GridCacheから復元する場合等)
+
         """
         super(IcosahedronGrid, self).__init__(vertices, grid_faces,
                                               IcosahedronGrid.N_FACE, n_div,
-                                              upper_direction)
+                                              upper_direction,
+                                              traversal_plans=traversal_plans)
 
     @staticmethod
     def load(grd_file):
@@ -105,8 +112,8 @@ class IcosahedronGrid(TriangleGrid):
 
         """
         obj3d = super(IcosahedronGrid, self).center()
-        return IcosahedronGrid(obj3d.vertices, self.grid_faces_as_copy(),
-                               self.n_div, self.upper_direction)
+        return IcosahedronGrid(obj3d.vertices, self.topology, self.n_div,
+                               self.upper_direction)
 
     def normal(self):
         """
@@ -118,8 +125,8 @@ class IcosahedronGrid(TriangleGrid):
 
         """
         obj3d = super(IcosahedronGrid, self).normal()
-        return IcosahedronGrid(obj3d.vertices, self.grid_faces_as_copy(),
-                               self.n_div, self.upper_direction)
+        return IcosahedronGrid(obj3d.vertices, self.topology, self.n_div,
+                               self.upper_direction)
 
     def scale(self, r):
         """
@@ -134,8 +141,8 @@ class IcosahedronGrid(TriangleGrid):
 
         """
         obj3d = super(IcosahedronGrid, self).scale(r)
-        return IcosahedronGrid(obj3d.vertices, self.grid_faces_as_copy(),
-                               self.n_div, self.upper_direction)
+        return IcosahedronGrid(obj3d.vertices, self.topology, self.n_div,
+                               self.upper_direction)
 
     def rotate(self, theta, axis_vector):
         """
@@ -152,12 +159,13 @@ class IcosahedronGrid(TriangleGrid):
         :return: 回転後IcosahedronGridオブジェクト
         """
         obj3d = super(IcosahedronGrid, self).rotate(theta, axis_vector)
-        return IcosahedronGrid(obj3d.vertices, self.grid_faces_as_copy(),
-                               self.n_div, self.upper_direction)
+        return IcosahedronGrid(obj3d.vertices, self.topology, self.n_div,
+                               self.upper_direction)
 
     def grid_faces_as_copy(self):
         """
         IcosahedronGridオブジェクトの保持するTriangleFaceリストをコピーして返す
+        頂点インデックス表は変更不可なので、コピーせずに共有する
 
         :rtype: list(IcosahedronFace)
         :return: TriangleFaceのリストのコピー
@@ -168,5 +176,6 @@ class IcosahedronGrid(TriangleGrid):
                              right_face_id=gf.right_face_id,
                              bottom_face_id=gf.bottom_face_id,
                              n_div=gf.n_div,
-                             vidx_table=gf.vidx_table_as_copy()) for gf in
+                             vidx_table=gf.vertex_table,
+                             table_index=gf.table_index) for gf in
                 self.grid_faces]
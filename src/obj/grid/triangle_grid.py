@@ -4,8 +4,11 @@
 import enum
 import numpy as np
 from itertools import cycle
+from src.util.array_util import concatenate_ranges
 from src.util.debug_util import assert_type_in_container
 from base_grid import BaseGrid, BaseFace
+from grid_topology import GridTopology
+from vertex_table import VertexTable
 
 
 class TriangleGrid(BaseGrid):
@@ -18,14 +21,18 @@ class TriangleGrid(BaseGrid):
     BAND_TYPE = enum.Enum('BAND_TYPE', 'HORIZON UPPER_RIGHT LOWER_RIGHT')
 
     def __init__(self, vertices, triangle_faces, n_face, n_div, upper_direction,
-                 is_face_assertion_enabled=True):
+                 is_face_assertion_enabled=True, traversal_plans=None):
         """
 
         :type vertices: np.ndarray
         :param vertices: 頂点座標配列
 
         :type triangle_faces: list(TriangleFace) or tuple(TriangleFace)
+                              or GridTopology
         :param triangle_faces: TriangleFaceの集合
+                               GridTopologyの場合、コピーせずに共有する
+                               それ以外の場合、各面を複製してグリッドの
+                               頂点インデックス表を共有する変更不可の面とする
 
         :type n_face: int or long
         :param n_face: 面の数
@@ -39,77 +46,297 @@ class TriangleGrid(BaseGrid):
         :type upper_direction: (float, float, float)
         :param upper_direction: グリッドの上方向を表す単位ベクトル
 
+        :type traversal_plans: dict
+        :param traversal_plans: 求め済みの走査順の頂点インデックス配列
+                                traversal_plan()の走査方向、または
+                                band_traversal_plan()の(帯の走査方向, 中心の面のID)
+                                をキーとする(GridCacheから復元する場合等)
+
         """
         # assertion
         if is_face_assertion_enabled:
             assert_type_in_container(triangle_faces, TriangleFace)
+        assert len(triangle_faces) == n_face
+
+        # 全ての面の頂点インデックス表を一つの配列にまとめ、各面から共有する
+        # 各面が既に同じ順序で一つの表を共有している場合(グリッドのコピー等)は
+        # その表をそのまま使う
+        shared_table = triangle_faces[0].vertex_table \
+            if len(triangle_faces) > 0 else None
+        if shared_table is None or shared_table.n_face != n_face or \
+                not all(face.vertex_table is shared_table and
+                        face.table_index == i
+                        for i, face in enumerate(triangle_faces)):
+            tables = np.full(shape=(n_face, n_div + 1, n_div + 1),
+                             fill_value=VertexTable.UNDEFINED, dtype=np.int32)
+            for i, face in enumerate(triangle_faces):
+                assert face.n_div == n_div
+                tables[i] = face.vertex_table.tables[face.table_index]
+            shared_table = VertexTable(tables)
+
+        # 呼び出し元の面は変更せず、共有する表を参照する変更不可の面に複製する
+        if not isinstance(triangle_faces, GridTopology):
+            triangle_faces = [
+                TriangleFace(face.face_id, left_face_id=face.left_face_id,
+                             right_face_id=face.right_face_id,
+                             bottom_face_id=face.bottom_face_id,
+                             n_div=n_div, vidx_table=shared_table,
+                             table_index=i, is_read_only=True)
+                for i, face in enumerate(triangle_faces)]
 
         super(TriangleGrid, self).__init__(vertices, triangle_faces, n_face,
                                            n_div, upper_direction,
                                            is_face_assertion_enabled=False)
 
-    def divide_face(self, n_div, epsilon=np.finfo(float).eps):
+        self.vertex_table = shared_table
+
+        # 回転対称性 symmetries()で一度だけ求める
+        self.__symmetries = None
+        # 走査順の頂点インデックス配列 面の構成のみから決まるので、
+        # 面の集合とともに共有し、走査方向ごとに一度だけ求める
+        self.__traversal_plans = self.topology.traversal_plans
+        if traversal_plans is not None:
+            self.__traversal_plans.update(traversal_plans)
+
+    def divide_face(self, n_div):
         """
 
         指定数で面を分割したGrid3dオブジェクトを返す
 
+        分割後の頂点は、元の面の三頂点のインデックスと(alpha, beta)から決まる
+        整数の重みの組で識別するので、隣接する面の辺・角の頂点は
+        座標を比較せずに一つにまとまる
+        頂点インデックスは、面・(alpha, beta)を走査して最初に現れた順に振る
+
         :type n_div: int
         :param n_div: 分割数
 
-        :type epsilon: float
-        :param epsilon: 浮動小数点座標を等号比較する時の許容誤差
-
         :rtype : IcosahedronGrid
         :return : 分割後のGrid3dオブジェクト
 
         """
+        assert isinstance(n_div, (int, long)) and n_div > 0
+
+        # 面中の(alpha, beta)座標 alpha + betaの昇順、同じ和ではbetaの昇順
+        sum_lengths = np.repeat(np.arange(n_div + 1), np.arange(1, n_div + 2))
+        beta = concatenate_ranges(np.zeros(shape=(n_div + 1,)),
+                                  np.arange(1, n_div + 2))
+        alpha = sum_lengths - beta
+
+        corner_indices = np.array([[grid_face.top_vertex_idx(),
+                                    grid_face.left_vertex_idx(),
+                                    grid_face.right_vertex_idx()]
+                                   for grid_face in self.grid_faces])
+        top_vertices = self.vertices[corner_indices[:, 0]][:, np.newaxis]
+        left_vectors = self.vertices[corner_indices[:, 1]][:, np.newaxis] - \
+            top_vertices
+        right_vectors = \
+            self.vertices[corner_indices[:, 2]][:, np.newaxis] - top_vertices
+
+        # 全ての面の頂点座標 shape=(n_face, n_point, 3)
+        points = left_vectors * alpha[:, np.newaxis].astype(float) / n_div + \
+            right_vectors * beta[:, np.newaxis].astype(float) / n_div + \
+            top_vertices
+
+        # 各頂点を(重みが正の面の頂点インデックス, 重み)の組で表し、
+        # インデックスの昇順に並べたものを頂点の識別子とする
+        weights = np.broadcast_to(
+            np.stack((n_div - alpha - beta, alpha, beta), axis=1),
+            (len(corner_indices), len(alpha), 3))
+        keys = np.where(weights > 0, corner_indices[:, np.newaxis], -1)
+        order = np.argsort(keys, axis=2)
+        keys = np.concatenate((np.take_along_axis(keys, order, axis=2),
+                               np.take_along_axis(weights, order, axis=2)),
+                              axis=2).reshape(-1, 6)
+
+        _, first_ids, inverse = np.unique(keys, axis=0, return_index=True,
+                                          return_inverse=True)
+        # 最初に現れた順の頂点インデックス
+        first_order = np.argsort(first_ids)
+        ranks = np.empty_like(first_order)
+        ranks[first_order] = np.arange(len(first_order))
+        vertex_ids = ranks[inverse].reshape(len(corner_indices), -1)
+
+        new_vertices = points.reshape(-1, 3)[first_ids[first_order]]
+
+        tables = np.full(shape=(len(corner_indices), n_div + 1, n_div + 1),
+                         fill_value=VertexTable.UNDEFINED, dtype=np.int32)
+        tables[:, alpha, beta] = vertex_ids
+        vertex_table = VertexTable(tables)
+
+        new_grid_faces = [
+            TriangleFace(grid_face.face_id,
+                         left_face_id=grid_face.left_face_id,
+                         right_face_id=grid_face.right_face_id,
+                         bottom_face_id=grid_face.bottom_face_id,
+                         n_div=n_div, vidx_table=vertex_table, table_index=i)
+            for i, grid_face in enumerate(self.grid_faces)]
 
-        new_vertices = np.empty(shape=(0, 3))
+        return TriangleGrid(new_vertices, new_grid_faces, self.n_face,
+                            n_div, self.upper_direction)
 
-        new_grid_faces = []
+    def symmetries(self, tolerance=1e-6):
+        """
 
-        for grid_face in self.grid_faces:
+        グリッドを自身に重ねる原点周りの回転(正二十面体グリッドでは60通り)と、
+        各回転による頂点インデックスの置換を返す
+        permutations[k, v]は、rotations[k]で頂点vへ移る頂点のインデックスで、
+        3Dモデルをrotations[k]で回転した場合の頂点vの距離は
+        回転前の距離distancesについてdistances[permutations[k, v]]となる
 
-            # グリッド面の三頂点
-            top_vertex = self.vertices[grid_face.top_vertex_idx()]
-            left_vertex = self.vertices[grid_face.left_vertex_idx()]
-            right_vertex = self.vertices[grid_face.right_vertex_idx()]
+        回転は、ある面の三頂点を任意の面の三頂点へ向きを保って移すものに限って探す
+        結果はグリッドごとに一度だけ求めて再利用する
 
-            left_vector = left_vertex - top_vertex
-            right_vector = right_vertex - top_vertex
+        :type tolerance: float
+        :param tolerance: 頂点座標を回転で重なるとみなす許容誤差(グリッドの半径比)
 
-            # 一旦GridFaceの頂点情報をクリア
-            new_face = TriangleFace(grid_face.face_id,
-                                    left_face_id=grid_face.left_face_id,
-                                    right_face_id=grid_face.right_face_id,
-                                    bottom_face_id=grid_face.bottom_face_id,
-                                    n_div=n_div)
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 回転行列 shape=(n_symmetry, 3, 3),
+                 頂点インデックスの置換 shape=(n_symmetry, n_vertex)
 
-            for sum_length in xrange(n_div + 1):
-                for i in xrange(sum_length + 1):
-                    alpha = sum_length - i
-                    beta = i
-                    new_vertex = left_vector * float(
-                        alpha) / n_div + right_vector * float(
-                        beta) / n_div + top_vertex
+        """
+        if self.__symmetries is not None:
+            return self.__symmetries
+
+        n = self.n_div
+        corner_indices = np.array([[face.top_vertex_idx(),
+                                    face.left_vertex_idx(),
+                                    face.right_vertex_idx()]
+                                   for face in self.grid_faces])
+        corner_ids = np.unique(corner_indices)
+        corners = self.vertices[corner_ids]
+        scale = np.linalg.norm(corners, axis=1).max()
+
+        # 同じ座標の頂点が重複して登録されたグリッドにも対応するため、
+        # 同じ座標の角の頂点を一つの番号(最初の頂点のインデックス)にまとめる
+        is_same = np.linalg.norm(corners[:, np.newaxis] - corners[np.newaxis],
+                                 axis=2) <= tolerance * scale
+        corner_class = dict(zip(corner_ids,
+                                corner_ids[np.argmax(is_same, axis=1)]))
+        corner_indices = np.vectorize(corner_class.get)(corner_indices)
+
+        # 面の三頂点(順不同)から面を引く辞書
+        face_of_corners = {frozenset(c): f
+                           for f, c in enumerate(corner_indices)}
+
+        # 各面の(alpha, beta)座標に対応する頂点インデックス
+        tables = self.vertex_table.tables
+        alpha, beta = np.nonzero(tables[0] >= 0)
+        # 面の三頂点(top, left, right)に対する重み
+        weights = np.stack((n - alpha - beta, alpha, beta))
+
+        inv_reference = np.linalg.inv(self.vertices[corner_indices[0]].T)
+
+        rotations = []
+        permutations = []
+        for g in xrange(self.n_face):
+            for shift in xrange(3):
+                rotation = np.dot(
+                    self.vertices[np.roll(corner_indices[g], shift)].T,
+                    inv_reference)
+                if np.abs(np.dot(rotation, rotation.T) -
+                          np.eye(3)).max() > tolerance or \
+                        np.linalg.det(rotation) < 0:
+                    continue
+
+                # 回転後の頂点に重なる頂点
+                differences = np.linalg.norm(
+                    np.dot(corners, rotation.T)[:, np.newaxis] -
+                    corners[np.newaxis], axis=2)
+                if (differences.min(axis=1) > tolerance * scale).any():
+                    continue
+                corner_map = {
+                    corner_class[i]: corner_class[j]
+                    for i, j in zip(corner_ids,
+                                    corner_ids[differences.argmin(axis=1)])}
+
+                permutation = np.full(shape=(len(self.vertices),),
+                                      fill_value=-1, dtype=np.int64)
+                for f, corner in enumerate(corner_indices):
+                    mapped = [corner_map[idx] for idx in corner]
+                    h = face_of_corners[frozenset(mapped)]
+                    # 移った先の面での、各頂点の位置(top, left, right)
+                    positions = [list(corner_indices[h]).index(idx)
+                                 for idx in mapped]
+                    mapped_weights = np.empty_like(weights)
+                    mapped_weights[positions] = weights
+                    # 面の対応は全単射なので、全ての頂点に移り元が決まる
+                    # 重複した頂点はそれぞれの面での移り元を持つ
+                    permutation[tables[h, mapped_weights[1],
+                                       mapped_weights[2]]] = \
+                        tables[f, alpha, beta]
+                assert (permutation >= 0).all()
+
+                # グリッド座標の丸め誤差を除くため、最も近い直交行列にする
+                u, _, vt = np.linalg.svd(rotation)
+                rotations.append(np.dot(u, vt))
+                permutations.append(permutation)
+
+        self.__symmetries = (np.array(rotations), np.array(permutations))
+        return self.__symmetries
+
+    def traverse(self, uni_direction):
+        """
 
-                    # 重複チェック
-                    check_duplicate = (
-                        np.abs(new_vertex - new_vertices) < epsilon).all(axis=1)
+        正二十面体グリッドの各面の頂点インデックスを走査し、
+        結果をFaceIDとのペアで返す
 
-                    if len(new_vertices) > 0 and check_duplicate.any():
-                        v_idx = int(np.argwhere(check_duplicate)[0])
-                    else:
-                        v_idx = len(new_vertices)
-                        new_vertices = np.vstack((new_vertices, new_vertex))
+        :type uni_direction: BaseFace.UNI_SCAN_DIRECTION
+        :param uni_direction: 走査方向
 
-                    # 新しく頂点情報を追加
-                    new_face.set_vertex_idx(v_idx, alpha, beta)
+        :rtype dict
+        :return FaceIDをキー、面の頂点インデックスリストをバリューとした辞書
 
-            new_grid_faces.append(new_face)
+        """
+        face_ids, indices, row_offsets = self.traversal_plan(uni_direction)
+        return {face_id: [face_indices[start:stop].tolist()
+                          for start, stop in zip(row_offsets[:-1],
+                                                 row_offsets[1:])]
+                for face_id, face_indices in zip(face_ids.tolist(), indices)}
 
-        return TriangleGrid(new_vertices, new_grid_faces, self.n_face,
-                            n_div, self.upper_direction)
+    def traversal_plan(self, uni_direction):
+        """
+
+        全ての面を指定方向に走査した頂点インデックスを、一つの配列として返す
+        各面の走査順の(alpha, beta)座標は共通なので、vertex_tableから一度に引く
+        結果は走査方向ごとに一度だけ求めて再利用する
+
+        :type uni_direction: BaseFace.UNI_SCAN_DIRECTION
+        :param uni_direction: 走査方向
+
+        :rtype: (np.ndarray, np.ndarray, np.ndarray)
+        :return: 面ID(昇順) shape=(n_face,),
+                 走査順の頂点インデックス shape=(n_face, n_point),
+                 各行の先頭位置 shape=(n_row + 1,)
+                 面face_ids[i]のr行目は indices[i, offsets[r]:offsets[r + 1]]
+
+        """
+        key = uni_direction
+        if key not in self.__traversal_plans:
+            # (alpha, beta)座標を alpha * (n_div + 1) + beta として登録した面を
+            # 走査し、走査順の座標を求める
+            n = self.n_div
+            coordinates = np.arange((n + 1) * (n + 1)).reshape(n + 1, n + 1)
+            coordinates[np.add.outer(np.arange(n + 1), np.arange(n + 1)) >
+                        n] = VertexTable.UNDEFINED
+            coordinate_face = TriangleFace(
+                0, 0, 0, 0, n_div=n,
+                vidx_table=VertexTable(coordinates[np.newaxis]))
+            rows = coordinate_face.traverse(uni_direction)
+            alpha, beta = np.divmod(np.concatenate(rows), n + 1)
+
+            face_ids = np.array([face.face_id for face in self.grid_faces])
+            order = np.argsort(face_ids, kind='mergesort')
+
+            row_offsets = np.zeros(shape=(len(rows) + 1,), dtype=np.int64)
+            row_offsets[1:] = np.cumsum([len(row) for row in rows])
+            indices = self.vertex_table.tables[order][:, alpha, beta]
+
+            for array in (face_ids, indices, row_offsets):
+                array.flags.writeable = False
+            self.__traversal_plans[key] = (face_ids[order], indices,
+                                           row_offsets)
+        return self.__traversal_plans[key]
 
     def traverse_band(self, band_type, center_face_id):
         """
@@ -127,6 +354,33 @@ class TriangleGrid(BaseGrid):
         :return: 走査順にソートされた頂点のインデックス
 
         """
+        indices, row_offsets = self.band_traversal_plan(band_type,
+                                                        center_face_id)
+        return [indices[start:stop].tolist()
+                for start, stop in zip(row_offsets[:-1], row_offsets[1:])]
+
+    def band_traversal_plan(self, band_type, center_face_id):
+        """
+
+        帯状にグリッド上の頂点を走査した頂点インデックスを、一つの配列として返す
+        結果は帯の走査方向・中心の面ごとに一度だけ求めて再利用する
+
+        :type band_type: BaseGrid.BAND_TYPE
+        :param band_type: 帯の走査方向
+
+        :type center_face_id: int or long
+        :param center_face_id: 帯の中心となる面のID
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 走査順の頂点インデックス shape=(n_point,),
+                 各行の先頭位置 shape=(n_div + 2,)
+                 r行目は indices[offsets[r]:offsets[r + 1]]
+
+        """
+        key = (band_type, center_face_id)
+        if key in self.__traversal_plans:
+            return self.__traversal_plans[key]
+
         if band_type == TriangleGrid.BAND_TYPE.HORIZON:
             direction_loop = cycle(
                 (BaseFace.UNI_SCAN_DIRECTION.HORIZON,
@@ -186,16 +440,27 @@ class TriangleGrid(BaseGrid):
         while True:
             direction = direction_loop.next()
             face = self.find_face_from_id(face_id)
-            traversed_rows = face.traverse(direction)
-            for result_row, traversed_row in zip(result, traversed_rows):
+            face_ids, indices, row_offsets = self.traversal_plan(direction)
+            face_indices = indices[np.searchsorted(face_ids, face_id)]
+            for result_row, start, stop in zip(result, row_offsets[:-1],
+                                               row_offsets[1:]):
                 # 重複を防ぐため、先頭要素は飛ばす
-                result_row += traversed_row[1:]
+                result_row.append(face_indices[start + 1:stop])
             face_id = next_fid_func_loop.next()(face)
 
             if face_id == center_face_id:
                 break
 
-        return result
+        row_offsets = np.zeros(shape=(len(result) + 1,), dtype=np.int64)
+        row_offsets[1:] = np.cumsum([sum(len(part) for part in result_row)
+                                     for result_row in result])
+        indices = np.concatenate([part for result_row in result
+                                  for part in result_row])
+
+        indices.flags.writeable = False
+        row_offsets.flags.writeable = False
+        self.__traversal_plans[key] = (indices, row_offsets)
+        return self.__traversal_plans[key]
 
 
 class TriangleFace(BaseFace):
@@ -206,7 +471,7 @@ class TriangleFace(BaseFace):
     """
 
     def __init__(self, face_id, left_face_id, right_face_id, bottom_face_id,
-                 n_div=1, vidx_table=None):
+                 n_div=1, vidx_table=None, table_index=0, is_read_only=False):
         """
 
         :type face_id: int or long
@@ -225,18 +490,42 @@ class TriangleFace(BaseFace):
         :param n_div: 面の分割数
 
         :type vidx_table: dict((int or long, int or long), int or long)
+                          or VertexTable
         :param vidx_table: 頂点座標(alpha, beta)と頂点インデックスのペア
+                           VertexTableの場合、コピーせずに共有する
+
+        :type table_index: int or long
+        :param table_index: vidx_tableがVertexTableの場合、この面に対応する面の番号
+
+        :type is_read_only: bool
+        :param is_read_only: 頂点インデックスの登録を禁止するかどうか
+                             グリッドの表を共有する面(TriangleGridが複製した面)
+                             の場合True
 
         """
-        super(TriangleFace, self).__init__(face_id, n_div, vidx_table)
+        # BaseFaceのコンストラクタで表を登録するので、禁止は最後に設定する
+        self.is_read_only = False
+
+        is_shared = isinstance(vidx_table, VertexTable)
+        super(TriangleFace, self).__init__(face_id, n_div,
+                                           None if is_shared else vidx_table)
+        if is_shared:
+            assert vidx_table.n_div == n_div
+            assert 0 <= table_index < vidx_table.n_face
+            self.vertex_table = vidx_table
+            self.table_index = table_index
+
         self.left_face_id = left_face_id
         self.right_face_id = right_face_id
         self.bottom_face_id = bottom_face_id
 
+        self.is_read_only = is_read_only
+
     def set_vertex_idx(self, idx, alpha, beta):
         """
 
         頂点インデックスを登録する
+        グリッドの表を共有する変更不可の面の場合、ValueErrorを投げる
 
         :type idx: int or long
         :param idx: 登録する頂点のインデックス
@@ -253,7 +542,42 @@ class TriangleFace(BaseFace):
         assert isinstance(alpha, (int, long)) and 0 <= alpha <= self.n_div
         assert isinstance(beta, (int, long)) and 0 <= beta <= self.n_div
 
-        self.vidx_table[(alpha, beta)] = idx
+        if self.is_read_only:
+            raise ValueError("vertex table of grid face is read-only.")
+
+        # 共有している表(グリッドの面の複製等)は変更せず、
+        # この面の表を複製して書き換える
+        tables = np.array(self.vertex_table.tables[
+                          self.table_index:self.table_index + 1])
+        tables[0, alpha, beta] = idx
+        self.vertex_table = VertexTable(tables)
+        self.table_index = 0
+
+    @property
+    def vidx_table(self):
+        """
+
+        頂点座標(alpha, beta)と頂点インデックスの辞書
+        参照するたびにvertex_tableから生成する
+
+        :rtype: OrderedDict((int, int), int)
+        :return: 頂点座標(alpha, beta)と頂点インデックスのペア
+
+        """
+        return self.vertex_table.as_dict(self.table_index)
+
+    @vidx_table.setter
+    def vidx_table(self, vidx_table):
+        """
+
+        :type vidx_table: dict((int or long, int or long), int or long)
+        :param vidx_table: 頂点座標(alpha, beta)と頂点インデックスのペア
+
+        """
+        if self.is_read_only:
+            raise ValueError("vertex table of grid face is read-only.")
+        self.vertex_table = VertexTable.from_dict(vidx_table, self.n_div)
+        self.table_index = 0
 
     def get_vertex_idx(self, alpha, beta):
         """
@@ -270,7 +594,7 @@ class TriangleFace(BaseFace):
         :return: 頂点インデックス
 
         """
-        return self.vidx_table[(alpha, beta)]
+        return self.vertex_table.get_vertex_idx(self.table_index, alpha, beta)
 
     def get_coordinates(self, vertex_idx):
         """
@@ -284,7 +608,9 @@ class TriangleFace(BaseFace):
         :return: 面中における頂点座標
 
         """
-        return [k for k, v in self.vidx_table.items() if v == vertex_idx]
+        return [(int(alpha), int(beta)) for face_index, alpha, beta
+                in self.vertex_table.locations(vertex_idx)
+                if face_index == self.table_index]
 
     def vidx_table_as_copy(self):
         """
@@ -295,7 +621,7 @@ class TriangleFace(BaseFace):
         :return: 頂点座標(alpha, beta)と頂点インデックスのペア
 
         """
-        return dict(self.vidx_table)
+        return self.vertex_table.as_dict(self.table_index)
 
     def top_vertex_idx(self):
         """
@@ -440,3 +766,68 @@ class TriangleFace(BaseFace):
             alpha = reversed(list(alpha))
             beta = reversed(beta)
         return alpha, beta
+
+
+def traversal_plan_arrays(grid, band_center_face_ids):
+    """
+
+    グリッドの全ての走査順の頂点インデックスを、保存用の名前をキーとする配列の辞書にする
+    単一面の走査順は uni_<走査方向>_face_ids, _indices, _offsets、
+    帯の走査順は band_<帯の走査方向>_<中心の面のID>_indices, _offsets とする
+
+    :type grid: TriangleGrid
+    :param grid: 中心化・拡大・面分割済みのグリッド
+
+    :type band_center_face_ids: tuple(int or long)
+    :param band_center_face_ids: 帯の走査順を保存する、帯の中心となる面のID
+
+    :rtype: dict(str, np.ndarray)
+    :return: 名前をキーとする配列の辞書
+
+    """
+    arrays = {}
+    for direction in BaseFace.UNI_SCAN_DIRECTION:
+        face_ids, indices, row_offsets = grid.traversal_plan(direction)
+        name = "uni_{}".format(direction.name)
+        arrays[name + "_face_ids"] = face_ids
+        arrays[name + "_indices"] = indices
+        arrays[name + "_offsets"] = row_offsets
+    for band_type in TriangleGrid.BAND_TYPE:
+        for center_face_id in band_center_face_ids:
+            indices, row_offsets = grid.band_traversal_plan(band_type,
+                                                            center_face_id)
+            name = "band_{}_{}".format(band_type.name, center_face_id)
+            arrays[name + "_indices"] = indices
+            arrays[name + "_offsets"] = row_offsets
+    return arrays
+
+
+def traversal_plans_from_arrays(arrays):
+    """
+
+    traversal_plan_arrays()の配列の辞書から、走査順を復元する
+    走査順以外の名前の配列は無視する
+
+    :type arrays: dict(str, np.ndarray)
+    :param arrays: 名前をキーとする配列の辞書
+
+    :rtype: dict
+    :return: TriangleGridのtraversal_plansと同じく、traversal_plan()の走査方向、
+             またはband_traversal_plan()の(帯の走査方向, 中心の面のID)を
+             キーとする走査順の辞書
+
+    """
+    traversal_plans = {}
+    for direction in BaseFace.UNI_SCAN_DIRECTION:
+        name = "uni_{}".format(direction.name)
+        traversal_plans[direction] = (arrays[name + "_face_ids"],
+                                      arrays[name + "_indices"],
+                                      arrays[name + "_offsets"])
+    for name in arrays:
+        if name.startswith("band_") and name.endswith("_indices"):
+            band_name, center_face_id = name[len("band_"):-len(
+                "_indices")].rsplit("_", 1)
+            traversal_plans[(TriangleGrid.BAND_TYPE[band_name],
+                             int(center_face_id))] = \
+                (arrays[name], arrays[name[:-len("_indices")] + "_offsets"])
+    return traversal_plans
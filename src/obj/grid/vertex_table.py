@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+from collections import OrderedDict
+
+
+class VertexTable(object):
+    """
+
+    TriangleGridの全ての面の(alpha, beta)座標と頂点インデックスの対応を、
+    一つの配列 shape=(n_face, n_div + 1, n_div + 1) として保持するクラス
+    未定義の座標(alpha + beta > n_div等)は UNDEFINED とする
+
+    配列は変更不可で、グリッドのコピー間で共有する
+
+    """
+
+    UNDEFINED = -1
+
+    def __init__(self, tables):
+        """
+
+        :type tables: np.ndarray
+        :param tables: 各面の(alpha, beta)座標に対応する頂点インデックス
+                       shape=(n_face, n_div + 1, n_div + 1)
+
+        """
+        # Immutableなnumpy配列として保持 メモリマップした配列はコピーしない
+        tables = np.asarray(tables, dtype=np.int32)
+        assert tables.ndim == 3 and tables.shape[1] == tables.shape[2]
+        tables.flags.writeable = False
+
+        self.tables = tables
+
+        # 頂点インデックスから(面の番号, alpha, beta)を引く逆引き表
+        # locations()で必要になった時点で一度だけ求める
+        self.__offsets = None
+        self.__locations = None
+
+    @staticmethod
+    def from_dict(vidx_table, n_div):
+        """
+
+        (alpha, beta)座標と頂点インデックスの辞書から、一つの面の表を生成する
+
+        :type vidx_table: dict((int or long, int or long), int or long)
+        :param vidx_table: 頂点座標(alpha, beta)と頂点インデックスのペア
+
+        :type n_div: int or long
+        :param n_div: 面の分割数
+
+        :rtype: VertexTable
+        :return: 面の数が1のVertexTable
+
+        """
+        tables = np.full(shape=(1, n_div + 1, n_div + 1),
+                         fill_value=VertexTable.UNDEFINED, dtype=np.int32)
+        for (alpha, beta), idx in vidx_table.items():
+            assert isinstance(idx, (int, long)) and idx >= 0
+            assert isinstance(alpha, (int, long)) and 0 <= alpha <= n_div
+            assert isinstance(beta, (int, long)) and 0 <= beta <= n_div
+            tables[0, alpha, beta] = idx
+        return VertexTable(tables)
+
+    @property
+    def n_face(self):
+        """
+
+        :rtype: int
+        :return: 面の数
+
+        """
+        return self.tables.shape[0]
+
+    @property
+    def n_div(self):
+        """
+
+        :rtype: int
+        :return: 面の分割数
+
+        """
+        return self.tables.shape[1] - 1
+
+    def get_vertex_idx(self, face_index, alpha, beta):
+        """
+
+        面の番号と座標から頂点インデックスを取得する
+        未定義の座標の場合、KeyErrorを投げる
+
+        :type face_index: int or long
+        :param face_index: 面の番号(tablesの先頭の添字)
+
+        :type alpha: int or long
+        :param alpha: alpha座標
+
+        :type beta: int or long
+        :param beta: beta座標
+
+        :rtype: int
+        :return: 頂点インデックス
+
+        """
+        n_div = self.n_div
+        if not (0 <= alpha <= n_div and 0 <= beta <= n_div) or \
+                self.tables[face_index, alpha, beta] == VertexTable.UNDEFINED:
+            raise KeyError((alpha, beta))
+        return int(self.tables[face_index, alpha, beta])
+
+    def locations(self, vertex_idx):
+        """
+
+        頂点インデックスが登録されている全ての(面の番号, alpha, beta)を返す
+
+        :type vertex_idx: int or long
+        :param vertex_idx: 頂点インデックス
+
+        :rtype: np.ndarray
+        :return: (面の番号, alpha, beta)の配列 shape=(n_location, 3)
+
+        """
+        if self.__offsets is None:
+            face_indices, alpha, beta = np.nonzero(
+                self.tables != VertexTable.UNDEFINED)
+            vertex_ids = self.tables[face_indices, alpha, beta]
+            order = np.argsort(vertex_ids, kind='mergesort')
+
+            offsets = np.zeros(shape=(vertex_ids.max() + 2 if len(vertex_ids)
+                                      else 1,), dtype=np.int64)
+            offsets[1:] = np.cumsum(np.bincount(vertex_ids))
+            locations = np.stack((face_indices, alpha, beta),
+                                 axis=1)[order].astype(np.int32)
+            offsets.flags.writeable = False
+            locations.flags.writeable = False
+
+            self.__offsets = offsets
+            self.__locations = locations
+
+        if not 0 <= vertex_idx < len(self.__offsets) - 1:
+            return self.__locations[:0]
+        return self.__locations[
+            self.__offsets[vertex_idx]:self.__offsets[vertex_idx + 1]]
+
+    def as_dict(self, face_index):
+        """
+
+        一つの面の表を、(alpha, beta)座標と頂点インデックスの辞書として返す
+        順序は alpha + betaの昇順、同じ和ではbetaの昇順
+
+        :type face_index: int or long
+        :param face_index: 面の番号
+
+        :rtype: OrderedDict((int, int), int)
+        :return: 頂点座標(alpha, beta)と頂点インデックスのペア
+
+        """
+        table = self.tables[face_index]
+        n_div = self.n_div
+        return OrderedDict(
+            ((sum_length - beta, beta), int(table[sum_length - beta, beta]))
+            for sum_length in xrange(2 * n_div + 1)
+            for beta in xrange(max(0, sum_length - n_div),
+                               min(sum_length, n_div) + 1)
+            if table[sum_length - beta, beta] != VertexTable.UNDEFINED)
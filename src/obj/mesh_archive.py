@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import io
+import os
+import tarfile
+import threading
+import zipfile
+from Queue import Queue, Full
+from src.obj.obj3d import Obj3d
+
+
+class MeshArchive(object):
+    """
+
+    zip・tar(.tar.gz, .tar.bz2等)アーカイブに含まれる3Dモデルを、
+    ファイルに展開せずに順に読み込むクラス
+
+    読み込み用のスレッドがアーカイブの先頭から順にメンバを読み出し、
+    最大read_ahead個までメモリ上に先読みする
+    各メンバの内容はメモリ上のファイルオブジェクトとしてObj3d.read()に渡す
+
+    """
+
+    DEFAULT_READ_AHEAD = 4
+
+    # 先読みのキューが空くのを待つ間隔[s] 読み込みの中断を確認するために使う
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, archive_path, read_ahead=DEFAULT_READ_AHEAD):
+        """
+
+        :type archive_path: str
+        :param archive_path: アーカイブのファイルパス
+
+        :type read_ahead: int or long
+        :param read_ahead: メモリ上に先読みするメンバの最大数
+
+        """
+        assert isinstance(archive_path, str)
+        assert isinstance(read_ahead, (int, long)) and read_ahead > 0
+
+        if not MeshArchive.is_archive(archive_path):
+            raise IOError("{} is not a zip or tar archive.".format(
+                archive_path))
+
+        self.archive_path = archive_path
+        self.read_ahead = read_ahead
+
+    @staticmethod
+    def is_archive(path):
+        """
+
+        :type path: str
+        :param path: ファイルパス
+
+        :rtype: bool
+        :return: zip又はtarアーカイブかどうか
+
+        """
+        return os.path.isfile(path) and \
+            (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+    def __iter__(self):
+        """
+
+        アーカイブ内の3Dモデルを、アーカイブ内の順に読み込む
+        Obj3d.EXTENSIONSの拡張子を持たないメンバは読み飛ばす
+
+        :rtype: iterator((str, Obj3d))
+        :return: (メンバ名, 読み込んだObj3dオブジェクト)のイテレータ
+
+        """
+        queue = Queue(maxsize=self.read_ahead)
+        stopped = threading.Event()
+
+        reader = threading.Thread(target=self.__read_members,
+                                  args=(queue, stopped))
+        reader.daemon = True
+        reader.start()
+
+        try:
+            while True:
+                item = queue.get()
+                if item is None:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+
+                name, ext, data = item
+                yield name, Obj3d.read(io.BytesIO(data), ext)
+        finally:
+            # 途中で読み込みを終えた場合も、読み込み用のスレッドを止める
+            stopped.set()
+            while reader.is_alive():
+                while not queue.empty():
+                    queue.get()
+                reader.join(MeshArchive.POLL_INTERVAL)
+
+    def __read_members(self, queue, stopped):
+        """
+
+        読み込み用のスレッドで、アーカイブのメンバを順に読み出してキューに入れる
+        最後にNoneを、失敗した場合は例外を入れる
+
+        :type queue: Queue
+        :param queue: 先読みしたメンバの(メンバ名, 拡張子, 内容)のキュー
+
+        :type stopped: threading.Event
+        :param stopped: 読み込みを中断するかどうか
+
+        """
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    queue.put(item, timeout=MeshArchive.POLL_INTERVAL)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        try:
+            for name, ext, data in self.__members():
+                if not put((name, ext, data)):
+                    return
+            put(None)
+        except BaseException as e:
+            put(e)
+
+    def __members(self):
+        """
+
+        アーカイブの3Dモデルのメンバを順に読み出す
+        tarアーカイブはストリームとして先頭から一度だけ読む
+
+        :rtype: iterator((str, str, str))
+        :return: (メンバ名, 拡張子, 内容)のイテレータ
+
+        """
+        if zipfile.is_zipfile(self.archive_path):
+            with zipfile.ZipFile(self.archive_path) as archive:
+                for info in archive.infolist():
+                    ext = os.path.splitext(info.filename)[1].lower()
+                    if ext in Obj3d.EXTENSIONS:
+                        yield info.filename, ext, archive.read(info)
+        else:
+            with tarfile.open(self.archive_path, mode='r|*') as archive:
+                for member in archive:
+                    ext = os.path.splitext(member.name)[1].lower()
+                    if member.isfile() and ext in Obj3d.EXTENSIONS:
+                        yield member.name, ext, \
+                            archive.extractfile(member).read()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import hashlib
+import os
+import shutil
+import tempfile
+import numpy as np
+from src.obj.obj3d import Obj3d
+
+
+class MeshCache(object):
+    """
+
+    Obj3d.load()で読み込んだ3Dモデルの、バイナリ形式のキャッシュ
+
+    頂点座標・法線ベクトル・面の配列を.npy形式で保存し、
+    元のファイルの更新時刻とサイズが変わっていなければ、メモリマップして読み込む
+    読み込みはファイルの解析を伴わず、同じモデルを読み込む
+    プロセス間ではページキャッシュを共有する
+
+    """
+
+    # 保存形式を変更した場合は更新し、古いキャッシュを使わないようにする
+    FORMAT_VERSION = 1
+
+    # 保存する配列の名前 Obj3dのメンバ名と同じ
+    ARRAY_NAMES = ('vertices', 'normal_vertices', 'face_vertices')
+
+    def __init__(self, cache_dir=None):
+        """
+
+        :type cache_dir: str or unicode
+        :param cache_dir: キャッシュを保存するディレクトリ
+                          Noneの場合、元のファイルと同じディレクトリに保存する
+
+        """
+        assert cache_dir is None or isinstance(cache_dir, basestring)
+
+        self.cache_dir = cache_dir
+
+    def path(self, file_path):
+        """
+
+        元のファイルに対応するキャッシュのディレクトリを返す
+
+        :type file_path: str
+        :param file_path: 元のファイルパス
+
+        :rtype: str
+        :return: キャッシュのディレクトリ
+
+        """
+        if self.cache_dir is None:
+            return file_path + ".cache"
+
+        abs_path = os.path.abspath(file_path)
+        if isinstance(abs_path, unicode):
+            abs_path = abs_path.encode('utf-8')
+        key = hashlib.sha1(abs_path).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, file_path):
+        """
+
+        キャッシュが新しければメモリマップして読み込み、
+        そうでなければ元のファイルを読み込んでキャッシュに保存する
+
+        :type file_path: str
+        :param file_path: 元のファイルパス
+
+        :rtype: Obj3d
+        :return: 読み込んだObj3dオブジェクト
+
+        """
+        path = self.path(file_path)
+        source = MeshCache.__source(file_path)
+
+        if MeshCache.__is_fresh(path, source):
+            return MeshCache.__load(path)
+
+        obj3d = Obj3d.load(file_path)
+        self.__save(path, source, obj3d)
+
+        return obj3d
+
+    @staticmethod
+    def __source(file_path):
+        """
+
+        キャッシュの有効性を判定するための、元のファイルの情報を返す
+
+        :type file_path: str
+        :param file_path: 元のファイルパス
+
+        :rtype: np.ndarray
+        :return: (保存形式の版, ファイルサイズ, 更新時刻)
+
+        """
+        stat = os.stat(file_path)
+        return np.array([MeshCache.FORMAT_VERSION, stat.st_size,
+                         stat.st_mtime], dtype=np.float64)
+
+    @staticmethod
+    def __is_fresh(path, source):
+        """
+
+        :type path: str
+        :param path: キャッシュのディレクトリ
+
+        :type source: np.ndarray
+        :param source: 元のファイルの情報
+
+        :rtype: bool
+        :return: キャッシュが元のファイルと一致するかどうか
+
+        """
+        source_path = os.path.join(path, "source.npy")
+        if not os.path.isfile(source_path):
+            return False
+        try:
+            return np.array_equal(np.load(source_path), source)
+        except (IOError, ValueError):
+            return False
+
+    def __save(self, path, source, obj3d):
+        """
+
+        Obj3dの配列をpathのディレクトリに保存する
+        他のプロセスと同時に保存しても壊れないよう、一時ディレクトリに書き込んでから
+        名前を変更する
+
+        :type path: str
+        :param path: キャッシュのディレクトリ
+
+        :type source: np.ndarray
+        :param source: 元のファイルの情報
+
+        :type obj3d: Obj3d
+        :param obj3d: 保存するObj3dオブジェクト
+
+        """
+        parent_dir = os.path.dirname(path) or os.curdir
+        if not os.path.isdir(parent_dir):
+            try:
+                os.makedirs(parent_dir)
+            except OSError:
+                if not os.path.isdir(parent_dir):
+                    raise
+
+        tmp_path = tempfile.mkdtemp(dir=parent_dir)
+        try:
+            for name in MeshCache.ARRAY_NAMES:
+                array = getattr(obj3d, name)
+                if array is not None:
+                    np.save(os.path.join(tmp_path, name + ".npy"), array)
+            # 元のファイルの情報は最後に書き込み、書き込み途中のキャッシュを使わない
+            np.save(os.path.join(tmp_path, "source.npy"), source)
+
+            # 古いキャッシュは置き換える
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            os.rename(tmp_path, path)
+        except OSError:
+            # 他のプロセスが先に保存した場合はそちらを使う
+            if not os.path.isdir(path):
+                raise
+        finally:
+            if os.path.isdir(tmp_path):
+                shutil.rmtree(tmp_path)
+
+    @staticmethod
+    def __load(path):
+        """
+
+        pathのディレクトリに保存した配列を、メモリマップして読み込む
+
+        :type path: str
+        :param path: キャッシュのディレクトリ
+
+        :rtype: Obj3d
+        :return: 読み込んだObj3dオブジェクト
+
+        """
+        arrays = [np.load(os.path.join(path, name + ".npy"), mmap_mode='r')
+                  if os.path.isfile(os.path.join(path, name + ".npy"))
+                  else None for name in MeshCache.ARRAY_NAMES]
+
+        return Obj3d(*arrays, is_assertion_enabled=False)
@@ -0,0 +1,773 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import struct
+import numpy as np
+from src.util.array_util import concatenate_ranges
+
+# 空白として扱う文字
+_SPACES = np.array([ord(' '), ord('\t'), ord('\r'), ord('\n')],
+                   dtype=np.uint8)
+
+# 行を連続する区間ごとに切り出す区間数の上限
+_MAX_LINE_RUNS = 256
+
+# .plyファイルのプロパティの型
+_PLY_TYPES = {'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+              'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+              'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+              'float': 'f4', 'float32': 'f4',
+              'double': 'f8', 'float64': 'f8'}
+# numpyの型に対応するstructの書式
+_STRUCT_FORMATS = {'i1': 'b', 'u1': 'B', 'i2': 'h', 'u2': 'H',
+                   'i4': 'i', 'u4': 'I', 'f4': 'f', 'f8': 'd'}
+
+# バイナリ形式の.stlファイルの三角形のレコード
+STL_RECORD = np.dtype([('normal', '<f4', (3,)),
+                        ('vertices', '<f4', (3, 3)),
+                        ('attribute', '<u2')])
+
+
+def parse_off(f):
+    """
+
+    .off形式のファイルを読み込み、頂点座標と三角形分割した面を返す
+    ファイル全体をバイト配列として読み、配列演算でまとめて数値に変換する
+    面ごとの色指定には対応しない
+
+    :type f: file
+    :param f: .off形式のファイルオブジェクト
+
+    :rtype: (np.ndarray, np.ndarray)
+    :return: 頂点座標 shape=(n_vertex, 3),
+             面を構成する頂点インデックス shape=(n_face, 3) dtype=np.int32
+
+    """
+    chars = _remove_comments(np.frombuffer(f.read(), dtype=np.uint8))
+    starts = _token_starts(chars)
+
+    # 一つ目の語はファイルフォーマット名、続いて頂点数、面数、辺数
+    header = chars[:starts[4] if len(starts) > 4 else len(chars)]
+    header = header.tostring().split()
+    if len(header) < 4 or header[0] != "OFF":
+        raise IOError("file must be \"off\" format file.")
+    try:
+        n_vertices, n_faces = int(header[1]), int(header[2])
+    except ValueError:
+        raise IOError("invalid \"off\" header.")
+    if len(starts) < 4 + 3 * n_vertices:
+        raise IOError("too few vertices in \"off\" file.")
+
+    # 頂点座標は実数、面は整数として、語の境界で分けて変換する
+    vertex_start, face_start = (
+        starts[i] if i < len(starts) else len(chars)
+        for i in (4, 4 + 3 * n_vertices))
+    vertices = _parse_values(chars[vertex_start:face_start], np.float64,
+                             3 * n_vertices)
+    face_values = _parse_values(chars[face_start:], np.int64,
+                                len(starts) - 4 - 3 * n_vertices)
+
+    # 面は 頂点数 k, 頂点インデックス * k の並び
+    polygon_starts, counts = _polygon_records(face_values, n_faces)
+    faces = triangulate(face_values, polygon_starts + 1, counts)
+
+    return vertices.reshape(n_vertices, 3), _check_indices(faces, n_vertices)
+
+
+def parse_obj(f):
+    """
+
+    .obj形式のファイルを読み込み、頂点座標・法線ベクトル・三角形分割した面を返す
+    各行の先頭のキーワードで頂点・法線・面の行を選び、行の種類ごとにまとめて
+    数値に変換する
+    面の頂点指定 v/vt/vn は頂点インデックスvのみを使う
+
+    :type f: file
+    :param f: .obj形式のファイルオブジェクト
+
+    :rtype: (np.ndarray, np.ndarray, np.ndarray)
+    :return: 頂点座標 shape=(n_vertex, 3), 法線ベクトル shape=(n_normal, 3),
+             面を構成する頂点インデックス shape=(n_face, 3) dtype=np.int32
+
+    """
+    chars = _remove_comments(np.frombuffer(f.read(), dtype=np.uint8))
+
+    # 各行の先頭位置
+    line_starts = np.concatenate(
+        ([0], np.flatnonzero(chars == ord('\n')) + 1))
+
+    # 各行の最初の語の位置 字下げした行も読めるよう、行頭の空白は飛ばす
+    # 語のない行は行頭の位置とする
+    token_starts = np.append(_token_starts(chars), len(chars))
+    keyword_starts = token_starts[np.searchsorted(token_starts, line_starts)]
+    keyword_starts = np.where(
+        keyword_starts < np.append(line_starts[1:], len(chars)),
+        keyword_starts, line_starts)
+
+    # 最初の語の3文字からキーワード(v, vn, f)を判定する
+    padded = np.concatenate((chars, _SPACES[:3]))
+    first, second, third = (padded[keyword_starts + i] for i in xrange(3))
+    is_vertex = (first == ord('v')) & np.in1d(second, _SPACES)
+    is_normal = (first == ord('v')) & (second == ord('n')) & \
+        np.in1d(third, _SPACES)
+    is_face = (first == ord('f')) & np.in1d(second, _SPACES)
+
+    # キーワードの文字を空白に置き換え、面の頂点指定のうち/以降(vt/vn)を除く
+    chars = padded[:len(chars)].copy()
+    chars[keyword_starts[is_vertex | is_face | is_normal]] = ord(' ')
+    chars[keyword_starts[is_normal] + 1] = ord(' ')
+    if (chars == ord('/')).any():
+        chars[_region_mask(chars == ord('/'), np.in1d(chars, _SPACES))] = \
+            ord(' ')
+
+    vertices = _parse_rows(_select_lines(chars, line_starts, is_vertex),
+                           np.count_nonzero(is_vertex))
+    normals = _parse_rows(_select_lines(chars, line_starts, is_normal),
+                          np.count_nonzero(is_normal))
+
+    face_chars = _select_lines(chars, line_starts, is_face)
+    counts = _token_counts(face_chars, np.count_nonzero(is_face))
+    face_values = _parse_values(face_chars, np.int64, counts.sum())
+
+    # インデックスは1始まり 負の値はその行までに定義した頂点からの相対位置
+    if (face_values < 0).any():
+        n_defined = np.cumsum(is_vertex)[is_face]
+        face_values = np.where(face_values < 0,
+                               face_values + np.repeat(n_defined, counts) + 1,
+                               face_values)
+    face_values = face_values - 1
+
+    starts = np.cumsum(counts) - counts
+    faces = triangulate(face_values, starts, counts)
+
+    return vertices, normals, _check_indices(faces, len(vertices))
+
+
+def parse_ply(f):
+    """
+
+    .ply形式のファイルを読み込み、頂点座標・法線ベクトル・三角形分割した面を返す
+    バイナリ形式は、ヘッダから求めた要素の型でファイルの内容をnp.frombufferにより
+    直接参照し、要素ごとのPythonの処理は行わない
+    全ての面の頂点数が等しくない場合のみ、面の位置を順にたどる
+
+    :type f: file
+    :param f: .ply形式のファイルオブジェクト
+
+    :rtype: (np.ndarray, np.ndarray, np.ndarray)
+    :return: 頂点座標 shape=(n_vertex, 3),
+             法線ベクトル shape=(n_vertex, 3) 法線がない場合はNone,
+             面を構成する頂点インデックス shape=(n_face, 3) dtype=np.int32
+
+    """
+    data = f.read()
+    body_format, elements, offset = _ply_header(data)
+
+    read_element = _ply_ascii_element if body_format == "ascii" \
+        else _ply_binary_element
+    byte_order = '>' if body_format == "binary_big_endian" else '<'
+    if body_format == "ascii":
+        chars = np.frombuffer(data, dtype=np.uint8)[offset:]
+        data, offset = _parse_values(chars, np.float64,
+                                     len(_token_starts(chars))), 0
+
+    vertices = normals = faces = None
+    for name, count, properties in elements:
+        fields, offset = read_element(data, offset, count, properties,
+                                      byte_order)
+        if name == "vertex":
+            if not all(axis in fields for axis in ('x', 'y', 'z')):
+                raise IOError("vertex must have x, y, z properties.")
+            vertices = np.stack([fields[axis] for axis in ('x', 'y', 'z')],
+                                axis=1).astype(np.float64)
+            if all(axis in fields for axis in ('nx', 'ny', 'nz')):
+                normals = np.stack([fields[axis] for axis
+                                    in ('nx', 'ny', 'nz')],
+                                   axis=1).astype(np.float64)
+        elif name == "face":
+            indices = fields.get('vertex_indices',
+                                 fields.get('vertex_index'))
+            if indices is None:
+                raise IOError("face must have vertex_indices property.")
+            faces = triangulate(*indices)
+
+    if vertices is None:
+        raise IOError("\"ply\" file must have vertex element.")
+    if faces is None:
+        faces = np.zeros(shape=(0, 3), dtype=np.int32)
+
+    return vertices, normals, _check_indices(faces, len(vertices))
+
+
+def parse_stl(f):
+    """
+
+    .stl形式のファイルを読み込み、頂点座標・各面の法線ベクトル・面を返す
+    バイナリ形式は、三角形のレコードの並びをnp.frombufferにより直接参照する
+    三角形ごとに記述された頂点は、座標の等しいものを一つにまとめる
+
+    :type f: file
+    :param f: .stl形式のファイルオブジェクト
+
+    :rtype: (np.ndarray, np.ndarray, np.ndarray)
+    :return: 頂点座標 shape=(n_vertex, 3), 法線ベクトル shape=(n_face, 3),
+             面を構成する頂点インデックス shape=(n_face, 3) dtype=np.int32
+
+    """
+    data = f.read()
+
+    # バイナリ形式は 80バイトのヘッダ, 三角形数, 三角形のレコードの並び
+    # ASCII形式と同じく"solid"で始まる場合や、末尾に余分なバイトを持つ場合も
+    # あるので、"solid"で始まるテキストのみASCII形式とする
+    n_faces = struct.unpack_from('<I', data, 80)[0] \
+        if len(data) >= 84 else -1
+    chars = np.frombuffer(data, dtype=np.uint8)
+    is_text = not ((chars == 0) | (chars >= 128)).any()
+    if data.lstrip().startswith("solid") and is_text:
+        tokens = np.array(data.split())
+        corners = _stl_ascii_values(tokens, "vertex")
+        normals = _stl_ascii_values(tokens, "normal")
+        if len(corners) != 3 * len(normals) or \
+                len(normals) != np.count_nonzero(tokens == "facet"):
+            raise IOError("invalid facet in \"stl\" file.")
+    elif 0 <= n_faces and 84 + STL_RECORD.itemsize * n_faces <= len(data):
+        records = np.frombuffer(data, dtype=STL_RECORD, count=n_faces,
+                                offset=84)
+        corners = np.ascontiguousarray(records['vertices'].reshape(-1, 3))
+        normals = records['normal'].astype(np.float64)
+    else:
+        raise IOError("file must be \"stl\" format file.")
+
+    if len(corners) == 0:
+        return corners, normals, np.zeros(shape=(0, 3), dtype=np.int32)
+
+    # 座標のバイト列を一つの値とみなして、等しい頂点をまとめる
+    keys = corners.view(np.dtype((np.void, corners.itemsize * 3))).ravel()
+    _, firsts, inverse = np.unique(keys, return_index=True,
+                                   return_inverse=True)
+    return corners[firsts].astype(np.float64), normals, \
+        inverse.reshape(-1, 3).astype(np.int32)
+
+
+def triangulate(indices, starts, counts):
+    """
+
+    多角形を、先頭の頂点を共有する三角形に扇形分割する
+    k角形は (p0, p1, p2), (p0, p2, p3), ..., (p0, pk-2, pk-1) の k - 2個の三角形になる
+
+    :type indices: np.ndarray
+    :param indices: 全ての多角形の頂点インデックスを連結した配列
+
+    :type starts: np.ndarray
+    :param starts: 各多角形の先頭の頂点のindices上の位置
+
+    :type counts: np.ndarray
+    :param counts: 各多角形の頂点数 3以上
+
+    :rtype: np.ndarray
+    :return: 三角形の頂点インデックス shape=(n_triangle, 3) dtype=np.int32
+
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    if (counts < 3).any():
+        raise IOError("polygon must have at least 3 vertices.")
+
+    n_triangles = counts - 2
+    # 各三角形の先頭の頂点の位置と、二つ目の頂点の多角形内の位置
+    firsts = np.repeat(starts, n_triangles)
+    seconds = firsts + concatenate_ranges(np.ones_like(n_triangles),
+                                          n_triangles)
+
+    return np.stack((indices[firsts], indices[seconds],
+                     indices[seconds + 1]), axis=1).astype(np.int32)
+
+
+def _check_indices(faces, n_vertices):
+    """
+
+    面の頂点インデックスが頂点数の範囲内にあることを確認する
+    範囲外の場合、IOErrorを投げる
+
+    :type faces: np.ndarray
+    :param faces: 面を構成する頂点インデックス shape=(n_face, 3)
+
+    :type n_vertices: int
+    :param n_vertices: 頂点数
+
+    :rtype: np.ndarray
+    :return: faces
+
+    """
+    if len(faces) > 0 and (faces.min() < 0 or faces.max() >= n_vertices):
+        raise IOError("vertex index out of range.")
+    return faces
+
+
+def _region_mask(is_mark, is_reset):
+    """
+
+    各文字が、開始の文字から次の終了の文字の手前までの区間にあるかを求める
+
+    :type is_mark: np.ndarray
+    :param is_mark: 区間を開始する文字かどうか
+
+    :type is_reset: np.ndarray
+    :param is_reset: 区間を終了する文字かどうか
+
+    :rtype: np.ndarray
+    :return: 区間にあるかどうか
+
+    """
+    marks = np.flatnonzero(is_mark)
+    resets = np.flatnonzero(is_reset)
+
+    # 各区間の終了位置 同じ区間内の2つ目以降の開始の文字は除く
+    ends = np.append(resets, len(is_mark))[np.searchsorted(resets, marks)]
+    ends, firsts = np.unique(ends, return_index=True)
+
+    # 区間の先頭で+1、末尾の次で-1とした累積和が区間内で1となる
+    steps = np.zeros(shape=(len(is_mark) + 1,), dtype=np.int8)
+    steps[marks[firsts]] = 1
+    steps[ends] -= 1
+    return np.cumsum(steps[:-1], dtype=np.int8).astype(bool)
+
+
+def _remove_comments(chars):
+    """
+
+    コメント(#から行末まで)を除く
+
+    :type chars: np.ndarray
+    :param chars: ファイルの内容のバイト配列
+
+    :rtype: np.ndarray
+    :return: コメントを除いたバイト配列
+
+    """
+    is_hash = chars == ord('#')
+    if not is_hash.any():
+        return chars
+    return chars[~_region_mask(is_hash, chars == ord('\n'))]
+
+
+def _select_lines(chars, line_starts, is_line):
+    """
+
+    指定した行のみを連結したバイト配列を返す
+    同じ種類の行は通常連続しているので、連続する行はまとめて切り出す
+
+    :type chars: np.ndarray
+    :param chars: ファイルの内容のバイト配列
+
+    :type line_starts: np.ndarray
+    :param line_starts: 各行の先頭位置
+
+    :type is_line: np.ndarray
+    :param is_line: 各行を選ぶかどうか
+
+    :rtype: np.ndarray
+    :return: 選んだ行のバイト配列
+
+    """
+    bounds = np.append(line_starts, len(chars))
+
+    # 選ぶ行が連続する区間 [run_starts, run_stops)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], is_line, [0]))))
+    run_starts, run_stops = bounds[edges[::2]], bounds[edges[1::2]]
+
+    if len(run_starts) <= _MAX_LINE_RUNS:
+        return np.concatenate([chars[start:stop] for start, stop
+                               in zip(run_starts, run_stops)] +
+                              [chars[:0]])
+
+    # 種類の異なる行が交互に並ぶ場合は、文字ごとに選ぶ
+    return chars[np.repeat(is_line, np.diff(bounds))]
+
+
+def _ply_header(data):
+    """
+
+    .ply形式のヘッダを解析する
+
+    :type data: str
+    :param data: ファイルの内容
+
+    :rtype: (str, list((str, int, list)), int)
+    :return: 本体の形式(ascii, binary_little_endian, binary_big_endian),
+             各要素の(名前, 数, プロパティのリスト), 本体の先頭位置
+             プロパティは(名前, 型)又は(名前, (個数の型, 値の型))
+
+    """
+    end = data.find("end_header")
+    if not data.startswith("ply") or end < 0:
+        raise IOError("file must be \"ply\" format file.")
+    body_start = data.find('\n', end) + 1 if '\n' in data[end:] \
+        else len(data)
+
+    body_format = None
+    elements = []
+    for line in data[:end].split('\n')[1:]:
+        words = line.split()
+        if len(words) == 0 or words[0] in ("comment", "obj_info"):
+            continue
+        try:
+            if words[0] == "format":
+                body_format = words[1]
+            elif words[0] == "element":
+                elements.append((words[1], int(words[2]), []))
+            elif words[0] == "property" and words[1] == "list":
+                elements[-1][2].append((words[4], (_PLY_TYPES[words[2]],
+                                                   _PLY_TYPES[words[3]])))
+            elif words[0] == "property":
+                elements[-1][2].append((words[2], _PLY_TYPES[words[1]]))
+            else:
+                raise IOError("invalid \"ply\" header : {}".format(line))
+        except (IndexError, KeyError, ValueError):
+            raise IOError("invalid \"ply\" header : {}".format(line))
+
+    if body_format not in ("ascii", "binary_little_endian",
+                           "binary_big_endian"):
+        raise IOError("unknown \"ply\" format : {}".format(body_format))
+
+    return body_format, elements, body_start
+
+
+def _ply_binary_element(data, offset, count, properties, byte_order):
+    """
+
+    バイナリ形式の.plyファイルから一つの要素を読み込む
+    リストのプロパティは、全ての要素で長さが等しければ配列演算のみで読み込む
+
+    :type data: str
+    :param data: ファイルの内容
+
+    :type offset: int
+    :param offset: 要素の先頭位置
+
+    :type count: int
+    :param count: 要素の数
+
+    :type properties: list
+    :param properties: プロパティのリスト
+
+    :type byte_order: str
+    :param byte_order: バイトオーダー('<' 又は '>')
+
+    :rtype: (dict, int)
+    :return: プロパティ名をキーとする値の辞書, 次の要素の先頭位置
+             リストのプロパティの値は(連結した値, 各リストの先頭位置, 長さ)
+
+    """
+    # 先頭の要素のリストの長さを、全ての要素のリストの長さと仮定した型
+    dtype_fields = []
+    position = offset
+    for name, property_type in properties:
+        if isinstance(property_type, tuple):
+            count_type, value_type = (np.dtype(byte_order + t)
+                                      for t in property_type)
+            length = 0 if count == 0 else int(np.frombuffer(
+                data, dtype=count_type, count=1, offset=position)[0])
+            dtype_fields.append(("_count_" + name, count_type))
+            dtype_fields.append((name, value_type, (length,)))
+            position += count_type.itemsize + value_type.itemsize * length
+        else:
+            dtype_fields.append((name, byte_order + property_type))
+            position += np.dtype(property_type).itemsize
+    dtype = np.dtype(dtype_fields)
+
+    try:
+        records = np.frombuffer(data, dtype=dtype, count=count,
+                                offset=offset)
+    except ValueError:
+        records = None
+
+    list_names = [name for name, property_type in properties
+                  if isinstance(property_type, tuple)]
+    if records is not None and all(
+            (records["_count_" + name] == dtype[name].shape[0]).all()
+            for name in list_names):
+        fields = {name: records[name] for name, _ in properties}
+        for name in list_names:
+            length = dtype[name].shape[0]
+            fields[name] = (records[name].reshape(-1),
+                            np.arange(count, dtype=np.int64) * length,
+                            np.full(shape=(count,), fill_value=length,
+                                    dtype=np.int64))
+        return fields, offset + dtype.itemsize * count
+
+    if records is None and len(list_names) == 0:
+        raise IOError("too few elements in \"ply\" file.")
+
+    # リストの長さが異なる場合
+    if len(list_names) != 1:
+        raise IOError("unsupported \"ply\" element.")
+    return _ply_binary_list(data, offset, count, properties, byte_order)
+
+
+def _ply_binary_list(data, offset, count, properties, byte_order):
+    """
+
+    長さの異なるリストのプロパティを一つ持つ要素を、
+    各要素の位置を順にたどって読み込む リスト以外のプロパティは読み込まない
+
+    :type data: str
+    :param data: ファイルの内容
+
+    :type offset: int
+    :param offset: 要素の先頭位置
+
+    :type count: int
+    :param count: 要素の数
+
+    :type properties: list
+    :param properties: プロパティのリスト
+
+    :type byte_order: str
+    :param byte_order: バイトオーダー('<' 又は '>')
+
+    :rtype: (dict, int)
+    :return: リストのプロパティ名をキーとする
+             (連結した値, 各リストの先頭位置, 長さ)の辞書, 次の要素の先頭位置
+
+    """
+    index = [isinstance(t, tuple) for _, t in properties].index(True)
+    name, (count_type, value_type) = properties[index]
+    count_type = np.dtype(byte_order + count_type)
+    value_type = np.dtype(byte_order + value_type)
+
+    # リストの前後のプロパティのバイト数
+    before = sum(np.dtype(t).itemsize for _, t in properties[:index])
+    after = sum(np.dtype(t).itemsize for _, t in properties[index + 1:])
+    count_format = byte_order + _STRUCT_FORMATS[count_type.str[1:]]
+
+    value_starts = np.zeros(shape=(count,), dtype=np.int64)
+    lengths = np.zeros(shape=(count,), dtype=np.int64)
+    position = offset
+    try:
+        for i in xrange(count):
+            position += before
+            length = struct.unpack_from(count_format, data, position)[0]
+            position += count_type.itemsize
+            value_starts[i] = position
+            lengths[i] = length
+            position += value_type.itemsize * length + after
+    except struct.error:
+        raise IOError("too few elements in \"ply\" file.")
+    if position > len(data):
+        raise IOError("too few elements in \"ply\" file.")
+
+    # 各リストの値のバイト列を連結し、値の型として参照する
+    chars = np.frombuffer(data, dtype=np.uint8)
+    values = chars[concatenate_ranges(
+        value_starts, lengths * value_type.itemsize)].view(value_type)
+
+    return {name: (values, np.cumsum(lengths) - lengths, lengths)}, position
+
+
+def _ply_ascii_element(values, offset, count, properties, byte_order):
+    """
+
+    ASCII形式の.plyファイルから一つの要素を読み込む
+    リストのプロパティは、要素がそのリストのみからなる場合に限り読み込む
+
+    :type values: np.ndarray
+    :param values: 本体の全ての数値
+
+    :type offset: int
+    :param offset: 要素の先頭の数値の位置
+
+    :type count: int
+    :param count: 要素の数
+
+    :type properties: list
+    :param properties: プロパティのリスト
+
+    :type byte_order: str
+    :param byte_order: 使用しない
+
+    :rtype: (dict, int)
+    :return: プロパティ名をキーとする値の辞書, 次の要素の先頭の数値の位置
+             リストのプロパティの値は(連結した値, 各リストの先頭位置, 長さ)
+
+    """
+    if not any(isinstance(t, tuple) for _, t in properties):
+        n_values = count * len(properties)
+        if offset + n_values > len(values):
+            raise IOError("too few elements in \"ply\" file.")
+        records = values[offset:offset + n_values].reshape(count, -1)
+        fields = {name: records[:, i]
+                  for i, (name, _) in enumerate(properties)}
+        return fields, offset + n_values
+
+    if len(properties) != 1:
+        raise IOError("unsupported \"ply\" element.")
+
+    # (長さ, 値 * 長さ)の並び
+    name = properties[0][0]
+    list_values = values[offset:].astype(np.int64)
+    starts, lengths = _polygon_records(list_values, count)
+    end = offset + (starts[-1] + lengths[-1] + 1 if count > 0 else 0)
+    return {name: (list_values, starts + 1, lengths)}, end
+
+
+def _stl_ascii_values(tokens, keyword):
+    """
+
+    ASCII形式の.stlファイルから、キーワードに続く3つの数値を全て取り出す
+
+    :type tokens: np.ndarray
+    :param tokens: ファイルの全ての語
+
+    :type keyword: str
+    :param keyword: キーワード(vertex 又は normal)
+
+    :rtype: np.ndarray
+    :return: 数値の配列 shape=(n, 3)
+
+    """
+    positions = np.flatnonzero(tokens == keyword)
+    if len(positions) > 0 and positions[-1] + 3 >= len(tokens):
+        raise IOError("invalid {} in \"stl\" file.".format(keyword))
+    try:
+        return tokens[positions[:, np.newaxis] + np.arange(1, 4)].astype(
+            np.float64).reshape(-1, 3)
+    except ValueError:
+        raise IOError("invalid {} in \"stl\" file.".format(keyword))
+
+
+def _token_starts(chars):
+    """
+
+    空白区切りの各語の先頭の位置を求める
+
+    :type chars: np.ndarray
+    :param chars: 空白区切りの文字列のバイト配列
+
+    :rtype: np.ndarray
+    :return: 各語の先頭の文字の位置
+
+    """
+    is_space = np.in1d(chars, _SPACES)
+
+    # 語の先頭は、直前が空白(又は文字列の先頭)である空白以外の文字
+    is_start = ~is_space
+    is_start[1:] &= is_space[:-1]
+
+    return np.flatnonzero(is_start)
+
+
+def _token_counts(chars, n_lines):
+    """
+
+    改行区切りの各行に含まれる、空白区切りの語の数を求める
+
+    :type chars: np.ndarray
+    :param chars: 改行区切りの文字列のバイト配列
+
+    :type n_lines: int
+    :param n_lines: 行の数
+
+    :rtype: np.ndarray
+    :return: 各行の語の数 shape=(n_lines,)
+
+    """
+    line_ids = np.searchsorted(np.flatnonzero(chars == ord('\n')),
+                               _token_starts(chars))
+    return np.bincount(line_ids, minlength=n_lines)[:n_lines]
+
+
+def _parse_values(chars, dtype, n_values):
+    """
+
+    空白区切りの数値の並びをまとめて変換する
+    数値として読めない語がある場合、IOErrorを投げる
+
+    :type chars: np.ndarray
+    :param chars: 空白区切りの数値の並びのバイト配列
+
+    :type dtype: type
+    :param dtype: 変換後の型 np.float64又はnp.int64
+
+    :type n_values: int
+    :param n_values: 語の数
+
+    :rtype: np.ndarray
+    :return: 数値の配列
+
+    """
+    values = np.fromstring(chars.tostring(), dtype=dtype, sep=' ')
+    # fromstringは読めない語の手前で止まるので、語の数と比較する
+    if len(values) != n_values:
+        raise IOError("failed to parse numeric values.")
+    return values
+
+
+def _parse_rows(chars, n_rows):
+    """
+
+    一行に一つずつ座標を記述した行を、shape=(n, 3)の配列に変換する
+    4つ目以降の値(同次座標のw、頂点色等)は無視する
+
+    :type chars: np.ndarray
+    :param chars: 改行区切りの座標の行のバイト配列
+
+    :type n_rows: int
+    :param n_rows: 行の数
+
+    :rtype: np.ndarray
+    :return: 座標配列 shape=(n, 3)
+
+    """
+    counts = _token_counts(chars, n_rows)
+    if (counts < 3).any():
+        raise IOError("coordinate must have 3 values.")
+
+    values = _parse_values(chars, np.float64, counts.sum())
+    if len(values) == 3 * n_rows:
+        return values.reshape(-1, 3)
+
+    starts = np.cumsum(counts) - counts
+    return values[starts[:, np.newaxis] + np.arange(3)]
+
+
+def _polygon_records(values, n_polygons):
+    """
+
+    (頂点数 k, 頂点インデックス * k)の並びから、各多角形の位置と頂点数を求める
+    全ての多角形の頂点数が等しい場合は配列演算のみで求める
+
+    :type values: np.ndarray
+    :param values: 多角形の並び
+
+    :type n_polygons: int
+    :param n_polygons: 多角形の数
+
+    :rtype: (np.ndarray, np.ndarray)
+    :return: 各多角形の頂点数の位置 shape=(n_polygons,),
+             各多角形の頂点数 shape=(n_polygons,)
+
+    """
+    if n_polygons == 0:
+        return np.zeros(shape=(0,), dtype=np.int64), \
+               np.zeros(shape=(0,), dtype=np.int64)
+
+    # 頂点数が全て等しい場合
+    k = values[0] if len(values) > 0 else 0
+    if k > 0 and len(values) == n_polygons * (k + 1) and \
+            (values[::k + 1] == k).all():
+        return np.arange(n_polygons, dtype=np.int64) * (k + 1), \
+               np.full(shape=(n_polygons,), fill_value=k, dtype=np.int64)
+
+    # 頂点数が異なる場合は、各多角形の先頭を順にたどる
+    starts = np.zeros(shape=(n_polygons,), dtype=np.int64)
+    position = 0
+    for i in xrange(n_polygons):
+        if position >= len(values):
+            raise IOError("too few faces.")
+        starts[i] = position
+        position += int(values[position]) + 1
+    if position > len(values):
+        raise IOError("too few faces.")
+
+    return starts, values[starts]
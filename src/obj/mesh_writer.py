@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+from src.obj.mesh_parser import STL_RECORD
+
+
+def write_off(f, vertices, faces):
+    """
+
+    頂点座標と面を.off形式で書き込む
+    各ブロックは一つの文字列としてまとめて書き込む
+
+    :type f: file
+    :param f: 書き込み先のファイルオブジェクト
+
+    :type vertices: np.ndarray
+    :param vertices: 頂点座標 shape=(n_vertex, 3)
+
+    :type faces: np.ndarray
+    :param faces: 面を構成する頂点インデックス shape=(n_face, 3) 又はNone
+
+    """
+    faces = _as_faces(faces)
+
+    # 頂点数 面数 辺数
+    f.write("OFF\n{0} {1} 0\n\n".format(len(vertices), len(faces)))
+    f.write(_format_rows("%r %r %r\n", vertices))
+    f.write(_format_rows("3 %d %d %d\n", faces))
+
+
+def write_obj(f, vertices, normals, faces):
+    """
+
+    頂点座標・法線ベクトル・面を.obj形式で書き込む
+    各ブロックは一つの文字列としてまとめて書き込む
+
+    :type f: file
+    :param f: 書き込み先のファイルオブジェクト
+
+    :type vertices: np.ndarray
+    :param vertices: 頂点座標 shape=(n_vertex, 3)
+
+    :type normals: np.ndarray
+    :param normals: 法線ベクトル shape=(n_normal, 3) 又はNone
+
+    :type faces: np.ndarray
+    :param faces: 面を構成する頂点インデックス shape=(n_face, 3) 又はNone
+
+    """
+    f.write("# OBJ file format with ext .obj\n")
+    f.write("# vertex count = {}\n".format(len(vertices)))
+    if faces is not None:
+        f.write("# face count = {}\n".format(len(faces)))
+
+    f.write(_format_rows("v %r %r %r\n", vertices))
+    if normals is not None:
+        f.write(_format_rows("vn %r %r %r\n", normals))
+    # objファイルの面情報インデックスは１始まりなので、+1する
+    f.write(_format_rows("f %d %d %d\n", _as_faces(faces) + 1))
+
+
+def write_ply(f, vertices, normals, faces):
+    """
+
+    頂点座標・法線ベクトル・面をバイナリ形式(リトルエンディアン)の.ply形式で
+    書き込む
+    頂点・面はそれぞれ一つの構造化配列としてまとめて書き込む
+    法線ベクトルは頂点と同数の場合のみ、頂点のプロパティとして書き込む
+
+    :type f: file
+    :param f: 書き込み先のファイルオブジェクト(バイナリモード)
+
+    :type vertices: np.ndarray
+    :param vertices: 頂点座標 shape=(n_vertex, 3)
+
+    :type normals: np.ndarray
+    :param normals: 法線ベクトル shape=(n_vertex, 3) 又はNone
+
+    :type faces: np.ndarray
+    :param faces: 面を構成する頂点インデックス shape=(n_face, 3) 又はNone
+
+    """
+    faces = _as_faces(faces)
+    has_normals = normals is not None and len(normals) == len(vertices) \
+        and len(normals) > 0
+
+    vertex_fields = [(name, '<f8') for name in ('x', 'y', 'z')]
+    if has_normals:
+        vertex_fields += [(name, '<f8') for name in ('nx', 'ny', 'nz')]
+
+    header = ["ply", "format binary_little_endian 1.0",
+              "element vertex {}".format(len(vertices))]
+    header += ["property double {}".format(name)
+               for name, _ in vertex_fields]
+    header += ["element face {}".format(len(faces)),
+               "property list uchar int vertex_indices", "end_header\n"]
+    f.write("\n".join(header))
+
+    vertex_records = np.zeros(shape=(len(vertices),),
+                              dtype=np.dtype(vertex_fields))
+    for i, name in enumerate(('x', 'y', 'z')):
+        vertex_records[name] = vertices[:, i]
+    if has_normals:
+        for i, name in enumerate(('nx', 'ny', 'nz')):
+            vertex_records[name] = normals[:, i]
+    f.write(vertex_records.tostring())
+
+    face_records = np.zeros(shape=(len(faces),), dtype=np.dtype(
+        [('count', 'u1'), ('vertex_indices', '<i4', (3,))]))
+    face_records['count'] = 3
+    face_records['vertex_indices'] = faces
+    f.write(face_records.tostring())
+
+
+def write_stl(f, vertices, faces):
+    """
+
+    頂点座標と面をバイナリ形式の.stl形式で書き込む
+    各三角形の法線ベクトルは頂点座標から求める
+    全ての三角形を一つの構造化配列としてまとめて書き込む
+
+    :type f: file
+    :param f: 書き込み先のファイルオブジェクト(バイナリモード)
+
+    :type vertices: np.ndarray
+    :param vertices: 頂点座標 shape=(n_vertex, 3)
+
+    :type faces: np.ndarray
+    :param faces: 面を構成する頂点インデックス shape=(n_face, 3) 又はNone
+
+    """
+    faces = _as_faces(faces)
+    corners = np.asarray(vertices, dtype=np.float64)[faces]
+
+    normals = np.cross(corners[:, 1] - corners[:, 0],
+                       corners[:, 2] - corners[:, 0])
+    norms = np.linalg.norm(normals, axis=1)
+    normals[norms > 0] /= norms[norms > 0, np.newaxis]
+
+    records = np.zeros(shape=(len(faces),), dtype=STL_RECORD)
+    records['normal'] = normals
+    records['vertices'] = corners
+
+    f.write("binary STL".ljust(80, ' '))
+    f.write(np.array([len(faces)], dtype='<u4').tostring())
+    f.write(records.tostring())
+
+
+def _as_faces(faces):
+    """
+
+    :type faces: np.ndarray
+    :param faces: 面を構成する頂点インデックス 又はNone
+
+    :rtype: np.ndarray
+    :return: 面を構成する頂点インデックス shape=(n_face, 3)
+
+    """
+    if faces is None:
+        return np.zeros(shape=(0, 3), dtype=np.int64)
+    return np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+
+
+def _format_rows(row_format, array):
+    """
+
+    配列の各行を書式に当てはめ、全ての行を連結した文字列を返す
+    全ての行の書式を連結し、一度の書式化で文字列を生成する
+
+    :type row_format: str
+    :param row_format: 一行の書式
+
+    :type array: np.ndarray
+    :param array: 書き込む配列 shape=(n_row, n_column)
+
+    :rtype: str
+    :return: 全ての行の文字列
+
+    """
+    if len(array) == 0:
+        return ""
+    return (row_format * len(array)) % tuple(np.ravel(array).tolist())
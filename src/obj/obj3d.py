@@ -3,6 +3,9 @@
 
 import os
 import numpy as np
+from src.obj.mesh_parser import parse_off, parse_obj, parse_ply, parse_stl
+from src.obj.mesh_writer import write_off, write_obj, write_ply, write_stl
+from src.obj.triangle_arrays import TriangleArrays
 
 
 class Obj3d(object):
@@ -12,7 +15,11 @@ class Obj3d(object):
 
     """
 
-    def __init__(self, vertices, normal_vertices=None, face_vertices=None):
+    # load()、read()で読み込める形式の拡張子
+    EXTENSIONS = ('.off', '.obj', '.ply', '.stl')
+
+    def __init__(self, vertices, normal_vertices=None, face_vertices=None,
+                 is_assertion_enabled=True):
         """
 
         :type vertices : list or tuple or np.ndarray
@@ -24,25 +31,142 @@ class Obj3d(object):
         :type face_vertices: list or tuple or np.ndarray
         :param face_vertices: 各面を構成する頂点情報
 
+        :type is_assertion_enabled: bool
+        :param is_assertion_enabled: 配列のアサーションチェックを有効にするかどうか
+                                     形状を確認済みの配列(ファイルの読み込み結果等)
+                                     の場合はFalseとする
+
         """
 
         # assertion
-        self.__check_array(vertices, is_nullable=False)
-        self.__check_array(normal_vertices, is_nullable=True)
-        self.__check_array(face_vertices, is_nullable=True)
+        if is_assertion_enabled:
+            self.__check_array(vertices, is_nullable=False)
+            self.__check_array(normal_vertices, is_nullable=True)
+            self.__check_array(face_vertices, is_nullable=True)
 
         # Immutableなnumpy配列として保持
-        self.vertices = Obj3d.__as_immutable_array(vertices)
         self.normal_vertices = Obj3d.__as_immutable_array(normal_vertices)
         self.face_vertices = Obj3d.__as_immutable_array(face_vertices)
 
+        # 頂点座標は、元の頂点座標と、後から合成した相似変換
+        # (拡大率, 回転行列, 平行移動)として保持し、
+        # verticesを最初に参照した時に一度だけ変換する
+        self.__source_vertices = Obj3d.__as_immutable_array(vertices)
+        self.__transform = None
+        self.__vertices = self.__source_vertices
+        # 元の頂点座標の重心・重心からの最大距離 変換したObj3d間で共有する
+        self.__source_statistics = {}
+
+        # 三角形面の配列 triangle_arrays()で一度だけ生成する
+        self.__triangle_arrays = None
+
+    @property
+    def vertices(self):
+        """
+
+        頂点座標配列
+        合成した変換があれば、最初に参照した時に一度だけ適用する
+
+        :rtype: np.ndarray
+        :return: 頂点座標配列 shape=(n_vertex, 3)
+
+        """
+        if self.__vertices is None:
+            scale, rotation, translation = self.__transform
+            self.__vertices = Obj3d.__as_immutable_array(
+                np.dot(self.__source_vertices, (scale * rotation).T) +
+                translation)
+        return self.__vertices
+
+    def __affine(self):
+        """
+
+        元の頂点座標xから現在の頂点座標 scale * rotation.x + translation への
+        相似変換を返す
+
+        :rtype: (float, np.ndarray, np.ndarray)
+        :return: 拡大率, 回転行列 shape=(3, 3), 平行移動 shape=(3,)
+
+        """
+        if self.__transform is None:
+            return 1., np.eye(3), np.zeros(shape=(3,))
+        return self.__transform
+
+    def __source_mean(self):
+        """
+
+        :rtype: np.ndarray
+        :return: 元の頂点座標の重心 shape=(3,)
+
+        """
+        statistics = self.__source_statistics
+        if 'mean' not in statistics:
+            statistics['mean'] = np.mean(self.__source_vertices, axis=0)
+        return statistics['mean']
+
+    def __source_radius(self):
+        """
+
+        :rtype: float
+        :return: 元の頂点座標の、重心から最も遠い頂点までの距離
+
+        """
+        statistics = self.__source_statistics
+        if 'radius' not in statistics:
+            statistics['radius'] = np.max(np.linalg.norm(
+                self.__source_vertices - self.__source_mean(), axis=1))
+        return statistics['radius']
+
+    def __centroid(self):
+        """
+
+        相似変換は重心を保つので、元の頂点座標の重心から現在の重心を求める
+
+        :rtype: np.ndarray
+        :return: 頂点群の重心 shape=(3,)
+
+        """
+        scale, rotation, translation = self.__affine()
+        return scale * np.dot(rotation, self.__source_mean()) + translation
+
+    def __transformed(self, scale, rotation, translation):
+        """
+
+        元の頂点座標に相似変換 scale * rotation.x + translation を適用した
+        Obj3dオブジェクトを、頂点座標を変換せずに返す
+        法線・面の配列はImmutableなので共有する
+
+        :type scale: float
+        :param scale: 拡大率
+
+        :type rotation: np.ndarray
+        :param rotation: 回転行列 shape=(3, 3)
+
+        :type translation: np.ndarray
+        :param translation: 平行移動 shape=(3,)
+
+        :rtype: Obj3d
+        :return: 変換後のObj3dオブジェクト
+
+        """
+        obj3d = Obj3d.__new__(Obj3d)
+        obj3d.normal_vertices = self.normal_vertices
+        obj3d.face_vertices = self.face_vertices
+        obj3d.__source_vertices = self.__source_vertices
+        obj3d.__transform = (scale, rotation, translation)
+        obj3d.__vertices = None
+        obj3d.__source_statistics = self.__source_statistics
+        obj3d.__triangle_arrays = None
+        return obj3d
+
     @staticmethod
     def __check_array(list_mem, is_nullable=False):
         """
 
-        メンバ配列がリスト又はNumpy配列であることをチェックする関数
+        メンバ配列が shape=(n, 3) の数値配列として扱えることをチェックする関数
+        Numpy配列やバッファプロトコルに対応したオブジェクトはコピーせずに調べる
 
-        :type list_mem: list or np.ndarray
+        :type list_mem: list or tuple or np.ndarray
         :param list_mem: リスト又はNumpy配列
 
         :type is_nullable: bool
@@ -54,25 +178,15 @@ class Obj3d(object):
 
         assert list_mem is not None
 
-        # xyzがリスト or Numpy Arrayであるかチェック
-        if not isinstance(list_mem, np.ndarray):
-            # iterator
-            assert hasattr(list_mem, "__getitem__")
-            for xyz in list_mem:
-                assert hasattr(xyz, "__getitem__")
-                assert len(xyz) == 3
-                x, y, z = xyz
-                assert not hasattr(x, "__getitem__")
-                assert not hasattr(y, "__getitem__")
-                assert not hasattr(z, "__getitem__")
-        else:
-            # numpy array
-            for xyz in list_mem:
-                assert len(xyz) == 3
-                x, y, z = xyz
-                assert not isinstance(x, np.ndarray)
-                assert not isinstance(y, np.ndarray)
-                assert not isinstance(z, np.ndarray)
+        # リストの場合のみ変換する Numpy配列等はそのまま参照する
+        array = np.asarray(list_mem)
+
+        # 要素数0の配列は形状を問わない
+        if array.size == 0:
+            return
+
+        assert array.ndim == 2 and array.shape[1] == 3
+        assert np.issubdtype(array.dtype, np.number)
 
     @staticmethod
     def __as_immutable_array(array):
@@ -95,6 +209,23 @@ class Obj3d(object):
 
         return array
 
+    def triangle_arrays(self):
+        """
+
+        三角形面の頂点・辺ベクトルの配列を返す
+        頂点と面はImmutableなので、生成した配列を以降の呼び出しで再利用する
+
+        :rtype: TriangleArrays
+        :return: TriangleArraysオブジェクト
+
+        """
+        assert self.face_vertices is not None
+
+        if self.__triangle_arrays is None:
+            self.__triangle_arrays = TriangleArrays(self.vertices,
+                                                    self.face_vertices)
+        return self.__triangle_arrays
+
     def vertices_as_copy(self):
         """
 
@@ -149,11 +280,9 @@ class Obj3d(object):
         :return: 座標を平行移動したObj3dオブジェクトのコピー
 
         """
-
-        center_vertices = np.mean(self.vertices, axis=0)
-        return Obj3d(self.vertices - center_vertices,
-                     self.normals_as_copy(),
-                     self.faces_as_copy())
+        scale, rotation, translation = self.__affine()
+        return self.__transformed(scale, rotation,
+                                  translation - self.__centroid())
 
     def normal(self):
         """
@@ -164,18 +293,9 @@ class Obj3d(object):
         :return: 座標を正規化したObj3dオブジェクトのコピー
 
         """
-
-        center_vertices = np.mean(self.vertices, axis=0)
-
-        centered_obj3d = self.center()
-
-        max_norm = np.max(np.linalg.norm(centered_obj3d.vertices, axis=1))
-
-        normalized_vertices = centered_obj3d.vertices / max_norm
-
-        return Obj3d(normalized_vertices + center_vertices,
-                     self.normals_as_copy(),
-                     self.faces_as_copy())
+        # 重心から最も遠い頂点までの距離は、元の頂点座標での距離の|拡大率|倍
+        scale, _, _ = self.__affine()
+        return self.scale(1. / (abs(scale) * self.__source_radius()))
 
     def scale(self, r):
         """
@@ -189,19 +309,16 @@ class Obj3d(object):
         :return: 座標を拡大縮小したObj3dオブジェクトのコピー
 
         """
+        scale, rotation, translation = self.__affine()
+        center = self.__centroid()
+        return self.__transformed(r * scale, rotation,
+                                  r * (translation - center) + center)
 
-        center_vertices = np.mean(self.vertices, axis=0)
-
-        centered_obj3d = self.center()
-
-        return Obj3d(centered_obj3d.vertices_as_copy() * r + center_vertices,
-                     self.normals_as_copy(),
-                     self.faces_as_copy())
-
-    def rotate(self, theta, axis_vector):
+    @staticmethod
+    def rotation_matrix(theta, axis_vector):
         """
 
-        頂点群をaxis_vectorを軸として角度thetaだけ回転する
+        axis_vectorを軸として角度thetaだけ回転する回転行列を返す
 
         :type theta: float
         :param theta: 回転角
@@ -209,10 +326,10 @@ class Obj3d(object):
         :type axis_vector: np.ndarray
         :param axis_vector: 軸ベクトル
 
-        :rtype: Obj3d
-        :return: 回転後のObj3dオブジェクトのコピー
-        """
+        :rtype: np.ndarray
+        :return: 回転行列 shape=(3, 3)
 
+        """
         assert isinstance(theta, float)
         assert len(axis_vector) == 3
         for elem in axis_vector:
@@ -235,104 +352,92 @@ class Obj3d(object):
                            ay * az * (1. - cos) + ax * sin,
                            az * az * (1. - cos) + cos]])
 
-        center = np.mean(self.vertices, axis=0)
-
-        centered_vertices = self.vertices - center
+        return r_mtr
 
-        return Obj3d(np.dot(centered_vertices, r_mtr.T) + center,
-                     self.normals_as_copy(), self.faces_as_copy())
-
-    @staticmethod
-    def load(file_path):
+    def rotate(self, theta, axis_vector):
         """
 
-        ファイルパスの拡張子を識別してファイル読み込みを行い、Obj3dオブジェクトを返す
+        頂点群をaxis_vectorを軸として角度thetaだけ回転する
 
-        :type file_path: str
-        :param file_path: ファイルパス
+        :type theta: float
+        :param theta: 回転角
 
-        :rtype: Obj3d
-        :return: ファイル読み込みによって生成されたObj3dオブジェクト
+        :type axis_vector: np.ndarray
+        :param axis_vector: 軸ベクトル
 
+        :rtype: Obj3d
+        :return: 回転後のObj3dオブジェクトのコピー
         """
-        ext = os.path.splitext(file_path)[1]
 
-        if ext == ".obj":
-            obj3d = Obj3d.__load_obj(file_path)
-        elif ext == ".off":
-            obj3d = Obj3d.__load_off(file_path)
-        else:
-            raise IOError(
-                "Obj3d::__init__() : failed to load {}.".format(file_path))
+        r_mtr = Obj3d.rotation_matrix(theta, axis_vector)
 
-        return obj3d
+        scale, rotation, translation = self.__affine()
+        center = self.__centroid()
+        return self.__transformed(scale, np.dot(r_mtr, rotation),
+                                  np.dot(r_mtr, translation - center) + center)
 
     @staticmethod
-    def __load_off(off_file_path):
+    def load(file_path, mesh_cache=None):
         """
 
-        .off形式のファイルを読み込み、頂点座標のみを取得
+        ファイルパスの拡張子を識別してファイル読み込みを行い、Obj3dオブジェクトを返す
 
-        :type off_file_path: str
-        :param off_file_path: .offファイル名
+        :type file_path: str
+        :param file_path: ファイルパス
+
+        :type mesh_cache: MeshCache
+        :param mesh_cache: 読み込んだ配列のキャッシュ
+                           指定した場合、キャッシュが新しければ
+                           メモリマップした配列を返す
 
         :rtype: Obj3d
-        :return: .offファイル読み込みによって生成されたObj3dオブジェクト
+        :return: ファイル読み込みによって生成されたObj3dオブジェクト
 
         """
+        if mesh_cache is not None:
+            return mesh_cache.load(file_path)
 
-        with open(off_file_path) as f:
-            # コメント・空行を除去
-            lines = filter(lambda x: x != '\n' and x[0] != "#",
-                           f.readlines())
-
-            # 一行目はファイルフォーマット名
-            if "OFF" not in lines.pop(0):
-                raise IOError("file must be \"off\" format file.")
-
-            # 頂点数、面数、辺数
-            n_vertices, n_faces, n_edges = map(int, lines.pop(0).split(' '))
-
-            # 頂点座標を取得
-            vertices = np.array([map(float, lines[i].strip().split(' '))
-                                 for i in xrange(n_vertices)])
+        ext = os.path.splitext(file_path)[1]
 
-            # 面を構成する頂点のインデックス
-            faces = np.array(
-                [map(int, lines[n_vertices + i].strip().split(' '))[1:]
-                 for i in xrange(n_faces)])
+        if ext not in Obj3d.EXTENSIONS:
+            raise IOError(
+                "Obj3d::__init__() : failed to load {}.".format(file_path))
 
-            return Obj3d(vertices, None, faces)
+        with open(file_path, 'rb') as f:
+            return Obj3d.read(f, ext)
 
     @staticmethod
-    def __load_obj(obj_file_path):
+    def read(f, ext):
         """
 
-        .objファイルを読み込み、頂点情報のみを取得
+        ファイルオブジェクトから、拡張子の形式に従って3Dモデルを読み込む
+        アーカイブ内のファイル等、ファイルパスを持たない内容の読み込みにも使う
+        多角形の面は三角形分割する
 
-        :type obj_file_path : str
-        :param obj_file_path: ファイルパス
+        :type f: file
+        :param f: 読み込むファイルオブジェクト(バイナリモード)
+
+        :type ext: str
+        :param ext: 形式を表す拡張子(.off, .obj, .ply, .stl)
 
         :rtype: Obj3d
-        :return: .objファイル読み込みによって生成されたObj3dオブジェクト
+        :return: 読み込んだ内容から生成されたObj3dオブジェクト
 
         """
+        if ext == ".obj":
+            vertices, normals, faces = parse_obj(f)
+        elif ext == ".off":
+            vertices, faces = parse_off(f)
+            normals = None
+        elif ext == ".ply":
+            vertices, normals, faces = parse_ply(f)
+        elif ext == ".stl":
+            vertices, normals, faces = parse_stl(f)
+        else:
+            raise NotImplementedError
 
-        with open(obj_file_path) as f:
-            lines = filter(lambda x: x != "\n" and x[0] != "#",
-                           [line.strip().split() for line in f.readlines()])
-
-            vertices = np.array(
-                [list(map(float, line[1:])) for line in lines if
-                 line[0] == 'v'])
-            normals = np.array(
-                [list(map(float, line[1:])) for line in lines if
-                 line[0] == 'vn'])
-            faces = np.array(
-                [list(map(lambda x: x - 1, map(int, line[1:]))) for line in
-                 lines if line[0] == 'f'])
-
-        return Obj3d(vertices, normals, faces)
+        # 読み込んだ配列は形状を確認済み
+        return Obj3d(vertices, normals, faces, is_assertion_enabled=False)
 
     def save(self, file_path):
         """
@@ -349,6 +454,10 @@ class Obj3d(object):
             self._save_obj(file_path)
         elif ext == ".off":
             self._save_off(file_path)
+        elif ext == ".ply":
+            self._save_ply(file_path)
+        elif ext == ".stl":
+            self._save_stl(file_path)
         else:
             raise NotImplementedError
 
@@ -366,26 +475,7 @@ class Obj3d(object):
             off_file_path = name + ".off"
 
         with open(off_file_path, "w") as f:
-            # OFFファイル先頭行
-            f.write("OFF\n")
-            # 頂点数 面数 法線数
-            len_vertices = len(self.vertices)
-            len_fv = 0 if self.face_vertices is None else len(
-                self.face_vertices)
-            len_nv = 0 if self.normal_vertices is None else len(
-                self.face_vertices)
-            f.write("{0} {1} {2}\n\n".format(len_vertices, len_fv, len_nv))
-
-            # 頂点情報
-            for x, y, z in self.vertices:
-                f.write("{0} {1} {2}\n".format(x, y, z))
-
-            # 面情報
-            if self.face_vertices is not None:
-                for p1, p2, p3 in self.face_vertices:
-                    f.write("3  {0} {1} {2}\n".format(p1, p2, p3))
-
-                    # 法線情報(NotImplemented)
+            write_off(f, self.vertices, self.face_vertices)
 
     def _save_obj(self, obj_file_path):
         """
@@ -401,21 +491,38 @@ class Obj3d(object):
             obj_file_path = name + ".obj"
 
         with open(obj_file_path, "w") as f:
-            # OBJファイル先頭行コメント
-            f.write("# OBJ file format with ext .obj\n")
-            f.write("# vertex count = {}\n".format(len(self.vertices)))
+            write_obj(f, self.vertices, self.normal_vertices,
+                      self.face_vertices)
+
+    def _save_ply(self, ply_file_path):
+        """
 
-            if self.face_vertices is not None:
-                f.write("# face count = {}\n".format(len(self.face_vertices)))
+        Obj3dオブジェクトの内容をバイナリ形式の.ply形式で保存
 
-            # 頂点情報
-            for x, y, z in self.vertices:
-                f.write("v {0} {1} {2}\n".format(x, y, z))
+        :type ply_file_path: str
+        :param ply_file_path: .plyファイルパス
 
-            # 面情報
-            # objファイルの面情報インデックスは１始まりなので、+1する
-            if self.face_vertices is not None:
-                for p1, p2, p3 in self.face_vertices:
-                    f.write("f {0} {1} {2}\n".format(p1 + 1, p2 + 1, p3 + 1))
+        """
+        name, ext = os.path.splitext(ply_file_path)
+        if ext != ".ply" or ext == "":
+            ply_file_path = name + ".ply"
+
+        with open(ply_file_path, "wb") as f:
+            write_ply(f, self.vertices, self.normal_vertices,
+                      self.face_vertices)
+
+    def _save_stl(self, stl_file_path):
+        """
+
+        Obj3dオブジェクトの内容をバイナリ形式の.stl形式で保存
+
+        :type stl_file_path: str
+        :param stl_file_path: .stlファイルパス
+
+        """
+        name, ext = os.path.splitext(stl_file_path)
+        if ext != ".stl" or ext == "":
+            stl_file_path = name + ".stl"
 
-                    # 法線情報(NotImplemented)
+        with open(stl_file_path, "wb") as f:
+            write_stl(f, self.vertices, self.face_vertices)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+
+
+class TriangleArrays(object):
+    """
+
+    3Dモデルの三角形面を、頂点・辺ベクトルごとの配列(structure of arrays)
+    として保持するクラス
+    Obj3d.triangle_arrays()でObj3dごとに一度だけ生成し、全てのレイ投射で共有する
+
+    """
+
+    def __init__(self, vertices, face_vertices):
+        """
+
+        :type vertices: np.ndarray
+        :param vertices: 全頂点座標 shape=(n_vertex, 3)
+
+        :type face_vertices: np.ndarray
+        :param face_vertices: 各三角形を構成する頂点インデックス shape=(n_face, 3)
+
+        """
+        vertices = np.asarray(vertices, dtype=np.float64)
+        face_vertices = np.asarray(face_vertices)
+        assert face_vertices.ndim == 2 and face_vertices.shape[1] == 3
+
+        # 三角形の頂点
+        self.v0 = TriangleArrays.__as_immutable_array(
+            vertices[face_vertices[:, 0]])
+        self.v1 = TriangleArrays.__as_immutable_array(
+            vertices[face_vertices[:, 1]])
+        self.v2 = TriangleArrays.__as_immutable_array(
+            vertices[face_vertices[:, 2]])
+
+        # 辺ベクトル
+        self.edge1 = TriangleArrays.__as_immutable_array(self.v1 - self.v0)
+        self.edge2 = TriangleArrays.__as_immutable_array(self.v2 - self.v0)
+
+        # 必要になった時点で計算する
+        self.__bounds = None
+        self.__normals = None
+        self.__bounding_spheres = None
+
+    @staticmethod
+    def __as_immutable_array(array):
+        """
+
+        連続したImmutableなnumpy配列を返す
+
+        :type array: np.ndarray
+        :param array: 入力配列
+
+        :rtype: np.ndarray
+        :return: Immutableなnumpy配列
+
+        """
+        array = np.ascontiguousarray(array)
+        array.flags.writeable = False
+        return array
+
+    def __len__(self):
+        """
+
+        :rtype: int
+        :return: 三角形の数
+
+        """
+        return len(self.v0)
+
+    def bounds(self):
+        """
+
+        各三角形の軸平行境界ボックスを返す
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 最小座標 shape=(n_face, 3), 最大座標 shape=(n_face, 3)
+
+        """
+        if self.__bounds is None:
+            self.__bounds = (
+                TriangleArrays.__as_immutable_array(
+                    np.minimum(np.minimum(self.v0, self.v1), self.v2)),
+                TriangleArrays.__as_immutable_array(
+                    np.maximum(np.maximum(self.v0, self.v1), self.v2)))
+        return self.__bounds
+
+    def bounding_spheres(self):
+        """
+
+        各三角形の重心を中心とし、全頂点を含む球を返す
+
+        :rtype: (np.ndarray, np.ndarray)
+        :return: 中心 shape=(n_face, 3), 半径 shape=(n_face,)
+
+        """
+        if self.__bounding_spheres is None:
+            centers = (self.v0 + self.v1 + self.v2) / 3.
+            radii = np.sqrt(np.max([
+                np.einsum('ij,ij->i', v - centers, v - centers)
+                for v in (self.v0, self.v1, self.v2)], axis=0))
+            self.__bounding_spheres = (
+                TriangleArrays.__as_immutable_array(centers),
+                TriangleArrays.__as_immutable_array(radii))
+        return self.__bounding_spheres
+
+    def normals(self):
+        """
+
+        各三角形の法線ベクトル edge1 x edge2 を返す
+        正規化はせず、長さは三角形の面積の2倍
+
+        :rtype: np.ndarray
+        :return: 法線ベクトル shape=(n_face, 3)
+
+        """
+        if self.__normals is None:
+            self.__normals = TriangleArrays.__as_immutable_array(
+                np.cross(self.edge1, self.edge2))
+        return self.__normals
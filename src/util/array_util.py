@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+
+
+def concatenate_ranges(starts, counts):
+    """
+
+    複数の連続区間 [starts[i], starts[i] + counts[i]) を連結したインデックス配列を返す
+    np.concatenate([np.arange(s, s + c) for s, c in zip(starts, counts)])と同じ
+
+    :type starts: np.ndarray
+    :param starts: 各区間の先頭インデックス
+
+    :type counts: np.ndarray
+    :param counts: 各区間の要素数
+
+    :rtype: np.ndarray
+    :return: 連結したインデックス配列
+
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(counts.sum())
@@ -5,15 +5,13 @@ import unittest
 
 import numpy as np
 
-from src.obj.grid.icosahedron_grid import IcosahedronGrid, IcosahedronFace
+from src.obj.grid.base_grid import BaseFace
+from src.obj.grid.icosahedron_grid import IcosahedronGrid
 
 
 class TestGrid3d(unittest.TestCase):
     def setUp(self):
-        self.vertices = [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
-        self.grid_faces = [[0, 1, 2]]
-
-        self.grid_path = "../res/new_regular_ico.grd"
+        self.grid_path = "../res/axis_regular_ico.grd"
 
         self.n_div = 2
 
@@ -23,11 +21,13 @@ class TestGrid3d(unittest.TestCase):
         pass
 
     def test_init(self):
+        grid3d = IcosahedronGrid.load(self.grid_path)
         # list
-        IcosahedronGrid(self.vertices, self.grid_faces, n_div=1)
+        IcosahedronGrid(grid3d.vertices.tolist(), grid3d.grid_faces_as_copy(),
+                        1, grid3d.upper_direction)
         # numpy
-        IcosahedronGrid(np.array(self.vertices), np.array(self.grid_faces),
-                        n_div=1)
+        IcosahedronGrid(grid3d.vertices, grid3d.grid_faces_as_copy(), 1,
+                        grid3d.upper_direction)
 
     def test_load(self):
         grid3d = IcosahedronGrid.load(self.grid_path)
@@ -62,15 +62,147 @@ class TestGrid3d(unittest.TestCase):
         assert_n_vertices(grid3d_div4, [5, 2, 1])
         self.assertEqual(len(grid3d_div4.vertices), 162)
 
+    def test_divide_face_counts(self):
+        grid3d = IcosahedronGrid.load(self.grid_path)
+
+        for n_div in (1, 2, 3, 5, 8, 16):
+            divided = grid3d.divide_face(n_div)
+            self.assertEqual(len(divided.vertices), 10 * n_div * n_div + 2)
+            self.assertEqual(divided.vertex_table.tables.shape,
+                             (20, n_div + 1, n_div + 1))
+
+            # 隣接する面は、共有する辺上のn_div + 1個の頂点を共有する
+            face_vertices = dict(
+                (face.face_id, set(face.vertex_table.tables[
+                    face.table_index][face.vertex_table.tables[
+                        face.table_index] >= 0].tolist()))
+                for face in divided.grid_faces)
+            for face in divided.grid_faces:
+                for adjacent_id in (face.left_face_id, face.right_face_id,
+                                    face.bottom_face_id):
+                    self.assertEqual(len(face_vertices[face.face_id] &
+                                         face_vertices[adjacent_id]),
+                                     n_div + 1)
+
+    def test_divide_face_baseline(self):
+        grid3d = IcosahedronGrid.load(self.grid_path).center().scale(2.)
+
+        for n_div in (1, 2, 3, 5, 8):
+            divided = grid3d.divide_face(n_div)
+
+            # 面ごとに頂点座標を求め、許容誤差内で等しい頂点をまとめた
+            # 従来の分割方法と、頂点の対応が一対一で座標が等しい
+            reference_vertices = np.empty(shape=(0, 3))
+            reference_ids = {}
+            for face in grid3d.grid_faces:
+                top = grid3d.vertices[face.top_vertex_idx()]
+                left = grid3d.vertices[face.left_vertex_idx()] - top
+                right = grid3d.vertices[face.right_vertex_idx()] - top
+                for alpha in xrange(n_div + 1):
+                    for beta in xrange(n_div + 1 - alpha):
+                        vertex = top + left * float(alpha) / n_div + \
+                                 right * float(beta) / n_div
+                        is_duplicate = (np.abs(vertex - reference_vertices) <
+                                        1e-9).all(axis=1)
+                        if is_duplicate.any():
+                            i = int(np.flatnonzero(is_duplicate)[0])
+                        else:
+                            i = len(reference_vertices)
+                            reference_vertices = np.vstack(
+                                (reference_vertices, vertex))
+                        reference_ids[face.face_id, alpha, beta] = i
+
+            self.assertEqual(len(divided.vertices), len(reference_vertices))
+            mapping = {}
+            for face in divided.grid_faces:
+                for alpha in xrange(n_div + 1):
+                    for beta in xrange(n_div + 1 - alpha):
+                        vertex_idx = face.get_vertex_idx(alpha, beta)
+                        reference_id = reference_ids[face.face_id, alpha,
+                                                     beta]
+                        self.assertEqual(
+                            mapping.setdefault(vertex_idx, reference_id),
+                            reference_id)
+                        np.testing.assert_allclose(
+                            divided.vertices[vertex_idx],
+                            reference_vertices[reference_id], atol=1e-9)
+            self.assertEqual(len(set(mapping.values())), len(mapping))
+
+    def test_vertex_table(self):
+        grid3d = IcosahedronGrid.load(self.grid_path).divide_face(4)
+        vertex_table = grid3d.vertex_table
+
+        self.assertEqual(vertex_table.tables.shape, (20, 5, 5))
+        self.assertEqual(vertex_table.tables.dtype, np.int32)
+        self.assertFalse(vertex_table.tables.flags.writeable)
+
+        # 各面は一つの表を共有し、面のコピーも表をコピーしない
+        for i, grid_face in enumerate(grid3d.grid_faces):
+            self.assertIs(grid_face.vertex_table, vertex_table)
+            self.assertEqual(grid_face.top_vertex_idx(),
+                             vertex_table.tables[i, 0, 0])
+        grid3d_div1 = IcosahedronGrid.load(self.grid_path)
+        for grid_face in grid3d_div1.grid_faces_as_copy():
+            self.assertIs(grid_face.vertex_table, grid3d_div1.vertex_table)
+
+        # 頂点インデックスから全ての面での座標を逆引きできる
+        for face_index, alpha, beta in vertex_table.locations(0):
+            self.assertEqual(vertex_table.tables[face_index, alpha, beta], 0)
+        self.assertEqual(len(vertex_table.locations(0)), 5)
+
+        self.assertRaises(KeyError, grid3d.grid_faces[0].get_vertex_idx, 4, 1)
+
+        # 呼び出し元の面は変更せず、グリッドの面は頂点インデックスを登録できない
+        faces = grid3d_div1.grid_faces_as_copy()
+        faces[0].set_vertex_idx(11, 0, 0)
+        tables = faces[0].vertex_table.tables
+        grid3d_copy = IcosahedronGrid(grid3d_div1.vertices, faces, 1,
+                                      grid3d_div1.upper_direction)
+        self.assertIs(faces[0].vertex_table.tables, tables)
+        self.assertEqual(faces[0].table_index, 0)
+        self.assertIsNot(grid3d_copy.grid_faces[0], faces[0])
+        self.assertEqual(grid3d_copy.vertex_table.tables[0, 0, 0], 11)
+        self.assertRaises(ValueError, grid3d_copy.grid_faces[0].set_vertex_idx,
+                          0, 0, 0)
+        self.assertEqual(grid3d_copy.grid_faces[0].top_vertex_idx(), 11)
+
     def test_find_face_from_id(self):
         grid3d = IcosahedronGrid.load(self.grid_path)
         for i in xrange(20):
             self.assertEqual(grid3d.find_face_from_id(i).face_id, i)
 
+    def test_topology(self):
+        grid3d = IcosahedronGrid.load(self.grid_path)
+        transformed = grid3d.center().scale(2.).rotate(0.5, [0., 0., 1.])
+
+        # 座標変換したグリッドは面の集合を共有する
+        self.assertIs(transformed.topology, grid3d.topology)
+        self.assertIs(transformed.grid_faces, grid3d.grid_faces)
+        self.assertIs(transformed.find_face_from_id(3),
+                      grid3d.find_face_from_id(3))
+        self.assertRaises(IndexError, grid3d.find_face_from_id, 20)
+
+        # 面分割したグリッドは新しい面の集合を持ち、同じ面IDで引ける
+        divided = grid3d.divide_face(3)
+        self.assertIsNot(divided.topology, grid3d.topology)
+        self.assertEqual(len(divided.topology), 20)
+        for i in xrange(20):
+            self.assertEqual(divided.find_face_from_id(i).face_id, i)
+            self.assertEqual(divided.find_face_from_id(i).n_div, 3)
+
+        # 走査順は面の集合ごとに一度だけ求める
+        plan = divided.traversal_plan(BaseFace.UNI_SCAN_DIRECTION.HORIZON)
+        self.assertIs(divided.traversal_plan(
+            BaseFace.UNI_SCAN_DIRECTION.HORIZON), plan)
+        self.assertIs(divided.topology.traversal_plans[
+            BaseFace.UNI_SCAN_DIRECTION.HORIZON], plan)
+
     def test_traverse(self):
         grid3d = IcosahedronGrid.load(self.grid_path)
+        traversed = grid3d.traverse(BaseFace.UNI_SCAN_DIRECTION.HORIZON)
+        self.assertEqual(len(traversed), 20)
         if self.is_print_enabled:
-            print grid3d.traverse(IcosahedronFace.DIRECTION.HORIZON)
+            print traversed
 
 
 if __name__ == '__main__':
@@ -1,10 +1,17 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import os
+import shutil
+import tarfile
+import tempfile
 import unittest
+import zipfile
 
 import numpy as np
 
+from src.obj.mesh_archive import MeshArchive
+from src.obj.mesh_cache import MeshCache
 from src.obj.obj3d import Obj3d
 
 
@@ -33,6 +40,20 @@ class _TestObj3d(unittest.TestCase):
 
         obj3d_npy = Obj3d(vertices, normal_vertices, face_vertices)
 
+    def test_check_array(self):
+        # Numpy配列はコピーせずに保持する
+        vertices = np.array(self.vertices, dtype=np.float64)
+        obj3d = Obj3d(vertices, None, None)
+        self.assertTrue(np.shares_memory(obj3d.vertices, vertices))
+
+        for invalid in ([[1, 2], [3, 4]], [[1, 2, 3], [4, 5]],
+                        np.zeros(shape=(2, 4)), np.zeros(shape=(2, 3, 1)),
+                        np.array([["a", "b", "c"]])):
+            self.assertRaises(AssertionError, Obj3d, invalid)
+
+        # アサーションチェックを無効にした場合は検査しない
+        Obj3d(np.zeros(shape=(2, 4)), is_assertion_enabled=False)
+
     def test_arrays_as_copy(self):
         obj3d = Obj3d(self.vertices, self.normal_vertices, self.face_vertices)
 
@@ -46,6 +67,21 @@ class _TestObj3d(unittest.TestCase):
         self.assertNotEqual(id(self.face_vertices),
                             id(obj3d.faces_as_copy()))
 
+    def test_triangle_arrays(self):
+        obj3d = Obj3d(self.vertices, self.normal_vertices, self.face_vertices)
+        triangles = obj3d.triangle_arrays()
+
+        # 二回目以降は同じオブジェクトを返す
+        self.assertIs(triangles, obj3d.triangle_arrays())
+
+        np.testing.assert_array_equal(triangles.v0, [[1, 2, 3]])
+        np.testing.assert_array_equal(triangles.edge1, [[3, 3, 3]])
+        np.testing.assert_array_equal(triangles.edge2, [[6, 6, 6]])
+        np.testing.assert_array_equal(triangles.bounds()[0], [[1, 2, 3]])
+        np.testing.assert_array_equal(triangles.bounds()[1], [[7, 8, 9]])
+        np.testing.assert_array_equal(triangles.normals(), [[0, 0, 0]])
+        self.assertFalse(triangles.edge1.flags.writeable)
+
     def test_center(self):
         obj3d = Obj3d(self.vertices, self.normal_vertices, self.face_vertices)
 
@@ -89,10 +125,181 @@ class _TestObj3d(unittest.TestCase):
             (after_vertices - epsilon < before_vertices * self.scale).all() and
             (before_vertices * self.scale < after_vertices + epsilon).all())
 
+    def test_transform_chain(self):
+        obj3d = Obj3d(self.vertices, self.normal_vertices, self.face_vertices)
+        transformed = obj3d.center().scale(self.scale).rotate(
+            0.5, [0., 0., 1.]).normal()
+
+        # 各変換を順に頂点座標へ適用した場合と同じになる
+        vertices = np.array(self.vertices, dtype=float)
+        vertices = (vertices - vertices.mean(axis=0)) * self.scale
+        vertices = np.dot(vertices, Obj3d.rotation_matrix(
+            0.5, [0., 0., 1.]).T)
+        vertices /= np.linalg.norm(vertices, axis=1).max()
+
+        np.testing.assert_allclose(transformed.vertices, vertices,
+                                   atol=1e-12)
+        self.assertIs(transformed.face_vertices, obj3d.face_vertices)
+        self.assertFalse(transformed.vertices.flags.writeable)
+
     def test_load(self):
         obj3d_off = Obj3d.load(self.load_path_off)
         obj3d_obj = Obj3d.load(self.load_path_obj)
 
+    def test_load_polygons(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            off_path = os.path.join(tmp_dir, "polygons.off")
+            with open(off_path, "w") as f:
+                f.write("OFF\n# comment\n5 2 0\n0 0 0\n1 0 0\n1 1 0\n"
+                        "0 1 0\n0.5 0.5 1\n4 0 1 2 3\n3 0 1 4\n")
+            obj_path = os.path.join(tmp_dir, "polygons.obj")
+            with open(obj_path, "w") as f:
+                f.write("v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\nv 0.5 0.5 1\n"
+                        "vn 0 0 1\nf 1//1 2//1 3//1 4//1\nf -5 -4 -1\n")
+
+            # 多角形は扇形に三角形分割する
+            for obj3d in (Obj3d.load(off_path), Obj3d.load(obj_path)):
+                self.assertEqual(obj3d.vertices.shape, (5, 3))
+                self.assertEqual(obj3d.face_vertices.dtype, np.int32)
+                self.assertEqual(obj3d.face_vertices.tolist(),
+                                 [[0, 1, 2], [0, 2, 3], [0, 1, 4]])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_load_indented(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            obj_path = os.path.join(tmp_dir, "indented.obj")
+            with open(obj_path, "w") as f:
+                f.write("v 0 0 0\n  v 9 9 9\n\tv 1 0 0\nv 1 1 0\n\n"
+                        "  \nv 0 1 0\n  vn 0 0 1\n f 1 3 4\n\t f 1 4 5\n")
+
+            # 字下げした行も行頭の空白を飛ばしてキーワードを判定する
+            obj3d = Obj3d.load(obj_path)
+            self.assertEqual(obj3d.vertices.tolist(),
+                             [[0, 0, 0], [9, 9, 9], [1, 0, 0], [1, 1, 0],
+                              [0, 1, 0]])
+            self.assertEqual(obj3d.normal_vertices.tolist(), [[0, 0, 1]])
+            self.assertEqual(obj3d.face_vertices.tolist(),
+                             [[0, 2, 3], [0, 3, 4]])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_save_formats(self):
+        vertices = np.array([[0., 0., 0.], [1., 0., 0.], [0., 1., 0.],
+                             [0.5, 0.5, 1. / 3.]])
+        faces = np.array([[0, 1, 2], [0, 1, 3], [1, 2, 3]])
+        obj3d = Obj3d(vertices, None, faces)
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for ext in (".off", ".obj", ".ply", ".stl"):
+                path = os.path.join(tmp_dir, "saved" + ext)
+                obj3d.save(path)
+                loaded = Obj3d.load(path)
+
+                # .stlは頂点を三角形ごとに単精度で保存する
+                np.testing.assert_allclose(
+                    loaded.vertices[loaded.face_vertices], vertices[faces],
+                    atol=1e-6 if ext == ".stl" else 0.)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_load_stl_padded(self):
+        vertices = np.array([[0., 0., 0.], [1., 0., 0.], [0., 1., 0.],
+                             [0.5, 0.5, 1.]])
+        faces = np.array([[0, 1, 2], [0, 1, 3], [1, 2, 3]])
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "padded.stl")
+            Obj3d(vertices, None, faces).save(path)
+            with open(path, "rb") as f:
+                data = f.read()
+            # ヘッダが"solid"で始まり、末尾に余分なバイトを持つバイナリ形式
+            with open(path, "wb") as f:
+                f.write("solid exported".ljust(80) + data[80:] + "\0" * 16)
+
+            loaded = Obj3d.load(path)
+            np.testing.assert_allclose(
+                loaded.vertices[loaded.face_vertices], vertices[faces])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_mesh_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            off_path = os.path.join(tmp_dir, "triangle.off")
+            with open(off_path, "w") as f:
+                f.write("OFF\n3 1 0\n0 0 0\n1 0 0\n0 1 0\n3 0 1 2\n")
+
+            for mesh_cache in (MeshCache(os.path.join(tmp_dir, "cache")),
+                               MeshCache(unicode(os.path.join(tmp_dir,
+                                                              "ucache"))),
+                               MeshCache()):
+                expected = Obj3d.load(off_path)
+                self.assertNotIsInstance(
+                    Obj3d.load(off_path, mesh_cache).vertices.base, np.memmap)
+
+                # 二回目以降はキャッシュをメモリマップして読み込む
+                obj3d = Obj3d.load(off_path, mesh_cache)
+                self.assertIsInstance(obj3d.vertices.base, np.memmap)
+                np.testing.assert_array_equal(obj3d.vertices,
+                                              expected.vertices)
+                np.testing.assert_array_equal(obj3d.face_vertices,
+                                              expected.face_vertices)
+                self.assertIsNone(obj3d.normal_vertices)
+                self.assertTrue(os.path.isdir(mesh_cache.path(off_path)))
+
+            # 元のファイルが変更された場合は読み込み直す
+            with open(off_path, "w") as f:
+                f.write("OFF\n3 1 0\n0 0 0\n2.5 0 0\n0 2.5 0\n3 0 1 2\n")
+            obj3d = Obj3d.load(off_path, MeshCache())
+            self.assertEqual(obj3d.vertices.max(), 2.5)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_mesh_archive(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            members = []
+            for i in range(3):
+                path = os.path.join(tmp_dir, "m{}.off".format(i))
+                with open(path, "w") as f:
+                    f.write("OFF\n3 1 0\n0 0 0\n{} 0 0\n0 1 0\n"
+                            "3 0 1 2\n".format(i + 1))
+                members.append(path)
+            readme_path = os.path.join(tmp_dir, "readme.txt")
+            with open(readme_path, "w") as f:
+                f.write("not a mesh\n")
+
+            zip_path = os.path.join(tmp_dir, "models.zip")
+            with zipfile.ZipFile(zip_path, "w") as archive:
+                for path in members + [readme_path]:
+                    archive.write(path, os.path.basename(path))
+            tar_path = os.path.join(tmp_dir, "models.tar.gz")
+            with tarfile.open(tar_path, "w:gz") as archive:
+                for path in members + [readme_path]:
+                    archive.add(path, os.path.basename(path))
+
+            self.assertFalse(MeshArchive.is_archive(members[0]))
+            for archive_path in (zip_path, tar_path):
+                self.assertTrue(MeshArchive.is_archive(archive_path))
+
+                # 3Dモデル以外のメンバは読み飛ばす
+                loaded = list(MeshArchive(archive_path, read_ahead=1))
+                self.assertEqual([name for name, _ in loaded],
+                                 ["m0.off", "m1.off", "m2.off"])
+                for i, (_, obj3d) in enumerate(loaded):
+                    self.assertEqual(obj3d.vertices.max(), i + 1)
+
+                # 途中で読み込みを終えても、読み込み用のスレッドは止まる
+                for name, obj3d in MeshArchive(archive_path, read_ahead=1):
+                    break
+        finally:
+            shutil.rmtree(tmp_dir)
+
     def test_save(self):
         Obj3d.load(self.load_path_off).save(self.save_path_off)
         Obj3d.load(self.load_path_obj).save(self.save_path_obj)
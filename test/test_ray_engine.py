@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import unittest
+
+import numpy as np
+
+from src.obj.obj3d import Obj3d
+from src.map.ray.base_ray_engine import BaseRayEngine
+from src.map.ray.scalar_ray_engine import ScalarRayEngine
+from src.map.ray.batch_ray_engine import BatchRayEngine
+from src.map.ray.bvh_ray_engine import BvhRayEngine
+from src.map.ray.angular_bin_ray_engine import AngularBinRayEngine
+from src.map.ray.spherical_rasterizer import SphericalRasterizer
+from src.map.ray.parallel_ray_engine import ParallelRayEngine
+from src.map.ray.hierarchical_ray_engine import HierarchicalRayEngine
+from src.obj.grid.icosahedron_grid import IcosahedronGrid
+
+
+def create_sphere_obj3d(n_theta=8, n_phi=16):
+    """
+
+    テスト用の歪んだ球面メッシュを生成する
+
+    """
+    theta, phi = np.meshgrid(np.linspace(0.2, np.pi - 0.2, n_theta),
+                             np.linspace(0., 2. * np.pi, n_phi,
+                                         endpoint=False))
+    vertices = np.stack([np.sin(theta) * np.cos(phi) *
+                         (1. + 0.3 * np.cos(3. * phi)),
+                         np.sin(theta) * np.sin(phi),
+                         np.cos(theta) * 0.7], axis=-1).reshape(-1, 3)
+    faces = []
+    for i in xrange(n_phi):
+        for j in xrange(n_theta - 1):
+            a = i * n_theta + j
+            b = ((i + 1) % n_phi) * n_theta + j
+            faces += [[a, b, b + 1], [a, b + 1, a + 1]]
+    return Obj3d(vertices, None, faces)
+
+
+def create_cube_obj3d():
+    """
+
+    テスト用の大きな三角形からなる立方体メッシュを生成する
+
+    """
+    vertices = [[x, y, z] for x in (-.5, .6) for y in (-.7, .5)
+                for z in (-.5, .4)]
+    faces = [[0, 1, 3], [0, 3, 2], [4, 6, 7], [4, 7, 5], [0, 4, 5], [0, 5, 1],
+             [2, 3, 7], [2, 7, 6], [0, 2, 6], [0, 6, 4], [1, 5, 7], [1, 7, 3]]
+    return Obj3d(vertices, None, faces)
+
+
+def create_nested_obj3d():
+    """
+
+    テスト用の、外側の球面の内側に縮小した球面を持つメッシュを生成する
+    ファイル順では外側の面が先に並ぶ
+
+    """
+    outer = create_sphere_obj3d()
+    vertices = np.vstack((outer.vertices, outer.vertices * 0.5))
+    faces = np.vstack((outer.face_vertices,
+                       outer.face_vertices + len(outer.vertices)))
+    return Obj3d(vertices, None, faces)
+
+
+class TestRayEngine(unittest.TestCase):
+    def setUp(self):
+        self.obj3d = create_sphere_obj3d()
+
+        # 全方向に向かうレイの終点
+        rng = np.random.RandomState(0)
+        ends = rng.normal(size=(200, 3))
+        self.ends = 3. * ends / np.linalg.norm(ends, axis=1)[:, np.newaxis]
+
+        self.grid_path = "../res/axis_regular_ico.grd"
+
+    def tearDown(self):
+        pass
+
+    def test_batch_distances(self):
+        expected = ScalarRayEngine(self.obj3d).distances(self.ends)
+
+        self.assertTrue((expected != BaseRayEngine.DIST_UNDEFINED).any())
+
+        for ray_block_size, face_block_size in ((256, 4096), (7, 13), (1, 1)):
+            engine = BatchRayEngine(self.obj3d,
+                                    ray_block_size=ray_block_size,
+                                    face_block_size=face_block_size)
+            np.testing.assert_allclose(engine.distances(self.ends), expected,
+                                       atol=1e-12)
+
+    def test_batch_distances_with_origin(self):
+        origin = np.array([0.1, -0.05, 0.02])
+        expected = ScalarRayEngine(self.obj3d).distances(self.ends, origin)
+        result = BatchRayEngine(self.obj3d).distances(self.ends, origin)
+        np.testing.assert_allclose(result, expected, atol=1e-12)
+
+    def test_bvh_distances(self):
+        expected = BatchRayEngine(self.obj3d).distances(self.ends)
+
+        for leaf_size in (1, 4, 1000):
+            engine = BvhRayEngine(self.obj3d, leaf_size=leaf_size,
+                                  ray_block_size=64)
+            np.testing.assert_allclose(engine.distances(self.ends), expected,
+                                       atol=1e-12)
+
+        # 軸に平行なレイ
+        axis_ends = np.vstack((np.eye(3), -np.eye(3))) * 3.
+        np.testing.assert_allclose(
+            BvhRayEngine(self.obj3d).distances(axis_ends),
+            BatchRayEngine(self.obj3d).distances(axis_ends), atol=1e-12)
+
+    def test_bvh_structure(self):
+        engine = BvhRayEngine(self.obj3d, leaf_size=4)
+        bvh = engine.bvh
+
+        # 全ての三角形がちょうど一度ずつ葉に属する
+        self.assertEqual(sorted(bvh.triangle_indices),
+                         range(len(self.obj3d.face_vertices)))
+        is_leaf = bvh.node_left == bvh.LEAF
+        self.assertEqual(bvh.node_count[is_leaf].sum(),
+                         len(self.obj3d.face_vertices))
+        self.assertTrue((bvh.node_count[is_leaf] <= 4).all())
+
+        # 子ノードのAABBは親ノードのAABBに含まれる
+        parents = np.flatnonzero(~is_leaf)
+        for child in (bvh.node_left[parents], bvh.node_left[parents] + 1):
+            self.assertTrue(
+                (bvh.node_min[child] >= bvh.node_min[parents]).all())
+            self.assertTrue(
+                (bvh.node_max[child] <= bvh.node_max[parents]).all())
+
+    def test_angular_bin_distances(self):
+        grid = IcosahedronGrid.load(self.grid_path).center().scale(
+            3.).divide_face(4)
+        ends = np.vstack((self.ends, grid.vertices))
+
+        for obj3d in (self.obj3d, create_cube_obj3d()):
+            expected = BatchRayEngine(obj3d).distances(ends)
+            for n_bin_div in (None, 1, 3, 16):
+                engine = AngularBinRayEngine(obj3d, grid, n_bin_div)
+                np.testing.assert_allclose(engine.distances(ends), expected,
+                                           atol=1e-12)
+
+    def test_angular_bin_origin(self):
+        grid = IcosahedronGrid.load(self.grid_path).center().divide_face(1)
+        engine = AngularBinRayEngine(self.obj3d, grid)
+        with self.assertRaises(NotImplementedError):
+            engine.distances(self.ends, np.array([0.1, 0., 0.]))
+
+    def test_spherical_rasterizer_distances(self):
+        for n_div in (1, 3, 8):
+            grid = IcosahedronGrid.load(self.grid_path).center().scale(
+                3.).divide_face(n_div)
+
+            for obj3d in (self.obj3d, create_cube_obj3d()):
+                expected = BatchRayEngine(obj3d).distances(grid.vertices)
+                for face_block_size in (65536, 5):
+                    engine = SphericalRasterizer(obj3d, grid, face_block_size)
+                    np.testing.assert_allclose(
+                        engine.distances(grid.vertices), expected, atol=1e-12)
+
+        with self.assertRaises(NotImplementedError):
+            engine.distances(self.ends)
+        # 頂点数が同じでもグリッド頂点以外へのレイは投射できない
+        with self.assertRaises(NotImplementedError):
+            engine.distances(grid.vertices[::-1])
+
+    def test_hit_modes(self):
+        grid = IcosahedronGrid.load(self.grid_path).center().scale(
+            3.).divide_face(4)
+        obj3d = create_nested_obj3d()
+        modes = BaseRayEngine.HIT_MODE
+
+        engines = [BatchRayEngine(obj3d, ray_block_size=7, face_block_size=13),
+                   BvhRayEngine(obj3d, leaf_size=4),
+                   AngularBinRayEngine(obj3d, grid, 3),
+                   SphericalRasterizer(obj3d, grid, 5),
+                   HierarchicalRayEngine(obj3d, grid)]
+
+        expected = BatchRayEngine(obj3d).distances(grid.vertices, None,
+                                                   modes.ALL)
+        counts = expected.counts()
+        self.assertTrue((counts == 2).any())
+        self.assertEqual(len(expected.distances), counts.sum())
+
+        nearest = expected.layer(0)
+        farthest = expected.layer(-1)
+        is_hit = counts > 0
+        self.assertTrue((nearest[is_hit] < farthest[is_hit]).any())
+
+        # FIRSTはファイル順で先に並ぶ外側の面
+        np.testing.assert_allclose(
+            BatchRayEngine(obj3d).distances(grid.vertices)[is_hit],
+            farthest[is_hit], atol=1e-12)
+
+        for engine in engines:
+            np.testing.assert_allclose(
+                engine.distances(grid.vertices, None, modes.NEAREST),
+                nearest, atol=1e-12)
+            np.testing.assert_allclose(
+                engine.distances(grid.vertices, None, modes.FARTHEST),
+                farthest, atol=1e-12)
+
+            hits = engine.distances(grid.vertices, None, modes.ALL)
+            np.testing.assert_array_equal(hits.offsets, expected.offsets)
+            np.testing.assert_allclose(hits.distances, expected.distances,
+                                       atol=1e-12)
+
+        with self.assertRaises(NotImplementedError):
+            ScalarRayEngine(obj3d).distances(self.ends, None, modes.NEAREST)
+
+    def test_hierarchical_distances(self):
+        for n_div, n_coarse_div in ((4, None), (6, 2), (6, 3), (8, 1)):
+            grid = IcosahedronGrid.load(self.grid_path).center().scale(
+                3.).divide_face(n_div)
+
+            for obj3d in (create_nested_obj3d(), create_cube_obj3d()):
+                expected = BatchRayEngine(obj3d).distances(grid.vertices)
+                engine = HierarchicalRayEngine(obj3d, grid, n_coarse_div)
+                np.testing.assert_allclose(engine.distances(grid.vertices),
+                                           expected, atol=1e-12)
+
+        # 三角形が少ない場合は全ての三角形と判定する
+        self.assertEqual(engine.n_fallback, (~engine.is_coarse).sum())
+
+        with self.assertRaises(NotImplementedError):
+            engine.distances(self.ends)
+        with self.assertRaises(NotImplementedError):
+            engine.distances(grid.vertices[::-1])
+
+    def test_parallel_distances(self):
+        grid = IcosahedronGrid.load(self.grid_path).center().scale(
+            3.).divide_face(4)
+        obj3d = create_nested_obj3d()
+        modes = BaseRayEngine.HIT_MODE
+
+        for engine_class, engine_args in ((BatchRayEngine, ()),
+                                          (AngularBinRayEngine, (grid,))):
+            engine = ParallelRayEngine(obj3d, engine_class, engine_args,
+                                       n_workers=2, chunk_size=17,
+                                       fixed_ends=grid.vertices)
+            # 固定の終点(共有メモリ)とそれ以外の終点(タスクごとに渡す)
+            for ends in (grid.vertices, grid.vertices[::-1]):
+                for hit_mode in (modes.FIRST, modes.NEAREST):
+                    np.testing.assert_allclose(
+                        engine.distances(ends, None, hit_mode),
+                        BatchRayEngine(obj3d).distances(ends, None,
+                                                        hit_mode),
+                        atol=1e-12)
+                # プロセスプールはdistances()をまたいで使い続ける
+                pool = engine.pool
+                self.assertIsNotNone(pool)
+            self.assertIs(engine.pool, pool)
+            engine.close()
+            self.assertIsNone(engine.pool)
+
+        # ワーカーで失敗した場合は残りのタスクを待たずにプールを止める
+        with self.assertRaises(NotImplementedError):
+            engine.distances(grid.vertices, np.array([0.1, 0., 0.]))
+        self.assertIsNone(engine.pool)
+
+        engine = ParallelRayEngine(obj3d, BatchRayEngine, n_workers=3)
+        hits = engine.distances(self.ends, None, modes.ALL)
+        expected = BatchRayEngine(obj3d).distances(self.ends, None, modes.ALL)
+        np.testing.assert_array_equal(hits.offsets, expected.offsets)
+        np.testing.assert_allclose(hits.distances, expected.distances,
+                                   atol=1e-12)
+        engine.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
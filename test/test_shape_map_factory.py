@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.obj.obj3d import Obj3d
+from src.obj.grid.base_grid import BaseFace
+from src.obj.grid.grid_cache import GridCache
+from src.obj.grid.icosahedron_grid import IcosahedronGrid
+from src.obj.grid.triangle_grid import TriangleGrid
+from src.map.factory.base_shape_map_factory import BaseShapeMapFactory
+from src.map.factory.uni_shape_map_factory import UniShapeMapFactory
+from src.map.factory.band_shape_map_factory import BandShapeMapFactory
+from src.map.base_shape_map import BaseShapeMap
+from src.map.distance_store import DistanceStore, DistanceStoreWriter
+from src.map.shape_map_container import ShapeMapContainer, \
+    ShapeMapContainerWriter
+from src.map.uni_shape_map import UniShapeMap
+from test_ray_engine import create_sphere_obj3d, create_cube_obj3d
+
+
+class TestShapeMapFactory(unittest.TestCase):
+    def setUp(self):
+        self.obj3d = create_sphere_obj3d()
+        self.grid = IcosahedronGrid.load("../res/axis_regular_ico.grd")
+
+        self.n_div = 4
+        self.cls = 0
+        self.grid_scale = 2.
+
+    def tearDown(self):
+        pass
+
+    def create_band_factory(self, obj3d, ray_engine_type=None):
+        return BandShapeMapFactory(0, obj3d, self.grid, self.n_div, self.cls,
+                                   self.grid_scale,
+                                   list(TriangleGrid.BAND_TYPE), 0,
+                                   ray_engine_type)
+
+    def test_rotated_distances(self):
+        parameters = ((0., [0., 0., 1.]), (0.3, [1., 2., 3.]),
+                      (2., [-1., 0., 0.5]))
+        rotations = [Obj3d.rotation_matrix(theta, axis)
+                     for theta, axis in parameters]
+
+        expected = [self.create_band_factory(
+            self.obj3d.rotate(theta, axis))._distances()
+                    for theta, axis in parameters]
+
+        # 3Dモデルを回転してから生成した場合と同じ距離になる
+        # グリッドの全頂点に限るエンジンは、回転が一つの場合も含めBATCHで投射する
+        for ray_engine_type in BaseShapeMapFactory.RAY_ENGINE_TYPE:
+            factory = self.create_band_factory(self.obj3d, ray_engine_type)
+            distances = factory.rotated_distances(rotations)
+            self.assertEqual(distances.shape,
+                             (len(rotations), len(factory.grid.vertices)))
+            np.testing.assert_allclose(distances, expected, atol=1e-9)
+            np.testing.assert_allclose(
+                factory.rotated_distances(rotations[1:2])[0], expected[1],
+                atol=1e-9)
+
+        factory = self.create_band_factory(self.obj3d)
+
+        band_maps = factory.create_rotated(rotations)
+        self.assertEqual(len(band_maps), len(rotations))
+        self.assertEqual(len(band_maps[0]), len(TriangleGrid.BAND_TYPE))
+
+    def test_worker_release(self):
+        rotations = [Obj3d.rotation_matrix(0.3, [1., 2., 3.])]
+        expected = self.create_band_factory(self.obj3d)._distances()
+
+        # withブロック外では、距離を求めるたびにワーカーを終了する
+        factory = BandShapeMapFactory(0, self.obj3d, self.grid, self.n_div,
+                                      self.cls, self.grid_scale,
+                                      list(TriangleGrid.BAND_TYPE), 0,
+                                      n_workers=2)
+        factory.create()
+        self.assertEqual(multiprocessing.active_children(), [])
+        factory.rotated_distances(rotations)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+        # withブロック内では同じワーカーを使い続け、ブロックを出る時に終了する
+        with factory:
+            np.testing.assert_allclose(factory._distances(), expected,
+                                       atol=1e-9)
+            pool = factory.ray_engine.pool
+            self.assertEqual(len(multiprocessing.active_children()), 2)
+            factory.create_symmetric()
+            self.assertIs(factory.ray_engine.pool, pool)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_symmetric_distances(self):
+        factory = self.create_band_factory(create_cube_obj3d())
+        rotations, distances = factory.symmetric_distances()
+
+        self.assertEqual(len(rotations), 60)
+        self.assertEqual(distances.shape, (60, len(factory.grid.vertices)))
+
+        # 回転した方向へレイを投射し直した場合と同じ距離になる
+        np.testing.assert_allclose(distances,
+                                   factory.rotated_distances(rotations),
+                                   atol=1e-6)
+
+        self.assertEqual(len(factory.create_symmetric()), 60)
+
+    def test_grid_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            expected = [shape_map.distance_map for shape_map in
+                        self.create_band_factory(self.obj3d).create()]
+
+            expected_class = type(self.grid.center().scale(
+                self.grid_scale).divide_face(self.n_div))
+
+            for grid_cache in (GridCache(cache_dir),
+                               GridCache(unicode(cache_dir))):
+                factory = BandShapeMapFactory(
+                    0, self.obj3d, self.grid, self.n_div, self.cls,
+                    self.grid_scale, list(TriangleGrid.BAND_TYPE), 0,
+                    grid_cache=grid_cache)
+                # 保存したグリッドをメモリマップして読み込む
+                self.assertIsInstance(factory.grid.vertices.base, np.memmap)
+                # キャッシュの有無によらず、同じクラスのグリッドを返す
+                self.assertIs(type(factory.grid), expected_class)
+                self.assertEqual([shape_map.distance_map for shape_map in
+                                  factory.create()], expected)
+
+                # 同じキャッシュからは同じグリッドを返す
+                self.assertIs(grid_cache.prepare(self.grid, self.n_div,
+                                                 self.grid_scale),
+                              factory.grid)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_uni_create(self):
+        factory = UniShapeMapFactory(
+            3, self.obj3d, self.grid, self.n_div, self.cls, self.grid_scale,
+            [BaseFace.UNI_SCAN_DIRECTION.HORIZON])
+        shape_maps = factory.create()
+
+        self.assertEqual(len(shape_maps), self.grid.n_face)
+        self.assertEqual(shape_maps[0].model_id, 3)
+
+    def test_traversal_plan(self):
+        directions = list(BaseFace.UNI_SCAN_DIRECTION)
+        factory = UniShapeMapFactory(
+            0, self.obj3d, self.grid, self.n_div, self.cls, self.grid_scale,
+            directions)
+        distances = factory._distances()
+        shape_maps = factory.create()
+        self.assertEqual(len(shape_maps), len(directions) * self.grid.n_face)
+
+        # 各面を個別に走査した場合と同じマップになる
+        for shape_map in shape_maps:
+            grid_face = factory.grid.find_face_from_id(shape_map.face_id)
+            expected = [[distances[idx] for idx in row] for row in
+                        grid_face.traverse(shape_map.traverse_direction)]
+            self.assertEqual(shape_map.distance_map, expected)
+
+        # 走査順は方向ごとに一度だけ求める
+        self.assertIs(factory.grid.traversal_plan(directions[0]),
+                      factory.grid.traversal_plan(directions[0]))
+
+    def test_save(self):
+        uni_map = UniShapeMapFactory(
+            3, self.obj3d, self.grid, self.n_div, self.cls, self.grid_scale,
+            [BaseFace.UNI_SCAN_DIRECTION.HORIZON]).create()[0]
+        band_map = self.create_band_factory(self.obj3d).create()[0]
+        headers = ("#SHP\n#ID\n3\n#CLASS\n0\n#FACE_ID\n{}\n"
+                   "#DIRECTION\nHORIZON\n#N_DIV\n4\n".format(
+                       uni_map.face_id),
+                   "#SHP\n#ID\n0\n#CLASS\n0\n#BAND_TYPE\n{}\n"
+                   "#N_DIV\n4\n".format(band_map.band_type.name))
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for shape_map, header in zip((uni_map, band_map), headers):
+                for type_name, data_format in (('float', 'f'),
+                                               ('double', 'd'),
+                                               ('int', 'i')):
+                    shp_path = os.path.join(tmp_dir, type_name, "0.shp")
+                    shape_map.save(shp_path, type_name)
+
+                    # 値を一つずつstruct.packした場合と同じ内容になる
+                    expected = header + "#DATA_TYPE\n{}\n#DATA\n".format(
+                        type_name) + "".join(
+                        struct.pack(data_format, elem)
+                        for row in shape_map.distance_map for elem in row)
+                    with open(shp_path, 'rb') as f:
+                        self.assertEqual(f.read(), expected)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_load(self):
+        shape_maps = UniShapeMapFactory(
+            3, self.obj3d, self.grid, self.n_div, self.cls, self.grid_scale,
+            list(BaseFace.UNI_SCAN_DIRECTION)).create()[::self.grid.n_face]
+        shape_maps += self.create_band_factory(self.obj3d).create()
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            shp_paths = [os.path.join(tmp_dir, "{}.shp".format(i))
+                         for i in range(len(shape_maps))]
+            for shape_map, shp_path in zip(shape_maps, shp_paths):
+                shape_map.save(shp_path, 'double')
+
+            loaded_maps = [BaseShapeMap.load(shp_path)
+                           for shp_path in shp_paths]
+            for loaded, bulk_loaded, shape_map in zip(
+                    loaded_maps, BaseShapeMap.load_all(shp_paths),
+                    shape_maps):
+                for other in (loaded, bulk_loaded):
+                    self.assertIs(type(other), type(shape_map))
+                    self.assertEqual(other.model_id, shape_map.model_id)
+                    self.assertEqual(other.n_div, self.n_div)
+                    self.assertEqual([list(row) for row in
+                                      other.distance_map],
+                                     [list(row) for row in
+                                      shape_map.distance_map])
+                if isinstance(shape_map, UniShapeMap):
+                    self.assertEqual(loaded.traverse_direction,
+                                     shape_map.traverse_direction)
+                    self.assertEqual(loaded.face_id, shape_map.face_id)
+                else:
+                    self.assertEqual(loaded.band_type, shape_map.band_type)
+
+                # データ部はコピーせずにメモリマップする
+                self.assertIsInstance(loaded.distance_map[0].base, np.memmap)
+
+            # データ部が欠けたファイルは読み込めない
+            with open(shp_paths[0], 'rb') as f:
+                content = f.read()
+            with open(shp_paths[0], 'wb') as f:
+                f.write(content[:-8])
+            self.assertRaises(IOError, BaseShapeMap.load, shp_paths[0])
+            self.assertRaises(IOError, BaseShapeMap.load_all, shp_paths[:1])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_container(self):
+        uni_maps = UniShapeMapFactory(
+            3, self.obj3d, self.grid, self.n_div, self.cls, self.grid_scale,
+            list(BaseFace.UNI_SCAN_DIRECTION)).create()
+        band_maps = self.create_band_factory(self.obj3d).create()
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            uni_path = os.path.join(tmp_dir, "uni.shpc")
+            with ShapeMapContainerWriter(
+                    uni_path, ShapeMapContainer.MAP_TYPE.UNI,
+                    self.n_div) as writer:
+                for shape_map in uni_maps:
+                    shape_map.save_to(writer)
+            band_path = os.path.join(tmp_dir, "band.shpc")
+            with ShapeMapContainerWriter(
+                    band_path, ShapeMapContainer.MAP_TYPE.BAND, self.n_div,
+                    'double') as writer:
+                for shape_map in band_maps:
+                    shape_map.save_to(writer)
+
+            uni_container = ShapeMapContainer(uni_path)
+            self.assertEqual(len(uni_container), len(uni_maps))
+            for shape_map in uni_maps:
+                key = (3, shape_map.traverse_direction.name,
+                       shape_map.face_id)
+                loaded = uni_container[key]
+                self.assertEqual(loaded.face_id, shape_map.face_id)
+                self.assertEqual(loaded.traverse_direction,
+                                 shape_map.traverse_direction)
+                np.testing.assert_allclose(
+                    np.concatenate(loaded.distance_map),
+                    np.concatenate(shape_map.distance_map), rtol=1e-6)
+
+            band_container = ShapeMapContainer(band_path)
+            for shape_map in band_maps:
+                key = (0, shape_map.band_type.name,
+                       ShapeMapContainer.NO_FACE_ID)
+                loaded = band_container[key]
+                self.assertEqual(loaded.band_type, shape_map.band_type)
+                np.testing.assert_array_equal(loaded.distance_map,
+                                              shape_map.distance_map)
+                # レコードはコピーせずにメモリマップする
+                self.assertIsInstance(loaded.distance_map.base, np.memmap)
+
+            # 種類の異なる形状マップは書き込めない
+            with ShapeMapContainerWriter(
+                    uni_path, ShapeMapContainer.MAP_TYPE.UNI,
+                    self.n_div) as writer:
+                self.assertRaises(AssertionError, band_maps[0].save_to,
+                                  writer)
+                # close()していないファイルは読み込めない
+                self.assertRaises(IOError, ShapeMapContainer, uni_path)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_distance_store(self):
+        directions = list(BaseFace.UNI_SCAN_DIRECTION)
+        band_types = list(TriangleGrid.BAND_TYPE)
+        obj3ds = {3: self.obj3d, 5: create_cube_obj3d()}
+        uni_factories = [UniShapeMapFactory(
+            model_id, obj3ds[model_id], self.grid, self.n_div,
+            self.cls + model_id, self.grid_scale, directions)
+            for model_id in sorted(obj3ds)]
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            store_path = os.path.join(tmp_dir, "maps.dist")
+            with DistanceStoreWriter(store_path,
+                                     type_name='double') as writer:
+                for factory in uni_factories:
+                    factory.save_to(writer)
+
+            store = DistanceStore(store_path)
+            self.assertEqual(store.model_ids(), [3, 5])
+            self.assertEqual(store.n_div, self.n_div)
+
+            # 保存した距離から、直接生成した場合と同じ形状マップを生成する
+            for factory in uni_factories:
+                for expected, shape_map in zip(
+                        factory.create(), store.uni_maps(factory.model_id)):
+                    self.assertEqual(shape_map.face_id, expected.face_id)
+                    self.assertEqual(shape_map.traverse_direction,
+                                     expected.traverse_direction)
+                    self.assertEqual(shape_map.cls, expected.cls)
+                    self.assertEqual(shape_map.distance_map,
+                                     expected.distance_map)
+
+                band_factory = BandShapeMapFactory(
+                    factory.model_id, obj3ds[factory.model_id], self.grid,
+                    self.n_div, factory.cls, self.grid_scale, band_types, 0)
+                for expected in band_factory.create():
+                    shape_map = store.band_map(factory.model_id,
+                                               expected.band_type)
+                    self.assertEqual(shape_map.distance_map,
+                                     expected.distance_map)
+
+            self.assertRaises(KeyError, store.uni_map, 3, directions[0],
+                              self.grid.n_face)
+
+            # グリッドを渡した場合は、書き込み途中でも書き込み済みのモデルを読み込める
+            store_path = os.path.join(tmp_dir, "partial.dist")
+            writer = DistanceStoreWriter(store_path,
+                                         grid=uni_factories[0].grid)
+            try:
+                self.assertEqual(len(DistanceStore(store_path)), 0)
+                for i, factory in enumerate(uni_factories):
+                    factory.save_to(writer)
+                    store = DistanceStore(store_path)
+                    self.assertEqual(len(store), i + 1)
+                    np.testing.assert_allclose(
+                        store.distances(factory.model_id),
+                        factory._distances(), rtol=1e-6)
+            finally:
+                writer.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()